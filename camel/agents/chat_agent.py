@@ -14,12 +14,10 @@
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
 
-from tenacity import retry
-from tenacity.stop import stop_after_attempt
-from tenacity.wait import wait_exponential
-
 from camel.agents import BaseAgent
-from camel.configs import ChatGPTConfig
+from camel.completion_budget import CompletionBudget
+from camel.configs import BackendConfig, ChatGPTConfig
+from camel.context_manager import ContextManager
 from camel.messages import ChatMessage, MessageType, SystemMessage
 from camel.model_backend import ModelBackend, ModelFactory
 from camel.typing import ModelType, RoleType
@@ -28,6 +26,7 @@ from camel.utils import (
     num_tokens_from_messages,
     openai_api_key_required,
 )
+from chatdev.tracing import tracer
 from chatdev.utils import log_visualize
 try:
     from openai.types.chat import ChatCompletion
@@ -82,6 +81,21 @@ class ChatAgent(BaseAgent):
         message_window_size (int, optional): The maximum number of previous
             messages to include in the context window. If `None`, no windowing
             is performed. (default: :obj:`None`)
+        context_manager (ContextManager, optional): Fits requests into the
+            model context window. If `None`, it is built from the
+            environment, see :obj:`ContextManager.from_env`.
+            (default: :obj:`None`)
+        completion_budget (CompletionBudget, optional): Per-phase
+            completion-token budgets. If `None`, a completion may use the
+            whole remaining context. (default: :obj:`None`)
+        phase_name (str, optional): The phase the agent chats in, used to
+            look up and record completion budgets. (default: :obj:`None`)
+        backend_config (BackendConfig, optional): The named backend the agent
+            is routed to. If `None`, the default backend of :obj:`model` is
+            used. (default: :obj:`None`)
+        session_id (str, optional): The project the agent belongs to, whose
+            requests are kept on the same replica for prefix-cache hits.
+            (default: :obj:`None`)
     """
 
     def __init__(
@@ -91,6 +105,11 @@ class ChatAgent(BaseAgent):
             model: Optional[ModelType] = None,
             model_config: Optional[Any] = None,
             message_window_size: Optional[int] = None,
+            context_manager: Optional[ContextManager] = None,
+            completion_budget: Optional[CompletionBudget] = None,
+            phase_name: Optional[str] = None,
+            backend_config: Optional[BackendConfig] = None,
+            session_id: Optional[str] = None,
     ) -> None:
 
         self.system_message: SystemMessage = system_message
@@ -98,9 +117,18 @@ class ChatAgent(BaseAgent):
         self.role_type: RoleType = system_message.role_type
         self.model: ModelType = (model if model is not None else ModelType.GPT_3_5_TURBO)
         self.model_config: ChatGPTConfig = model_config or ChatGPTConfig()
-        self.model_token_limit: int = get_model_token_limit(self.model)
+        self.backend_config: Optional[BackendConfig] = backend_config
+        if backend_config is not None and backend_config.context_length is not None:
+            self.model_token_limit: int = backend_config.context_length
+        else:
+            self.model_token_limit: int = get_model_token_limit(self.model)
         self.message_window_size: Optional[int] = message_window_size
-        self.model_backend: ModelBackend = ModelFactory.create(self.model, self.model_config.__dict__)
+        self.model_backend: ModelBackend = ModelFactory.create(self.model, self.model_config.__dict__,
+                                                               backend_config)
+        self.context_manager: ContextManager = context_manager or ContextManager.from_env(self.summarize)
+        self.completion_budget: Optional[CompletionBudget] = completion_budget
+        self.phase_name: Optional[str] = phase_name
+        self.session_id: Optional[str] = session_id
         self.terminated: bool = False
         self.info: bool = False
         self.init_messages()
@@ -165,6 +193,26 @@ class ChatAgent(BaseAgent):
         """
         self.stored_messages.append(message)
         return self.stored_messages
+
+    def summarize(self, transcript: str) -> str:
+        r"""Summarizes earlier turns of the conversation, used by the
+        ``summarize`` context policy.
+
+        Args:
+            transcript (str): The earlier turns.
+
+        Returns:
+            str: The summary.
+        """
+        response = self.model_backend.run(messages=[
+            {"role": "system", "content": "You summarize conversations between software company employees."},
+            {"role": "user", "content": "Summarize the key decisions, requirements and open issues of the "
+                                        "following conversation in at most 200 words:\n\n" + transcript},
+        ])
+        if openai_new_api:
+            return response.choices[0].message.content
+        return response["choices"][0]["message"]["content"]
+
     def use_memory(self,input_message) -> List[MessageType]:
         if self.memory is None :
             return None
@@ -201,8 +249,46 @@ class ChatAgent(BaseAgent):
 
         return target_memory
 
-    @retry(wait=wait_exponential(min=5, max=60), stop=stop_after_attempt(5))
+    def run_with_budget(self, openai_messages: List[Dict[str, str]]) -> Any:
+        r"""Runs the backend with the completion budget of the agent's role
+        in its phase, retrying with a larger budget while the reply is cut
+        off by the budget (``finish_reason == "length"``).
+
+        Args:
+            openai_messages (List[Dict[str, str]]): The request.
+
+        Returns:
+            The backend response.
+        """
+        budget = None
+        if self.completion_budget is not None and self.phase_name is not None:
+            budget = self.completion_budget.get(self.phase_name, self.role_name)
+        retry_count = 0
+        while True:
+            response = self.model_backend.run(messages=openai_messages, max_completion_tokens=budget,
+                                              session_id=self.session_id, phase_name=self.phase_name)
+            if openai_new_api:
+                finish_reason = response.choices[0].finish_reason
+                completion_tokens = response.usage.completion_tokens if response.usage is not None else None
+            else:
+                finish_reason = response["choices"][0]["finish_reason"]
+                completion_tokens = response["usage"].get("completion_tokens")
+            if budget is None or finish_reason != "length":
+                break
+            retry_count += 1
+            previous_budget, budget = budget, self.completion_budget.next_budget(budget, retry_count)
+            # marks the usage info just logged as a cut-off attempt of the request sent next, which
+            # scripts/parse_usage_info.py merges into one request per phase turn
+            log_visualize("**[Completion Budget Exceeded]**\n\nrole: {}\nphase: {}\nbudget: {}\nretry budget: {}\n".format(
+                self.role_name, self.phase_name, previous_budget, budget if budget is not None else "none"))
+        if self.completion_budget is not None and self.phase_name is not None \
+                and finish_reason != "length" and completion_tokens is not None:
+            self.completion_budget.record(self.phase_name, self.role_name, completion_tokens)
+        return response
+
     @openai_api_key_required
+    @tracer.traced(lambda self, input_message: "agent_step:" + self.role_name,
+                   lambda self, input_message: {"role": self.role_name, "phase": self.phase_name})
     def step(
             self,
             input_message: ChatMessage,
@@ -225,6 +311,11 @@ class ChatAgent(BaseAgent):
             messages = [self.system_message
                         ] + messages[-self.message_window_size:]
         openai_messages = [message.to_openai_message() for message in messages]
+        openai_messages, num_trimmed_tokens = self.context_manager.fit(openai_messages, self.model,
+                                                                       self.model_token_limit)
+        if num_trimmed_tokens > 0:
+            log_visualize("**[Context Trimmed]**\n\nrole: {}\npolicy: {}\ntrimmed_tokens: {}\n".format(
+                self.role_name, ",".join(self.context_manager.policy), num_trimmed_tokens))
         num_tokens = num_tokens_from_messages(openai_messages, self.model)
 
         # for openai_message in openai_messages:
@@ -236,7 +327,7 @@ class ChatAgent(BaseAgent):
         info: Dict[str, Any]
 
         if num_tokens < self.model_token_limit:
-            response = self.model_backend.run(messages=openai_messages)
+            response = self.run_with_budget(openai_messages)
             if openai_new_api:
                 if not isinstance(response, ChatCompletion):
                     raise RuntimeError("OpenAI returned unexpected struct")
@@ -263,6 +354,7 @@ class ChatAgent(BaseAgent):
                     [str(choice.finish_reason) for choice in response.choices],
                     num_tokens,
                 )
+                info["trimmed_tokens"] = num_trimmed_tokens
             else:
                 if not isinstance(response, dict):
                     raise RuntimeError("OpenAI returned unexpected struct")
@@ -281,6 +373,7 @@ class ChatAgent(BaseAgent):
                     [str(choice["finish_reason"]) for choice in response["choices"]],
                     num_tokens,
                 )
+                info["trimmed_tokens"] = num_trimmed_tokens
 
             # TODO strict <INFO> check, only in the beginning of the line
             # if "<INFO>" in output_messages[0].content:
@@ -0,0 +1,178 @@
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+import json
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from chatdev.fileio import write_file_atomic
+
+
+class CompletionBudget:
+    r"""Per-phase completion-token budgets, so that short answers (e.g. the
+    programming language of :obj:`LanguageChoose`) do not reserve the same
+    KV cache space as a full :obj:`Coding` reply.
+
+    Modes:
+
+    - ``off``: no budget, the completion may use the whole remaining context.
+    - ``fixed``: the ``max_completion_tokens`` of the phase in
+      :obj:`PhaseConfig.json`, either an int or a dict from role name to int.
+    - ``adaptive``: a percentile of the completion lengths recorded for the
+      phase and role in earlier runs, falling back to the fixed budget until
+      :obj:`min_samples` completions were recorded.
+
+    A reply cut off by its budget (``finish_reason == "length"``) is retried
+    with a larger budget by :obj:`ChatAgent.step`, see :obj:`next_budget`.
+
+    Args:
+        mode (str): One of :obj:`"off"`, :obj:`"fixed"` and
+            :obj:`"adaptive"`. (default: :obj:`"fixed"`)
+        budgets (Dict[str, Any], optional): Phase name to fixed budget.
+            (default: :obj:`None`)
+        telemetry_path (str, optional): JSON file the completion lengths are
+            loaded from and saved to. (default: :obj:`None`)
+        percentile (float): Percentile of the recorded completion lengths
+            used in adaptive mode. (default: :obj:`95`)
+        headroom (float): Factor applied to the percentile.
+            (default: :obj:`1.25`)
+        min_samples (int): Completions recorded before the adaptive budget
+            is used. (default: :obj:`20`)
+        min_budget (int): Lower bound of adaptive budgets.
+            (default: :obj:`256`)
+        max_samples (int): Completions kept per phase and role.
+            (default: :obj:`1000`)
+    """
+
+    MODES = {"off", "fixed", "adaptive"}
+    # a reply cut off by its budget is retried with budget * GROWTH_FACTOR, then without budget
+    GROWTH_FACTOR = 4
+
+    def __init__(
+            self,
+            mode: str = "fixed",
+            budgets: Optional[Dict[str, Any]] = None,
+            telemetry_path: Optional[str] = None,
+            percentile: float = 95,
+            headroom: float = 1.25,
+            min_samples: int = 20,
+            min_budget: int = 256,
+            max_samples: int = 1000,
+    ) -> None:
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown completion budget mode: {mode}")
+        self.mode = mode
+        self.budgets: Dict[str, Any] = budgets or {}
+        self.telemetry_path = telemetry_path
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.min_budget = min_budget
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        # "phase|role" -> completion lengths, loaded from earlier runs and recorded in this run
+        self.samples: Dict[str, List[int]] = self.load_telemetry(telemetry_path)
+        self.new_samples: Dict[str, List[int]] = {}
+
+    @staticmethod
+    def key(phase_name: str, role_name: str) -> str:
+        return "{}|{}".format(phase_name, role_name)
+
+    @staticmethod
+    def load_telemetry(telemetry_path: Optional[str]) -> Dict[str, List[int]]:
+        if telemetry_path is None or not os.path.exists(telemetry_path):
+            return {}
+        try:
+            with open(telemetry_path, "r", encoding="utf8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def fixed_budget(self, phase_name: str, role_name: str) -> Optional[int]:
+        budget = self.budgets.get(phase_name)
+        if isinstance(budget, dict):
+            budget = budget.get(role_name)
+        return int(budget) if budget is not None else None
+
+    def adaptive_budget(self, phase_name: str, role_name: str) -> Optional[int]:
+        with self._lock:
+            samples = sorted(self.samples.get(self.key(phase_name, role_name), []))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, math.ceil(len(samples) * self.percentile / 100) - 1)
+        return max(self.min_budget, math.ceil(samples[index] * self.headroom))
+
+    def get(self, phase_name: str, role_name: str) -> Optional[int]:
+        r"""Returns the completion budget of a role in a phase.
+
+        Args:
+            phase_name (str): The phase name.
+            role_name (str): The role name of the agent.
+
+        Returns:
+            Optional[int]: The budget, or :obj:`None` for no budget.
+        """
+        if self.mode == "off":
+            return None
+        if self.mode == "adaptive":
+            budget = self.adaptive_budget(phase_name, role_name)
+            if budget is not None:
+                return budget
+        return self.fixed_budget(phase_name, role_name)
+
+    def next_budget(self, budget: int, retry: int) -> Optional[int]:
+        r"""Returns the budget to retry with after a reply was cut off.
+
+        Args:
+            budget (int): The budget the reply was cut off by.
+            retry (int): The retry number, starting at 1.
+
+        Returns:
+            Optional[int]: :obj:`budget` times :obj:`GROWTH_FACTOR` for the
+                first retry, :obj:`None` (no budget) afterwards.
+        """
+        if retry > 1:
+            return None
+        return budget * self.GROWTH_FACTOR
+
+    def record(self, phase_name: str, role_name: str, completion_tokens: int) -> None:
+        r"""Records the completion length of a reply that was not cut off.
+
+        Args:
+            phase_name (str): The phase name.
+            role_name (str): The role name of the agent.
+            completion_tokens (int): The completion length.
+        """
+        key = self.key(phase_name, role_name)
+        with self._lock:
+            self.samples.setdefault(key, []).append(completion_tokens)
+            self.samples[key] = self.samples[key][-self.max_samples:]
+            self.new_samples.setdefault(key, []).append(completion_tokens)
+
+    def save(self) -> None:
+        r"""Merges the completion lengths recorded in this run into the
+        telemetry file, which may have been updated by concurrent runs.
+        """
+        if self.telemetry_path is None:
+            return
+        with self._lock:
+            new_samples, self.new_samples = self.new_samples, {}
+        if len(new_samples) == 0:
+            return
+        telemetry = self.load_telemetry(self.telemetry_path)
+        for key, samples in new_samples.items():
+            telemetry[key] = (telemetry.get(key, []) + samples)[-self.max_samples:]
+        os.makedirs(os.path.dirname(os.path.abspath(self.telemetry_path)), exist_ok=True)
+        write_file_atomic(self.telemetry_path, json.dumps(telemetry))
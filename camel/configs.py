@@ -74,3 +74,37 @@ class ChatGPTConfig:
     frequency_penalty: float = 0.0
     logit_bias: Dict = field(default_factory=dict)
     user: str = ""
+
+
+@dataclass(frozen=True)
+class BackendConfig:
+    r"""A named OpenAI-compatible backend that phases and roles can be routed
+    to, see :obj:`ModelRouter`.
+
+    Args:
+        name (str): The name of the backend in the routing rules.
+        model (str): The model name sent in the requests.
+        base_url (str, optional): The base URL of the server. If `None`, the
+            :obj:`BASE_URL` environment variable is used. (default: :obj:`None`)
+        api_key (str, optional): The API key. If `None`, the
+            :obj:`OPENAI_API_KEY` environment variable is used.
+            (default: :obj:`None`)
+        context_length (int, optional): The context length of the model. If
+            `None`, the context length of the chain's model type is used.
+            (default: :obj:`None`)
+        model_config_path (str, optional): YAML model config whose
+            :obj:`sampling_params` are applied, like
+            :obj:`VLLM_MODEL_CONFIG_PATH`. (default: :obj:`None`)
+        sampling_params (Dict): Sampling params applied on top of the model
+            config. (default: :obj:`{}`)
+        base_urls (Sequence[str]): Replicas of the backend the requests are
+            balanced over, instead of :obj:`base_url`. (default: :obj:`()`)
+    """
+    name: str
+    model: str
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    context_length: Optional[int] = None
+    model_config_path: Optional[str] = None
+    sampling_params: Dict = field(default_factory=dict)
+    base_urls: Sequence[str] = ()
@@ -0,0 +1,194 @@
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+import hashlib
+import os
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from camel.messages import OpenAIMessage
+from camel.typing import ModelType
+from camel.utils import get_model_encoding, num_tokens_from_messages
+
+# tokens OpenAIModel.run keeps free on top of the prompt
+# (15 tokens per message between send and receive, and 1000 tokens for safety)
+GAP_TOKENS_PER_MESSAGE = 15
+RESERVED_TOKENS = 1000
+
+ELIDED_CODE_BLOCK = "```\n# (unchanged code elided, see the latest version below)\n```"
+CODE_BLOCK_REGEX = re.compile(r"```.*?```", re.DOTALL)
+
+
+class ContextManager:
+    r"""Fits the messages of a :obj:`ChatAgent` request into the model
+    context window while keeping a minimum completion budget.
+
+    Policies are applied in order until the request fits:
+
+    - ``elide``: replace code blocks of older messages that are repeated
+      verbatim in a later message by a short placeholder.
+    - ``summarize``: replace the oldest turns by a summary produced by
+      :obj:`summarizer`.
+    - ``window``: drop the oldest turns, always keeping the system message
+      and the latest message.
+
+    As a last resort the largest message is truncated in the middle, so the
+    request always fits unless the policy is ``none``.
+
+    Args:
+        policy (Sequence[str]): Policies to apply, a subset of
+            :obj:`"elide"`, :obj:`"summarize"` and :obj:`"window"`, or
+            :obj:`["none"]` to disable context management.
+            (default: :obj:`("elide", "window")`)
+        min_completion_tokens (int): The completion budget every request
+            must keep. (default: :obj:`1024`)
+        summarizer (Callable[[str], str], optional): Function summarizing a
+            transcript, required by the ``summarize`` policy.
+            (default: :obj:`None`)
+    """
+
+    POLICIES = {"none", "elide", "summarize", "window"}
+
+    def __init__(
+            self,
+            policy: Sequence[str] = ("elide", "window"),
+            min_completion_tokens: int = 1024,
+            summarizer: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        unknown = set(policy) - self.POLICIES
+        if unknown:
+            raise ValueError(f"Unknown context policy: {', '.join(sorted(unknown))}")
+        self.policy: List[str] = list(policy)
+        self.min_completion_tokens = min_completion_tokens
+        self.summarizer = summarizer
+        self.summary_cache: Dict[str, str] = {}
+
+    @classmethod
+    def from_env(cls, summarizer: Optional[Callable[[str], str]] = None) -> "ContextManager":
+        r"""Builds a context manager from the :obj:`CHATDEV_CONTEXT_POLICY`
+        (comma separated policies) and :obj:`CHATDEV_MIN_COMPLETION_TOKENS`
+        environment variables.
+
+        Args:
+            summarizer (Callable[[str], str], optional): Function summarizing
+                a transcript. (default: :obj:`None`)
+
+        Returns:
+            ContextManager: The context manager.
+        """
+        policy = os.getenv("CHATDEV_CONTEXT_POLICY", "elide,window")
+        policy = [name.strip() for name in policy.split(",") if name.strip()]
+        min_completion_tokens = int(os.getenv("CHATDEV_MIN_COMPLETION_TOKENS", "1024"))
+        return cls(policy, min_completion_tokens, summarizer)
+
+    @property
+    def enabled(self) -> bool:
+        return "none" not in self.policy
+
+    def request_tokens(self, messages: List[OpenAIMessage], model: ModelType) -> int:
+        r"""Counts the tokens a request occupies, including the gap and the
+        safety reserve kept by :obj:`OpenAIModel.run`.
+        """
+        return (num_tokens_from_messages(messages, model)
+                + GAP_TOKENS_PER_MESSAGE * len(messages) + RESERVED_TOKENS)
+
+    def fit(
+            self,
+            messages: List[OpenAIMessage],
+            model: ModelType,
+            token_limit: int,
+    ) -> Tuple[List[OpenAIMessage], int]:
+        r"""Fits a request into :obj:`token_limit` minus the minimum
+        completion budget. The input messages are not modified.
+
+        Args:
+            messages (List[OpenAIMessage]): The request, starting with the
+                system message.
+            model (ModelType): The model used to count tokens.
+            token_limit (int): The context length of the model.
+
+        Returns:
+            Tuple[List[OpenAIMessage], int]: The fitted messages and the
+                number of prompt tokens that were trimmed.
+        """
+        budget = token_limit - self.min_completion_tokens
+        original_tokens = num_tokens_from_messages(messages, model)
+        messages = [dict(message) for message in messages]
+        if not self.enabled or self.request_tokens(messages, model) <= budget:
+            return messages, 0
+
+        for name in self.policy:
+            if name == "elide":
+                messages = self._elide(messages)
+            elif name == "summarize" and self.summarizer is not None:
+                messages = self._summarize(messages, model, budget)
+            elif name == "window":
+                messages = self._window(messages, model, budget)
+            if self.request_tokens(messages, model) <= budget:
+                break
+        messages = self._truncate(messages, model, budget)
+        return messages, original_tokens - num_tokens_from_messages(messages, model)
+
+    def _elide(self, messages: List[OpenAIMessage]) -> List[OpenAIMessage]:
+        seen = set()
+        # walk from the latest message backwards, so the latest copy of a code block is kept
+        for message in reversed(messages[1:]):
+            def replace(match):
+                block = match.group(0)
+                if block in seen:
+                    return ELIDED_CODE_BLOCK
+                seen.add(block)
+                return block
+
+            message["content"] = CODE_BLOCK_REGEX.sub(replace, message["content"])
+        return messages
+
+    def _window(self, messages: List[OpenAIMessage], model: ModelType, budget: int) -> List[OpenAIMessage]:
+        system_message, turns = messages[0], messages[1:]
+        while len(turns) > 1 and self.request_tokens([system_message] + turns, model) > budget:
+            turns = turns[1:]
+        return [system_message] + turns
+
+    def _summarize(self, messages: List[OpenAIMessage], model: ModelType, budget: int) -> List[OpenAIMessage]:
+        system_message, turns = messages[0], messages[1:]
+        kept = self._window(messages, model, budget)[1:]
+        dropped = turns[:len(turns) - len(kept)]
+        if len(dropped) == 0:
+            return messages
+        transcript = "\n\n".join("{}: {}".format(message["role"], message["content"]) for message in dropped)
+        key = hashlib.md5(transcript.encode("utf-8")).hexdigest()
+        if key not in self.summary_cache:
+            encoding = get_model_encoding(model)
+            tokens = encoding.encode(transcript)
+            max_transcript_tokens = max(budget // 2, 1)
+            if len(tokens) > max_transcript_tokens:
+                transcript = encoding.decode(tokens[-max_transcript_tokens:])
+            self.summary_cache[key] = self.summarizer(transcript)
+        summary = {"role": "user",
+                   "content": "Summary of the earlier conversation:\n" + self.summary_cache[key]}
+        summarized = [system_message, summary] + kept
+        # the summary must leave room for the latest turns, otherwise it is dropped by windowing
+        return self._window(summarized, model, budget)
+
+    def _truncate(self, messages: List[OpenAIMessage], model: ModelType, budget: int) -> List[OpenAIMessage]:
+        encoding = get_model_encoding(model)
+        while self.request_tokens(messages, model) > budget:
+            excess = self.request_tokens(messages, model) - budget
+            index = max(range(len(messages)), key=lambda i: len(messages[i]["content"]))
+            tokens = encoding.encode(messages[index]["content"])
+            keep = len(tokens) - excess - 16
+            if keep <= 0:
+                raise ValueError("The model context length cannot hold the minimum completion budget.")
+            head, tail = tokens[:keep // 2], tokens[len(tokens) - (keep - keep // 2):]
+            messages[index]["content"] = encoding.decode(head) + "\n...(truncated)...\n" + encoding.decode(tail)
+        return messages
@@ -0,0 +1,202 @@
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+import json
+import math
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from chatdev.fileio import write_file_atomic
+
+# in a subdirectory, the files at the top of WareHouse/ are removed by clear_structure
+DEFAULT_TELEMETRY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "WareHouse",
+                                      ".telemetry", "latency_telemetry.json")
+
+
+class Hedger:
+    r"""Hedged requests: if a completion has not returned within a percentile
+    of the latencies recorded for its model and phase, a duplicate is sent
+    to another replica (or the same one if there is no other) and the first
+    result is taken. The loser is cancelled by closing its connection, which
+    makes vLLM abort the request.
+
+    Args:
+        enabled (bool): Whether requests are hedged; latencies are recorded
+            either way. (default: :obj:`False`)
+        percentile (float): Percentile of the recorded latencies after which
+            a request is hedged. (default: :obj:`95`)
+        min_samples (int): Latencies recorded for a model and phase before
+            its requests are hedged. (default: :obj:`20`)
+        max_hedge_rate (float): Upper bound of hedges per request, bounding
+            the extra load. (default: :obj:`0.05`)
+        telemetry_path (str, optional): JSON file the latencies are loaded
+            from and saved to. (default: :obj:`None`)
+        max_samples (int): Latencies kept per model and phase.
+            (default: :obj:`1000`)
+    """
+
+    def __init__(
+            self,
+            enabled: bool = False,
+            percentile: float = 95,
+            min_samples: int = 20,
+            max_hedge_rate: float = 0.05,
+            telemetry_path: Optional[str] = None,
+            max_samples: int = 1000,
+    ) -> None:
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedge_rate = max_hedge_rate
+        self.telemetry_path = telemetry_path
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        # "model|phase" -> latencies in seconds, loaded from earlier runs and recorded in this run
+        self.samples: Dict[str, List[float]] = self.load_telemetry(telemetry_path)
+        self.new_samples: Dict[str, List[float]] = {}
+        self.num_requests = 0
+        self.num_hedges = 0
+        self.num_hedge_wins = 0
+
+    @classmethod
+    def from_env(cls) -> "Hedger":
+        r"""Builds a hedger from the :obj:`CHATDEV_HEDGING`,
+        :obj:`CHATDEV_HEDGE_PERCENTILE`, :obj:`CHATDEV_HEDGE_MAX_RATE` and
+        :obj:`CHATDEV_LATENCY_TELEMETRY` environment variables.
+        """
+        return cls(enabled=os.getenv("CHATDEV_HEDGING", "False").lower() == "true",
+                   percentile=float(os.getenv("CHATDEV_HEDGE_PERCENTILE", "95")),
+                   max_hedge_rate=float(os.getenv("CHATDEV_HEDGE_MAX_RATE", "0.05")),
+                   telemetry_path=os.getenv("CHATDEV_LATENCY_TELEMETRY", DEFAULT_TELEMETRY_PATH))
+
+    @staticmethod
+    def load_telemetry(telemetry_path: Optional[str]) -> Dict[str, List[float]]:
+        if telemetry_path is None or not os.path.exists(telemetry_path):
+            return {}
+        try:
+            with open(telemetry_path, "r", encoding="utf8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def key(model_name: str, phase_name: Optional[str]) -> str:
+        return "{}|{}".format(model_name, phase_name)
+
+    def delay(self, model_name: str, phase_name: Optional[str]) -> Optional[float]:
+        r"""Returns the seconds after which a request of a model and phase is
+        hedged, or :obj:`None` if it is not hedged.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            samples = sorted(self.samples.get(self.key(model_name, phase_name), []))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(len(samples) * self.percentile / 100) - 1)]
+
+    def record(self, model_name: str, phase_name: Optional[str], latency: float) -> None:
+        key = self.key(model_name, phase_name)
+        with self._lock:
+            self.num_requests += 1
+            self.samples.setdefault(key, []).append(latency)
+            self.samples[key] = self.samples[key][-self.max_samples:]
+            self.new_samples.setdefault(key, []).append(latency)
+
+    def try_hedge(self) -> bool:
+        # hedge only while the hedges stay under max_hedge_rate of the requests
+        with self._lock:
+            if self.num_hedges + 1 > self.max_hedge_rate * max(self.num_requests, 1):
+                return False
+            self.num_hedges += 1
+            return True
+
+    def run(
+            self,
+            delay: float,
+            send: Callable[[Any], Any],
+            primary_client: Any,
+            start_hedge: Callable[[], Tuple[Any, Callable[[Optional[BaseException], bool, Any], None]]],
+    ) -> Tuple[Any, bool]:
+        r"""Runs a request, hedging it after :obj:`delay` seconds.
+
+        Args:
+            delay (float): Seconds after which the request is hedged.
+            send (Callable[[Any], Any]): Sends the request with a client and
+                returns the response.
+            primary_client (Any): The client of the first request, used only
+                by it, so that it can be closed to cancel the request.
+            start_hedge (Callable): Acquires the replica of the hedge and
+                returns a client used only by the hedge, and a function
+                releasing the replica, called with the exception of the hedge
+                (or :obj:`None`), whether it was cancelled and its response
+                (or :obj:`None`).
+
+        Returns:
+            Tuple[Any, bool]: The response and whether the hedge won.
+        """
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            primary = executor.submit(send, primary_client)
+            done, _ = wait([primary], timeout=delay)
+            if done or not self.try_hedge():
+                return primary.result(), False
+
+            hedge_client, release_hedge = start_hedge()
+            cancelled = set()
+            hedge = executor.submit(send, hedge_client)
+            hedge.add_done_callback(lambda future: release_hedge(
+                future.exception(), hedge_client in cancelled,
+                future.result() if future.exception() is None else None))
+            clients = {primary: primary_client, hedge: hedge_client}
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        error = error or future.exception()
+                        continue
+                    # cancel the loser by closing its connection, the server aborts the request
+                    for loser in pending:
+                        cancelled.add(clients[loser])
+                        clients[loser].close()
+                    if future is hedge:
+                        with self._lock:
+                            self.num_hedge_wins += 1
+                    return future.result(), future is hedge
+            raise error
+        finally:
+            executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": self.num_requests, "hedges": self.num_hedges, "hedge_wins": self.num_hedge_wins}
+
+    def save(self) -> None:
+        r"""Merges the latencies recorded in this run into the telemetry
+        file, which may have been updated by concurrent runs.
+        """
+        if self.telemetry_path is None:
+            return
+        with self._lock:
+            new_samples, self.new_samples = self.new_samples, {}
+        if len(new_samples) == 0:
+            return
+        telemetry = self.load_telemetry(self.telemetry_path)
+        for key, samples in new_samples.items():
+            telemetry[key] = (telemetry.get(key, []) + samples)[-self.max_samples:]
+        os.makedirs(os.path.dirname(os.path.abspath(self.telemetry_path)), exist_ok=True)
+        write_file_atomic(self.telemetry_path, json.dumps(telemetry))
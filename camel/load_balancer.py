@@ -0,0 +1,268 @@
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import openai
+
+from camel.hedging import Hedger
+from camel.scheduler import RequestScheduler
+
+
+class Replica:
+    r"""One OpenAI-compatible endpoint (e.g. a vLLM replica) and its load.
+
+    Args:
+        base_url (str, optional): The base URL, :obj:`None` for the OpenAI
+            API.
+        api_key (str): The API key.
+    """
+
+    def __init__(self, base_url: Optional[str], api_key: str) -> None:
+        self.base_url = base_url
+        self.api_key = api_key
+        self.client = None
+        self.outstanding_requests = 0
+        self.outstanding_tokens = 0
+        # circuit breaker: closed while open_until is 0, open until open_until, then half-open with a single probe
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.num_requests = 0
+        self.num_failures = 0
+        self.num_aborted = 0
+        self.num_affinity_hits = 0
+        self.total_latency = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def get_client(self):
+        # one client (and connection pool) per replica instead of one per request
+        if self.client is None:
+            self.client = self.new_client()
+        return self.client
+
+    def new_client(self):
+        # retries are done by OpenAIModel.run (camel.retry), not by the client
+        if self.base_url:
+            return openai.OpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        return openai.OpenAI(api_key=self.api_key, max_retries=0)
+
+    def available(self, now: float) -> bool:
+        return self.open_until == 0 or (now >= self.open_until and not self.probing)
+
+    def circuit_state(self, now: float) -> str:
+        if self.open_until == 0:
+            return "closed"
+        return "open" if now < self.open_until else "half-open"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "requests": self.num_requests,
+            "failures": self.num_failures,
+            "aborted": self.num_aborted,
+            "affinity_hits": self.num_affinity_hits,
+            "mean_latency": self.total_latency / max(self.num_requests - self.num_failures - self.num_aborted, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "outstanding_requests": self.outstanding_requests,
+            "outstanding_tokens": self.outstanding_tokens,
+            "circuit": self.circuit_state(time.time()),
+        }
+
+
+class LoadBalancer:
+    r"""Balances requests over replicas by least outstanding tokens (then
+    requests), keeping each session (a ChatChain project) on the same replica
+    so successive requests hit its prefix cache, unless that replica is
+    unhealthy or overloaded.
+
+    Each replica has a circuit breaker shared by all agents: after
+    :obj:`failure_threshold` consecutive server failures it opens and the
+    replica is skipped for :obj:`open_seconds`, then a single probe request
+    is let through, which closes it on success and re-opens it on failure.
+
+    Args:
+        base_urls (Sequence[Optional[str]]): The endpoints.
+        api_key (str): The API key.
+        affinity_slack_tokens (int): A session leaves its replica when the
+            replica has this many more outstanding tokens than the least
+            loaded one. (default: :obj:`65536`)
+        failure_threshold (int): Consecutive server failures opening the
+            circuit of a replica. (default: :obj:`5`)
+        open_seconds (float): Seconds an open circuit skips its replica.
+            (default: :obj:`30`)
+        hedger (Hedger, optional): Hedges slow requests over the replicas.
+            If `None`, requests are not hedged. (default: :obj:`None`)
+        scheduler (RequestScheduler, optional): Orders the requests of
+            concurrent projects. If `None`, requests are sent in arrival
+            order without limit. (default: :obj:`None`)
+    """
+
+    def __init__(
+            self,
+            base_urls: Sequence[Optional[str]],
+            api_key: str,
+            affinity_slack_tokens: int = 65536,
+            failure_threshold: int = 5,
+            open_seconds: float = 30,
+            hedger: Optional[Hedger] = None,
+            scheduler: Optional[RequestScheduler] = None,
+    ) -> None:
+        self.replicas: List[Replica] = [Replica(base_url, api_key) for base_url in base_urls]
+        self.affinity_slack_tokens = affinity_slack_tokens
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.hedger = hedger or Hedger()
+        self.scheduler = scheduler or RequestScheduler()
+        self.sessions: Dict[str, Replica] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, base_urls: Sequence[Optional[str]], api_key: str) -> "LoadBalancer":
+        r"""Builds a load balancer configured by the
+        :obj:`CHATDEV_AFFINITY_SLACK_TOKENS`,
+        :obj:`CHATDEV_CIRCUIT_FAILURE_THRESHOLD` and
+        :obj:`CHATDEV_CIRCUIT_OPEN_SECONDS` environment variables.
+        """
+        return cls(base_urls, api_key,
+                   affinity_slack_tokens=int(os.getenv("CHATDEV_AFFINITY_SLACK_TOKENS", "65536")),
+                   failure_threshold=int(os.getenv("CHATDEV_CIRCUIT_FAILURE_THRESHOLD", "5")),
+                   open_seconds=float(os.getenv("CHATDEV_CIRCUIT_OPEN_SECONDS", "30")),
+                   hedger=Hedger.from_env(),
+                   scheduler=RequestScheduler.from_env())
+
+    @staticmethod
+    def load(replica: Replica):
+        return replica.outstanding_tokens, replica.outstanding_requests
+
+    def acquire(self, session_id: Optional[str], num_tokens: int,
+                exclude: Optional[Replica] = None) -> Optional[Replica]:
+        r"""Picks the replica of a request and counts the request as
+        outstanding on it.
+
+        Args:
+            session_id (str, optional): The session the request belongs to,
+                :obj:`None` for no affinity.
+            num_tokens (int): The prompt and completion tokens the request
+                may occupy on the replica.
+            exclude (Replica, optional): A replica to avoid if another one is
+                available, e.g. the replica of a hedged request.
+                (default: :obj:`None`)
+
+        Returns:
+            Optional[Replica]: The replica, to be passed to :obj:`release`,
+                or :obj:`None` if the circuits of all replicas are open, see
+                :obj:`next_available_in`.
+        """
+        now = time.time()
+        with self._lock:
+            candidates = [replica for replica in self.replicas if replica.available(now)]
+            if len(candidates) == 0:
+                return None
+            if exclude is not None and len(candidates) > 1:
+                candidates = [replica for replica in candidates if replica is not exclude]
+            least_loaded = min(candidates, key=self.load)
+            replica = self.sessions.get(session_id) if session_id is not None else None
+            if replica is not None and replica in candidates and \
+                    replica.outstanding_tokens - least_loaded.outstanding_tokens <= self.affinity_slack_tokens:
+                replica.num_affinity_hits += 1
+            else:
+                replica = least_loaded
+                if session_id is not None:
+                    self.sessions[session_id] = replica
+            if replica.open_until != 0:
+                # half-open: this request is the probe, the other requests keep skipping the replica
+                replica.probing = True
+            self._count(replica, num_tokens)
+            return replica
+
+    def acquire_replica(self, replica: Replica, num_tokens: int) -> None:
+        r"""Counts a request as outstanding on a given replica, whatever its
+        load or circuit state."""
+        with self._lock:
+            self._count(replica, num_tokens)
+
+    @staticmethod
+    def _count(replica: Replica, num_tokens: int) -> None:
+        replica.outstanding_requests += 1
+        replica.outstanding_tokens += num_tokens
+        replica.num_requests += 1
+
+    def next_available_in(self) -> float:
+        r"""Returns the seconds until the circuit of a replica half-opens."""
+        now = time.time()
+        with self._lock:
+            return max(min(replica.open_until for replica in self.replicas) - now, 1.0)
+
+    def release(self, replica: Replica, num_tokens: int, latency: float, usage: Any = None,
+                failed: bool = False, aborted: bool = False) -> None:
+        r"""Counts a request as finished on its replica.
+
+        Args:
+            replica (Replica): The replica returned by :obj:`acquire`.
+            num_tokens (int): The tokens passed to :obj:`acquire`.
+            latency (float): Seconds the request took.
+            usage (Any, optional): The usage of the response.
+                (default: :obj:`None`)
+            failed (bool): Whether the replica failed to answer (connection
+                error, timeout or server error), which counts towards its
+                circuit breaker. (default: :obj:`False`)
+            aborted (bool): Whether the request ended without a response
+                through no fault of the replica (bad request, rate limit,
+                cancelled hedge), which changes neither its circuit breaker
+                nor its latency statistics. (default: :obj:`False`)
+        """
+        with self._lock:
+            replica.outstanding_requests -= 1
+            replica.outstanding_tokens -= num_tokens
+            if aborted and not failed:
+                replica.num_aborted += 1
+                # an aborted probe says nothing about the replica: the circuit stays half-open and the next
+                # request probes it
+                replica.probing = False
+                return
+            if failed:
+                replica.num_failures += 1
+                replica.consecutive_failures += 1
+                if replica.probing or replica.consecutive_failures >= self.failure_threshold:
+                    replica.open_until = time.time() + self.open_seconds
+                replica.probing = False
+                return
+            replica.consecutive_failures = 0
+            replica.open_until = 0.0
+            replica.probing = False
+            replica.total_latency += latency
+            if usage is not None:
+                replica.prompt_tokens += usage.prompt_tokens
+                replica.completion_tokens += usage.completion_tokens
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [replica.stats() for replica in self.replicas]
+
+    def format_stats(self) -> str:
+        lines = ["| base_url | requests | failures | aborted | affinity_hits | mean_latency | prompt_tokens | completion_tokens | circuit |",
+                 "| --- | --- | --- | --- | --- | --- | --- | --- | --- |"]
+        for stats in self.stats():
+            lines.append("| {} | {} | {} | {} | {} | {:.2f}s | {} | {} | {} |".format(
+                stats["base_url"], stats["requests"], stats["failures"], stats["aborted"], stats["affinity_hits"],
+                stats["mean_latency"], stats["prompt_tokens"], stats["completion_tokens"], stats["circuit"]))
+        hedger_stats = self.hedger.stats()
+        lines.append("\nhedged requests: {} of {}, hedge wins: {}".format(
+            hedger_stats["hedges"], hedger_stats["requests"], hedger_stats["hedge_wins"]))
+        return "\n".join(lines)
@@ -11,16 +11,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+import dataclasses
+import json
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 import openai
-import tiktoken
 import yaml
 
+from camel.configs import BackendConfig
+from camel.load_balancer import LoadBalancer
+from camel.retry import RetryPolicy
 from camel.typing import ModelType
 from camel.utils import get_model_token_limit, num_tokens_from_messages
+from chatdev.profiling import profiler
 from chatdev.statistics import prompt_cost
+from chatdev.tracing import tracer
 from chatdev.utils import log_visualize
 
 try:
@@ -37,6 +45,11 @@ if 'BASE_URL' in os.environ:
     BASE_URL = os.environ['BASE_URL']
 else:
     BASE_URL = None
+# comma separated replicas of the default backend, requests are balanced over them with per-project affinity
+if 'BASE_URLS' in os.environ:
+    BASE_URLS = [base_url.strip() for base_url in os.environ['BASE_URLS'].split(',') if base_url.strip()]
+else:
+    BASE_URLS = [BASE_URL]
 
 
 class ModelBackend(ABC):
@@ -58,22 +71,157 @@ class ModelBackend(ABC):
 
 
 class OpenAIModel(ModelBackend):
-    r"""OpenAI API in a unified ModelBackend interface."""
+    r"""OpenAI API in a unified ModelBackend interface.
+
+    Args:
+        model_type (ModelType): The model type.
+        model_config_dict (Dict): The model config.
+        backend_config (BackendConfig, optional): A named backend the
+            requests are routed to. If `None`, the model type, the
+            :obj:`BASE_URL` and :obj:`VLLM_MODEL_CONFIG_PATH` environment
+            variables are used. (default: :obj:`None`)
+    """
 
-    def __init__(self, model_type: ModelType, model_config_dict: Dict) -> None:
+    def __init__(self, model_type: ModelType, model_config_dict: Dict,
+                 backend_config: Optional[BackendConfig] = None) -> None:
         super().__init__()
         self.model_type = model_type
-        self.model_config_dict = model_config_dict
+        self.model_config_dict = dict(model_config_dict)
+        self.backend_config = backend_config
+
+        if backend_config is not None:
+            self.model_name = backend_config.model
+            self.base_urls = list(backend_config.base_urls) or [backend_config.base_url or BASE_URL]
+            self.api_key = backend_config.api_key or OPENAI_API_KEY
+            self.token_limit = backend_config.context_length or get_model_token_limit(model_type)
+            model_config_path = backend_config.model_config_path
+        else:
+            self.model_name = model_type.value
+            self.base_urls = BASE_URLS
+            self.api_key = OPENAI_API_KEY
+            self.token_limit = get_model_token_limit(model_type)
+            model_config_path = os.getenv('VLLM_MODEL_CONFIG_PATH')
+            assert model_config_path is not None, "VLLM_MODEL_CONFIG_PATH environment variable is not set"
+
+        if model_config_path is not None:
+            model_config = ModelRegistry.get_model_config(model_config_path)
+            # overwrite model_config['sampling_params'] with model_config_dict
+            if sampling_params := model_config.get('sampling_params'):
+                self.model_config_dict.update(sampling_params)
+        if backend_config is not None:
+            self.model_config_dict.update(backend_config.sampling_params)
+        # shared by every backend using the same replicas, so that their outstanding requests add up
+        self.load_balancer = ModelRegistry.get_load_balancer(self.base_urls, self.api_key)
+        self.retry_policy = RetryPolicy.from_env()
+
+    def run_hedged(self, send, replica, delay: float, num_reserved_tokens: int) -> Tuple[Any, bool]:
+        r"""Sends a request on :obj:`replica` and, if it has not returned
+        after :obj:`delay` seconds, a duplicate on another replica, see
+        :obj:`Hedger`.
 
-        model_config_path = os.getenv('VLLM_MODEL_CONFIG_PATH')
-        assert model_config_path is not None, "VLLM_MODEL_CONFIG_PATH environment variable is not set"
+        Returns:
+            Tuple[Any, bool]: The response and whether the hedge won.
+        """
+        # dedicated clients, so that the loser can be cancelled by closing its connection
+        primary_client = replica.new_client()
+
+        def start_hedge():
+            hedge_replica = self.load_balancer.acquire(None, num_reserved_tokens, exclude=replica)
+            if hedge_replica is None:
+                hedge_replica = replica
+                self.load_balancer.acquire_replica(hedge_replica, num_reserved_tokens)
+            hedge_client = hedge_replica.new_client()
+            hedge_start_time = time.time()
+            log_visualize("**[Hedged Request]**\n\nbase_url: {}\nhedge base_url: {}\ndelay: {:.1f}s\n".format(
+                replica.base_url, hedge_replica.base_url, delay))
+
+            def release_hedge(error, cancelled, response):
+                # a cancelled hedge (the first request won) is neither a success nor a fault of its replica
+                failed = error is not None and not cancelled and self.retry_policy.is_server_failure(error)
+                self.load_balancer.release(hedge_replica, num_reserved_tokens, time.time() - hedge_start_time,
+                                           usage=getattr(response, "usage", None), failed=failed,
+                                           aborted=not failed and (cancelled or error is not None))
+                hedge_client.close()
+
+            return hedge_client, release_hedge
+
+        try:
+            response, hedge_won = self.load_balancer.hedger.run(delay, send, primary_client, start_hedge)
+        finally:
+            primary_client.close()
+        if hedge_won:
+            log_visualize("**[Hedge Won]**\n\nbase_url: {}\n".format(replica.base_url))
+        return response, hedge_won
+
+    def send_with_retries(self, args, kwargs, request_config_dict: Dict, session_id: Optional[str],
+                          phase_name: Optional[str], num_reserved_tokens: int, num_max_completion_tokens: int,
+                          queue_wait: float):
+        r"""Sends a request to a replica, retrying it according to
+        :obj:`self.retry_policy`, and returns the response.
+        """
+        # retries re-send the same request, the caller's state (e.g. ChatAgent.stored_messages) is left untouched
+        attempt = 0
+        while True:
+            attempt += 1
+            replica = self.load_balancer.acquire(session_id, num_reserved_tokens)
+            if replica is None:
+                # the circuits of all replicas are open, wait for one to let a probe through
+                if attempt >= self.retry_policy.max_attempts:
+                    raise RuntimeError("The circuits of all replicas of {} are open".format(self.model_name))
+                time.sleep(min(self.load_balancer.next_available_in(), self.retry_policy.max_wait))
+                continue
+
+            tracer.set_attributes(base_url=replica.base_url, attempts=attempt)
+            if attempt == 1:
+                log_visualize(
+                    "**[OpenAI_Usage_Info Send]**\nmodel: {}\napi_key: {}\nbase_url: {}\nmax_completion_tokens: {}\n"
+                    "queue_wait: {:.2f}s\n".format(
+                    self.model_name, self.api_key, replica.base_url, num_max_completion_tokens, queue_wait)
+                )
+
+            def send(client):
+                return client.chat.completions.create(*args, **kwargs, model=self.model_name, **request_config_dict)
+
+            start_time = time.time()
+            hedge_delay = self.load_balancer.hedger.delay(self.model_name, phase_name)
+            hedge_won = False
+            try:
+                if hedge_delay is None:
+                    response = send(replica.get_client())
+                else:
+                    response, hedge_won = self.run_hedged(send, replica, hedge_delay, num_reserved_tokens)
+            except Exception as e:
+                # a bad request or a rate limit is not a fault of the replica, see LoadBalancer.release
+                server_failure = self.retry_policy.is_server_failure(e)
+                self.load_balancer.release(replica, num_reserved_tokens, time.time() - start_time,
+                                           failed=server_failure, aborted=not server_failure)
+                if not self.retry_policy.is_retryable(e) or attempt >= self.retry_policy.max_attempts:
+                    raise
+                wait = self.retry_policy.wait(attempt, e)
+                log_visualize("**[Request Retry]**\n\nbase_url: {}\nattempt: {}\nerror: {}\nwait: {:.1f}s\n".format(
+                    replica.base_url, attempt, type(e).__name__, wait))
+                time.sleep(wait)
+                continue
+            latency = time.time() - start_time
+            if hedge_won:
+                # the first request was cancelled, the hedge is released with its own latency and usage
+                self.load_balancer.release(replica, num_reserved_tokens, latency, aborted=True)
+            else:
+                self.load_balancer.release(replica, num_reserved_tokens, latency, response.usage)
+            self.load_balancer.hedger.record(self.model_name, phase_name, latency)
+            break
 
-        model_config = yaml.safe_load(open(model_config_path, 'r'))
-        # overwrite model_config['sampling_params'] with model_config_dict
-        if sampling_params := model_config.get('sampling_params'):
-            self.model_config_dict.update(sampling_params)
+        return response
 
+    @tracer.traced(lambda self, *args, **kwargs: "llm:" + self.model_name,
+                   lambda self, *args, **kwargs: {"model": self.model_name, "phase": kwargs.get("phase_name")})
     def run(self, *args, **kwargs):
+        # per-phase completion budget (see camel.completion_budget), None for the whole remaining context
+        completion_budget = kwargs.pop("max_completion_tokens", None)
+        # the project the request belongs to, kept on the same replica for prefix-cache hits
+        session_id = kwargs.pop("session_id", None)
+        # the phase of the request, whose latency percentile decides when the request is hedged
+        phase_name = kwargs.pop("phase_name", None)
         string = "\n".join([message["content"] for message in kwargs["messages"]])
         # encoding = tiktoken.encoding_for_model(self.model_type.value)
         # num_prompt_tokens = len(encoding.encode(string))
@@ -94,36 +242,43 @@ class OpenAIModel(ModelBackend):
         #     "gpt-4o-mini": 16384, #100000
         #     "gemma3:27b-it-qat": 131072,
         # }
-        num_max_token = get_model_token_limit(self.model_type)
+        num_max_token = self.token_limit
         num_max_completion_tokens = num_max_token - num_prompt_tokens - 1000  # reserve 1000 tokens for safety
-        self.model_config_dict['max_completion_tokens'] = num_max_completion_tokens
-
-        log_visualize(
-            "**[OpenAI_Usage_Info Send]**\nmodel: {}\napi_key: {}\nbase_url: {}\n".format(
-            self.model_type.value, OPENAI_API_KEY, BASE_URL)
-        )
+        # ChatAgent's ContextManager keeps a minimum completion budget, this only guards direct callers
+        num_max_completion_tokens = max(num_max_completion_tokens, 1)
+        if completion_budget is not None:
+            num_max_completion_tokens = min(num_max_completion_tokens, completion_budget)
+        # backends are shared between agents, so per-request settings must not be written into self.model_config_dict
+        request_config_dict = dict(self.model_config_dict)
+        request_config_dict['max_completion_tokens'] = num_max_completion_tokens
+
+        num_reserved_tokens = num_prompt_tokens + num_max_completion_tokens
         assert openai_new_api, "Old OpenAI API version is not supported. Please update to the new version."
 
-        # Experimental, add base_url
-        if BASE_URL:
-            client = openai.OpenAI(
-                api_key=OPENAI_API_KEY,
-                base_url=BASE_URL,
-            )
-        else:
-            client = openai.OpenAI(
-                api_key=OPENAI_API_KEY
-            )
-
-        response = client.chat.completions.create(*args, **kwargs, model=self.model_type.value,
-                                                    **self.model_config_dict)
+        # queued while the replicas are saturated, in the order of the scheduling policy (see camel.scheduler)
+        scheduler = self.load_balancer.scheduler
+        # the phase is blocked from the queue to the response (see chatdev.profiling)
+        with profiler.measure("llm"):
+            queue_wait = scheduler.acquire(session_id, num_reserved_tokens)
+            tracer.set_attributes(queue_wait=queue_wait, reserved_tokens=num_reserved_tokens)
+            priority = scheduler.priority(session_id)
+            if priority is not None:
+                request_config_dict['extra_body'] = dict(request_config_dict.get('extra_body') or {},
+                                                         priority=priority)
+            try:
+                response = self.send_with_retries(args, kwargs, request_config_dict, session_id, phase_name,
+                                                  num_reserved_tokens, num_max_completion_tokens, queue_wait)
+            finally:
+                scheduler.release()
 
         cost = prompt_cost(
-            self.model_type.value,
+            self.model_name,
             num_prompt_tokens=response.usage.prompt_tokens,
             num_completion_tokens=response.usage.completion_tokens
         )
 
+        tracer.set_attributes(prompt_tokens=response.usage.prompt_tokens,
+                              completion_tokens=response.usage.completion_tokens, cost=cost)
         log_visualize(
             "**[OpenAI_Usage_Info Receive]**\nprompt_tokens: {}\ncompletion_tokens: {}\ntotal_tokens: {}\ncost: ${:.6f}\n".format(
                 response.usage.prompt_tokens, response.usage.completion_tokens,
@@ -152,6 +307,102 @@ class StubModel(ModelBackend):
         )
 
 
+class ModelRegistry:
+    r"""Process-wide registry of parsed model config files and model backend
+    instances, so that creating a :obj:`ChatAgent` does not re-read YAML
+    files or build new API clients."""
+
+    _lock = threading.Lock()
+    _model_configs: Dict[Tuple[str, float], Dict] = {}
+    _backends: Dict[Tuple, ModelBackend] = {}
+    _load_balancers: Dict[Tuple, LoadBalancer] = {}
+
+    @classmethod
+    def get_model_config(cls, path: str) -> Dict:
+        r"""Returns the parsed model config file, re-read only if the file
+        was modified.
+
+        Args:
+            path (str): Path to the YAML model config.
+
+        Returns:
+            Dict: The parsed config. It is shared, callers must not modify it.
+        """
+        key = (path, os.path.getmtime(path))
+        with cls._lock:
+            if key not in cls._model_configs:
+                with open(path, 'r') as f:
+                    cls._model_configs[key] = yaml.safe_load(f)
+            return cls._model_configs[key]
+
+    @classmethod
+    def get_backend(cls, model_class: type, model_type: ModelType, model_config_dict: Dict,
+                    backend_config: Optional[BackendConfig] = None) -> ModelBackend:
+        r"""Returns the shared backend for a model class, model type, model
+        config, model config file and named backend, creating it on first use.
+
+        Args:
+            model_class (type): The :obj:`ModelBackend` subclass.
+            model_type (ModelType): The model type.
+            model_config_dict (Dict): The model config.
+            backend_config (BackendConfig, optional): The named backend.
+                (default: :obj:`None`)
+
+        Returns:
+            ModelBackend: The backend instance.
+        """
+        key = (model_class, model_type, os.getenv('VLLM_MODEL_CONFIG_PATH'),
+               json.dumps(model_config_dict, sort_keys=True, default=str),
+               json.dumps(dataclasses.asdict(backend_config), sort_keys=True) if backend_config else None)
+        with cls._lock:
+            backend = cls._backends.get(key)
+        if backend is None:
+            backend = model_class(model_type, model_config_dict, backend_config)
+            with cls._lock:
+                backend = cls._backends.setdefault(key, backend)
+        return backend
+
+    @classmethod
+    def get_load_balancer(cls, base_urls: List[Optional[str]], api_key: str) -> LoadBalancer:
+        r"""Returns the shared load balancer of a set of replicas, creating
+        it on first use.
+
+        Args:
+            base_urls (List[Optional[str]]): The replicas.
+            api_key (str): The API key.
+
+        Returns:
+            LoadBalancer: The load balancer.
+        """
+        key = (tuple(base_urls), api_key)
+        with cls._lock:
+            if key not in cls._load_balancers:
+                cls._load_balancers[key] = LoadBalancer.from_env(base_urls, api_key)
+            return cls._load_balancers[key]
+
+    @classmethod
+    def format_replica_stats(cls) -> str:
+        with cls._lock:
+            load_balancers = list(cls._load_balancers.values())
+        return "\n\n".join(load_balancer.format_stats() for load_balancer in load_balancers)
+
+    @classmethod
+    def save_telemetry(cls) -> None:
+        r"""Saves the request latencies recorded by the hedgers of all load
+        balancers."""
+        with cls._lock:
+            load_balancers = list(cls._load_balancers.values())
+        for load_balancer in load_balancers:
+            load_balancer.hedger.save()
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._model_configs.clear()
+            cls._backends.clear()
+            cls._load_balancers.clear()
+
+
 class ModelFactory:
     r"""Factory of backend models.
 
@@ -160,7 +411,8 @@ class ModelFactory:
     """
 
     @staticmethod
-    def create(model_type: ModelType, model_config_dict: Dict) -> ModelBackend:
+    def create(model_type: ModelType, model_config_dict: Dict,
+               backend_config: Optional[BackendConfig] = None) -> ModelBackend:
         default_model_type = ModelType.GPT_3_5_TURBO
 
         if model_type in {
@@ -186,5 +438,72 @@ class ModelFactory:
             model_type = default_model_type
 
         # log_visualize("Model Type: {}".format(model_type))
-        inst = model_class(model_type, model_config_dict)
+        inst = ModelRegistry.get_backend(model_class, model_type, model_config_dict, backend_config)
         return inst
+
+
+class ModelRouter:
+    r"""Routes phases and roles to named backends, so that cheap phases can
+    be served by small models on other replicas.
+
+    A route maps a phase name or a role name to a backend name. A phase route
+    may also be a dict from role name to backend name, with :obj:`"*"` for
+    the other roles. Phase routes take precedence over role routes, and
+    unrouted phases and roles use the default backend of the chain.
+
+    Args:
+        backends (Dict[str, BackendConfig]): The named backends.
+        routes (Dict[str, Any]): Phase or role name to backend name.
+    """
+
+    DEFAULT = "default"
+
+    def __init__(self, backends: Dict[str, BackendConfig], routes: Dict[str, Any]) -> None:
+        self.backends = backends
+        self.routes = routes
+        for target in routes.values():
+            names = target.values() if isinstance(target, dict) else [target]
+            for name in names:
+                if name != self.DEFAULT and name not in backends:
+                    raise ValueError(f"Unknown backend in model routing: {name}")
+
+    @classmethod
+    def from_config(cls, chain_config: Dict, phase_config: Dict) -> "ModelRouter":
+        r"""Builds the router from the :obj:`backends` and :obj:`routing` of
+        :obj:`ChatChainConfig.json` and the :obj:`backend` of each phase in
+        :obj:`PhaseConfig.json`.
+
+        Args:
+            chain_config (Dict): The ChatChain config.
+            phase_config (Dict): The phase configs.
+
+        Returns:
+            ModelRouter: The router.
+        """
+        backends = {name: BackendConfig(name=name, **config)
+                    for name, config in chain_config.get("backends", {}).items()}
+        routes = dict(chain_config.get("routing", {}))
+        for phase_name, config in phase_config.items():
+            if "backend" in config:
+                routes[phase_name] = config["backend"]
+        return cls(backends, routes)
+
+    def resolve(self, phase_name: str, role_name: str) -> Optional[BackendConfig]:
+        r"""Returns the backend of a role in a phase.
+
+        Args:
+            phase_name (str): The phase name.
+            role_name (str): The role name.
+
+        Returns:
+            Optional[BackendConfig]: The named backend, or :obj:`None` for the
+                default backend.
+        """
+        route = self.routes.get(phase_name)
+        if isinstance(route, dict):
+            route = route.get(role_name, route.get("*"))
+        if route is None:
+            route = self.routes.get(role_name)
+        if route is None or route == self.DEFAULT:
+            return None
+        return self.backends[route]
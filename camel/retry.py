@@ -0,0 +1,116 @@
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+import email.utils
+import os
+import random
+import time
+from typing import Optional
+
+import openai
+
+# status codes worth retrying: request timeout, conflict, rate limit and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    r"""Retries of a single backend request. Requests are retried at the
+    backend boundary with the same messages, so the agent state (stored
+    messages) is never modified by a retry.
+
+    Args:
+        max_attempts (int): Attempts of a request, including the first one.
+            (default: :obj:`6`)
+        min_wait (float): Backoff of the first retry in seconds, doubled at
+            every retry. (default: :obj:`2`)
+        max_wait (float): Upper bound of the backoff and of server hints in
+            seconds. (default: :obj:`60`)
+    """
+
+    def __init__(self, max_attempts: int = 6, min_wait: float = 2, max_wait: float = 60) -> None:
+        self.max_attempts = max_attempts
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        r"""Builds a retry policy from the :obj:`CHATDEV_RETRY_ATTEMPTS`,
+        :obj:`CHATDEV_RETRY_MIN_WAIT` and :obj:`CHATDEV_RETRY_MAX_WAIT`
+        environment variables.
+        """
+        return cls(max_attempts=int(os.getenv("CHATDEV_RETRY_ATTEMPTS", "6")),
+                   min_wait=float(os.getenv("CHATDEV_RETRY_MIN_WAIT", "2")),
+                   max_wait=float(os.getenv("CHATDEV_RETRY_MAX_WAIT", "60")))
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        r"""Returns whether a request failing with :obj:`error` may succeed
+        when sent again. Bad requests, authentication errors and unknown
+        models are not retried.
+        """
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES
+        return False
+
+    @staticmethod
+    def is_server_failure(error: Exception) -> bool:
+        r"""Returns whether :obj:`error` means the endpoint is unreachable or
+        broken, which counts towards its circuit breaker. Rate limits do not:
+        the server is alive and asks to slow down.
+        """
+        if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+        return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+    @staticmethod
+    def retry_after(error: Exception) -> Optional[float]:
+        r"""Returns the wait in seconds the server asked for in the
+        :obj:`Retry-After` (seconds or HTTP date) or :obj:`retry-after-ms`
+        headers of an error response, if any.
+        """
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+        headers = response.headers
+        if headers.get("retry-after-ms"):
+            try:
+                return float(headers["retry-after-ms"]) / 1000
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date is None:
+            return None
+        return max(date.timestamp() - time.time(), 0.0)
+
+    def wait(self, attempt: int, error: Exception) -> float:
+        r"""Returns the seconds to wait before retrying after the
+        :obj:`attempt`-th attempt failed with :obj:`error`: the server hint if
+        given, exponential backoff with jitter otherwise.
+        """
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_wait)
+        backoff = min(self.min_wait * 2 ** (attempt - 1), self.max_wait)
+        return random.uniform(backoff / 2, backoff)
@@ -0,0 +1,212 @@
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+# Licensed under the Apache License, Version 2.0 (the “License”);
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an “AS IS” BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# =========== Copyright 2023 @ CAMEL-AI.org. All Rights Reserved. ===========
+import itertools
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+SCHEDULING_POLICIES = ["fifo", "srwf", "fair"]
+
+
+def parse_org_weights(value: str) -> Dict[str, float]:
+    r"""Parses organization weights written as :obj:`"OrgA:2,OrgB:1"`."""
+    weights = {}
+    for item in value.split(","):
+        if item.strip():
+            org, weight = item.rsplit(":", 1)
+            weights[org.strip()] = float(weight)
+    return weights
+
+
+class RequestScheduler:
+    r"""Orders the requests of concurrent projects (ChatChain sessions)
+    sharing a set of replicas.
+
+    At most :obj:`max_inflight` requests are in flight, the others wait in
+    a queue served by :obj:`policy`:
+
+    - ``fifo``: arrival order.
+    - ``srwf``: shortest remaining work first, the project with the fewest
+      remaining phase executions of its chain (cycles of composed phases
+      included) is served first, so that projects close to the end finish
+      sooner.
+    - ``fair``: weighted fair share of tokens per organization (``--org``),
+      the organization with the least tokens served per weight is served
+      first.
+
+    The queue only holds requests while the replicas are saturated, so it
+    does not reduce the throughput. With :obj:`server_priority`, the same
+    order is also sent as the ``priority`` of every request, which vLLM
+    servers started with ``--scheduling-policy priority`` use to order the
+    requests of all processes (lower values first).
+
+    Args:
+        policy (str): ``fifo``, ``srwf`` or ``fair``. (default: :obj:`fifo`)
+        max_inflight (int): Requests in flight before requests are queued,
+            0 for no limit. (default: :obj:`0`)
+        org_weights (Dict[str, float], optional): Weight of each
+            organization for ``fair``, 1 if missing. (default: :obj:`None`)
+        server_priority (bool): Whether requests carry a ``priority``.
+            (default: :obj:`False`)
+    """
+
+    # session id -> progress and queue statistics of the project, shared by the schedulers of all backends
+    projects: Dict[str, Dict[str, Any]] = {}
+    projects_lock = threading.Lock()
+
+    def __init__(
+            self,
+            policy: str = "fifo",
+            max_inflight: int = 0,
+            org_weights: Optional[Dict[str, float]] = None,
+            server_priority: bool = False,
+    ) -> None:
+        if policy not in SCHEDULING_POLICIES:
+            raise ValueError(f"Unknown scheduling policy: {policy}")
+        self.policy = policy
+        self.max_inflight = max_inflight
+        self.org_weights = org_weights or {}
+        self.server_priority = server_priority
+        self.inflight = 0
+        self.waiting: List[Dict[str, Any]] = []
+        # organization -> tokens served per weight, the virtual time of the fair share
+        self.org_served: Dict[str, float] = {}
+        self._arrivals = itertools.count()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "RequestScheduler":
+        r"""Builds a scheduler from the :obj:`CHATDEV_SCHEDULING_POLICY`,
+        :obj:`CHATDEV_MAX_INFLIGHT`, :obj:`CHATDEV_ORG_WEIGHTS` and
+        :obj:`CHATDEV_SERVER_PRIORITY` environment variables.
+        """
+        return cls(policy=os.getenv("CHATDEV_SCHEDULING_POLICY", "fifo"),
+                   max_inflight=int(os.getenv("CHATDEV_MAX_INFLIGHT", "0")),
+                   org_weights=parse_org_weights(os.getenv("CHATDEV_ORG_WEIGHTS", "")),
+                   server_priority=os.getenv("CHATDEV_SERVER_PRIORITY", "False").lower() == "true")
+
+    @classmethod
+    def get_project(cls, session_id: Optional[str]) -> Dict[str, Any]:
+        # callers hold projects_lock
+        if session_id not in cls.projects:
+            cls.projects[session_id] = {"org": None, "remaining_work": 0, "total_work": 0, "requests": 0,
+                                        "queued_requests": 0, "queue_wait": 0.0, "max_queue_wait": 0.0,
+                                        "served_tokens": 0}
+        return cls.projects[session_id]
+
+    @classmethod
+    def update_progress(cls, session_id: str, org: str, remaining_work: int, total_work: int) -> None:
+        r"""Records the progress of a project, called by ChatChain before
+        each phase execution.
+
+        Args:
+            session_id (str): The project, see :obj:`ChatAgent`.
+            org (str): The organization of the project.
+            remaining_work (int): Phase executions left in the chain.
+            total_work (int): Phase executions of the whole chain.
+        """
+        with cls.projects_lock:
+            project = cls.get_project(session_id)
+            project["org"] = org
+            project["remaining_work"] = remaining_work
+            project["total_work"] = total_work
+
+    def weight(self, org: Optional[str]) -> float:
+        return max(self.org_weights.get(org, 1.0), 1e-6)
+
+    def rank(self, session_id: Optional[str], arrival: int) -> tuple:
+        # smaller is served first, ties are broken by arrival
+        with RequestScheduler.projects_lock:
+            project = RequestScheduler.get_project(session_id)
+            remaining_work, org = project["remaining_work"], project["org"]
+        if self.policy == "srwf":
+            return remaining_work, arrival
+        if self.policy == "fair":
+            return self.org_served.get(org, 0.0), arrival
+        return (arrival,)
+
+    def priority(self, session_id: Optional[str]) -> Optional[int]:
+        r"""Returns the ``priority`` sent with a request of
+        :obj:`session_id`, or :obj:`None` if requests carry no priority.
+        For ``fair``, the server only sees the projects of all processes, so
+        the priority is the tokens served to the project per weight of its
+        organization, in thousands.
+        """
+        if not self.server_priority or self.policy == "fifo":
+            return None
+        with RequestScheduler.projects_lock:
+            project = RequestScheduler.get_project(session_id)
+            if self.policy == "srwf":
+                return int(project["remaining_work"])
+            return int(project["served_tokens"] / self.weight(project["org"]) / 1000)
+
+    def acquire(self, session_id: Optional[str], num_tokens: int) -> float:
+        r"""Waits until a request of :obj:`session_id` may be sent.
+
+        Args:
+            session_id (str, optional): The project of the request.
+            num_tokens (int): Prompt and reserved completion tokens of the
+                request, charged to its organization.
+
+        Returns:
+            float: The seconds the request was queued.
+        """
+        start_time = time.time()
+        with self._lock:
+            if self.max_inflight <= 0 or (self.inflight < self.max_inflight and len(self.waiting) == 0):
+                self.inflight += 1
+                queued = False
+            else:
+                waiter = {"session_id": session_id, "arrival": next(self._arrivals), "event": threading.Event()}
+                self.waiting.append(waiter)
+                queued = True
+        if queued:
+            # release() hands its slot over to the next waiter
+            waiter["event"].wait()
+        queue_wait = time.time() - start_time
+
+        with RequestScheduler.projects_lock:
+            project = RequestScheduler.get_project(session_id)
+            project["requests"] += 1
+            project["queued_requests"] += int(queued)
+            project["queue_wait"] += queue_wait
+            project["max_queue_wait"] = max(project["max_queue_wait"], queue_wait)
+            project["served_tokens"] += num_tokens
+            org = project["org"]
+        with self._lock:
+            if org not in self.org_served:
+                # an organization joining starts at the least served active one instead of at 0
+                self.org_served[org] = min(self.org_served.values(), default=0.0)
+            self.org_served[org] += num_tokens / self.weight(org)
+        return queue_wait
+
+    def release(self) -> None:
+        r"""Frees the slot of a finished request for the next queued one."""
+        with self._lock:
+            if len(self.waiting) == 0:
+                self.inflight -= 1
+                return
+            waiter = min(self.waiting, key=lambda waiter: self.rank(waiter["session_id"], waiter["arrival"]))
+            self.waiting.remove(waiter)
+        waiter["event"].set()
+
+    @classmethod
+    def format_project_stats(cls, session_id: Optional[str]) -> str:
+        with cls.projects_lock:
+            project = dict(cls.get_project(session_id))
+        return "requests: {}\nqueued requests: {}\ntotal queue wait: {:.2f}s\nmean queue wait: {:.2f}s\n" \
+               "max queue wait: {:.2f}s\n".format(
+                project["requests"], project["queued_requests"], project["queue_wait"],
+                project["queue_wait"] / max(project["requests"], 1), project["max_queue_wait"])
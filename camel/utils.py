@@ -17,12 +17,9 @@ import zipfile
 from functools import wraps
 from typing import Any, Callable, List, Optional, Set, TypeVar
 
-import requests
-import tiktoken
-import sentencepiece
-
 from camel.messages import OpenAIMessage
 from camel.typing import ModelType, TaskType
+from chatdev.profiling import profiler
 
 F = TypeVar('F', bound=Callable[..., Any])
 
@@ -55,6 +52,25 @@ def count_tokens_openai_chat_models(
     return num_tokens
 
 
+def get_model_encoding(model: ModelType) -> Any:
+    r"""Returns the tiktoken encoding used to count tokens for a model,
+    falling back to :obj:`cl100k_base` for models unknown to tiktoken.
+
+    Args:
+        model (ModelType): The type of the model.
+
+    Returns:
+        Any: The tiktoken encoding.
+    """
+    import tiktoken
+    try:
+        value_for_tiktoken = model.value_for_tiktoken
+        return tiktoken.encoding_for_model(value_for_tiktoken)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+@profiler.timed("tokenize")
 def num_tokens_from_messages(
         messages: List[OpenAIMessage],
         model: ModelType,
@@ -77,11 +93,7 @@ def num_tokens_from_messages(
         - https://platform.openai.com/docs/models/gpt-4
         - https://platform.openai.com/docs/models/gpt-3-5
     """
-    try:
-        value_for_tiktoken = model.value_for_tiktoken
-        encoding = tiktoken.encoding_for_model(value_for_tiktoken)
-    except KeyError:
-        encoding = tiktoken.get_encoding("cl100k_base")
+    encoding = get_model_encoding(model)
 
     if model in {
         ModelType.GPT_3_5_TURBO,
@@ -229,6 +241,7 @@ def get_first_int(string: str) -> Optional[int]:
 
 def download_tasks(task: TaskType, folder_path: str) -> None:
     # Define the path to save the zip file
+    import requests
     zip_file_path = os.path.join(folder_path, "tasks.zip")
 
     # Download the zip file from the Google Drive link
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import re
+import struct
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import openai
+
+from chatdev.utils import write_file_atomic
+
+try:
+    from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall
+    from openai.types.chat.chat_completion_message import FunctionCall
+
+    openai_new_api = True  # new openai api version
+except ImportError:
+    openai_new_api = False  # old openai api version
+
+
+def normalize_description(description):
+    """
+    descriptions differing only in case, punctuation, underscores or a .png suffix describe the same image
+    """
+    description = description.lower()
+    if description.endswith(".png"):
+        description = description[:-len(".png")]
+    description = re.sub(r"[_\W]+", " ", description)
+    return " ".join(description.split())
+
+
+def generate_with_openai(description, size):
+    import requests
+    if openai_new_api:
+        response = openai.images.generate(
+            prompt=description,
+            n=1,
+            size=size
+        )
+        image_url = response.data[0].url
+    else:
+        response = openai.Image.create(
+            prompt=description,
+            n=1,
+            size=size
+        )
+        image_url = response['data'][0]['url']
+    r = requests.get(image_url)
+    r.raise_for_status()
+    return r.content
+
+
+def generate_placeholder(description, size):
+    """
+    offline backend: a PNG with a vertical gradient whose colors are derived from the description
+    """
+    width, height = [int(side) for side in size.split("x")]
+    digest = hashlib.md5(description.encode("utf-8")).digest()
+    top, bottom = digest[0:3], digest[3:6]
+    rows = b""
+    for y in range(height):
+        color = bytes(int(top[channel] + (bottom[channel] - top[channel]) * y / max(height - 1, 1))
+                      for channel in range(3))
+        rows += b"\x00" + color * width
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) \
+        + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+IMAGE_BACKENDS = {"openai": generate_with_openai, "placeholder": generate_placeholder}
+
+
+class AssetPipeline:
+    """
+    generates the images used by the software, concurrently, each description at most once
+    generated images are cached by the hash of the backend, size and normalized description, across projects:
+    a background.png described as "blue sky" in two projects (or in two files of one project) is generated once
+    """
+
+    def __init__(self, cache_directory, backend="openai", size="256x256", max_workers=4):
+        """
+
+        Args:
+            cache_directory: directory of the generated images
+            backend: "openai" (image generation of the OpenAI API) or "placeholder" (local gradients, for offline runs)
+            size: image size, e.g. "256x256"
+            max_workers: images generated at once
+        """
+        if backend not in IMAGE_BACKENDS:
+            raise ValueError(f"Unknown image backend: {backend}")
+        self.cache_directory = cache_directory
+        self.backend = backend
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image")
+        self.generations = {}  # cache key -> Future of the cached image path, while generating
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(cache_directory=os.getenv("CHATDEV_IMAGE_CACHE_DIR",
+                                             os.path.join(os.path.dirname(os.path.dirname(__file__)), "WareHouse",
+                                                          ".image_cache")),
+                   backend=os.getenv("CHATDEV_IMAGE_BACKEND", "openai"),
+                   size=os.getenv("CHATDEV_IMAGE_SIZE", "256x256"),
+                   max_workers=int(os.getenv("CHATDEV_IMAGE_WORKERS", "4")))
+
+    def cache_path(self, description):
+        key = hashlib.md5("{}|{}|{}".format(self.backend, self.size, description).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_directory, key + ".png")
+
+    def generate(self, description) -> Future:
+        """
+        generate the image of a normalized description into the cache, unless it is already there or in progress
+        Returns:
+            future: path of the cached image
+
+        """
+        path = self.cache_path(description)
+        with self.lock:
+            future = self.generations.get(path)
+            if future is not None:
+                return future
+            future = Future()
+            if os.path.exists(path):
+                future.set_result(path)
+                return future
+            self.generations[path] = future
+
+        def run():
+            try:
+                write_file_atomic(path, IMAGE_BACKENDS[self.backend](description, self.size))
+                future.set_result(path)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    del self.generations[path]
+
+        self.executor.submit(run)
+        return future
+
+    def provide(self, images, directory):
+        """
+        put the images missing from a software directory in place
+        Args:
+            images: filename -> description
+            directory: software directory
+
+        Returns:
+            errors: filename -> error of the images that could not be generated
+
+        """
+        futures = {}
+        for filename, description in images.items():
+            filepath = os.path.join(directory, filename)
+            if not os.path.exists(filepath):
+                futures[filename] = self.generate(normalize_description(description))
+        errors = {}
+        for filename, future in futures.items():
+            filepath = os.path.join(directory, filename)
+            try:
+                with open(future.result(), "rb") as f:
+                    write_file_atomic(filepath, f.read())
+                print("{} Downloaded".format(filepath))
+            except Exception as e:
+                errors[filename] = e
+                print("{} could not be generated: {}".format(filepath, e))
+        return errors
+
+
+_pipeline = []
+_pipeline_lock = threading.Lock()
+
+
+def get_asset_pipeline() -> AssetPipeline:
+    """
+    process-wide pipeline, configured by the CHATDEV_IMAGE_* environment variables
+    """
+    with _pipeline_lock:
+        if not _pipeline:
+            _pipeline.append(AssetPipeline.from_env())
+        return _pipeline[0]
@@ -1,26 +1,38 @@
+import contextvars
+import copy
 import importlib
 import json
 import logging
 import os
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from camel.agents import RolePlaying
+from camel.completion_budget import CompletionBudget
 from camel.configs import ChatGPTConfig
+from camel.model_backend import ModelFactory, ModelRegistry, ModelRouter
+from camel.scheduler import RequestScheduler
 from camel.typing import TaskType, ModelType
 from chatdev.chat_env import ChatEnv, ChatEnvConfig
+from chatdev.phase_cache import PhaseCache
 from chatdev.statistics import get_info
+from chatdev.profiling import profiler
+from chatdev.tracing import tracer
 import chatdev.phase as phase
 import chatdev.composed_phase as composed_phase
-from camel.web_spider import modal_trans
-from chatdev.utils import log_visualize, now
+from visualizer.client import set_run
+from chatdev.utils import log_visualize, now, write_file_atomic
 
 
 def check_bool(s):
     return s.lower() == "true"
 
 
+CHECKPOINT_FILENAME = ".chatdev_checkpoint.json"
+
+
 class ChatChain:
 
     def __init__(self,
@@ -31,7 +43,8 @@ class ChatChain:
                  project_name: str = None,
                  org_name: str = None,
                  model_type: ModelType = ModelType.GPT_3_5_TURBO,
-                 code_path: str = None) -> None:
+                 code_path: str = None,
+                 resume_checkpoint: dict = None) -> None:
         """
 
         Args:
@@ -41,6 +54,7 @@ class ChatChain:
             task_prompt: the user input prompt for software
             project_name: the user input name for software
             org_name: the organization name of the human user
+            resume_checkpoint: checkpoint of an interrupted run (see ChatChain.load_checkpoint) to resume from
         """
 
         # load config file
@@ -63,6 +77,42 @@ class ChatChain:
         self.chain = self.config["chain"]
         self.recruitments = self.config["recruitments"]
         self.web_spider = self.config["web_spider"]
+        # run independent phases of the chain concurrently, according to the reads/writes declared by each phase
+        self.parallel_phases = check_bool(self.config.get("parallel_phases", "False"))
+        # per-phase completion-token budgets: "off", "fixed" (max_completion_tokens in PhaseConfig.json)
+        # or "adaptive" (percentile of the completion lengths recorded in earlier runs)
+        self.completion_budget = CompletionBudget(
+            mode=self.config.get("completion_budget", "off"),
+            budgets={phase_name: phase_config["max_completion_tokens"]
+                     for phase_name, phase_config in self.config_phase.items()
+                     if "max_completion_tokens" in phase_config},
+            # in a subdirectory, the files at the top of WareHouse/ are removed by clear_structure
+            telemetry_path=os.getenv("CHATDEV_COMPLETION_TELEMETRY",
+                                     os.path.join(os.path.dirname(os.path.dirname(__file__)), "WareHouse",
+                                                  ".telemetry", "completion_telemetry.json")),
+            percentile=float(os.getenv("CHATDEV_COMPLETION_PERCENTILE", "95")))
+        # "chat" (CEO/Counselor chatting), "light" (single compact completion) or "structured" (JSON-schema output)
+        self.reflection_mode = self.config.get("reflection_mode", "chat")
+        if self.reflection_mode not in ["chat", "light", "structured"]:
+            raise ValueError(f"Unknown reflection_mode: {self.reflection_mode}")
+        # phases and roles routed to named backends ("backends"/"routing" in ChatChainConfig.json, "backend" in PhaseConfig.json)
+        self.model_router = ModelRouter.from_config(self.config, self.config_phase)
+        # spans of the run exported to the software directory as a Chrome trace and OTLP JSON
+        if check_bool(self.config.get("trace", "False")):
+            tracer.enable()
+        # wall time, CPU time, LLM wait and allocation peaks of every step and phase, summed up in the software directory
+        if check_bool(self.config.get("profile", "False")):
+            profiler.enable_from_env()
+        # conclusions of deterministic early phases (DemandAnalysis, LanguageChoose, task prompt self-improvement)
+        # reused across runs of the same task, e.g. SRDD sweeps
+        self.phase_cache = None
+        if check_bool(self.config.get("phase_cache", "False")):
+            self.phase_cache = PhaseCache(
+                directory=os.getenv("CHATDEV_PHASE_CACHE_DIR",
+                                    os.path.join(os.path.dirname(os.path.dirname(__file__)), "WareHouse",
+                                                 ".phase_cache")),
+                ttl=float(os.getenv("CHATDEV_PHASE_CACHE_TTL", str(7 * 24 * 3600))),
+                max_entries=int(os.getenv("CHATDEV_PHASE_CACHE_MAX_ENTRIES", "10000")))
 
         # init default max chat turn
         self.chat_turn_limit_default = 10
@@ -73,7 +123,11 @@ class ChatChain:
                                              git_management=check_bool(self.config["git_management"]),
                                              incremental_develop=check_bool(self.config["incremental_develop"]),
                                              background_prompt=self.config["background_prompt"],
-                                             with_memory=check_bool(self.config["with_memory"]))
+                                             with_memory=check_bool(self.config["with_memory"]),
+                                             static_check=check_bool(self.config.get("static_check", "False")),
+                                             sandbox=check_bool(self.config.get("sandbox", "False")),
+                                             isolated_dependencies=check_bool(
+                                                 self.config.get("isolated_dependencies", "False")))
                                              
         self.chat_env = ChatEnv(self.chat_env_config)
 
@@ -90,6 +144,20 @@ class ChatChain:
         # init log
         self.start_time, self.log_filepath = self.get_logfilepath()
 
+        # init checkpoint cursor: indices of finished steps in self.chain,
+        # and (step index, cycle index) of the last finished cycle of a running ComposedPhase
+        self.resume_checkpoint = resume_checkpoint
+        self.finished_steps = set()
+        self.composed_cursor = None
+        if self.resume_checkpoint is not None:
+            self.start_time = self.resume_checkpoint["start_time"]
+            self.log_filepath = self.resume_checkpoint["log_filepath"]
+            self.finished_steps = set(self.resume_checkpoint["finished_steps"])
+            self.composed_cursor = self.resume_checkpoint["composed_cursor"]
+
+        # messages of this run are shown on their own channel of the visualizer
+        set_run("_".join([self.project_name, self.org_name, self.start_time]))
+
         # init SimplePhase instances
         # import all used phases in PhaseConfig.json from chatdev.phase
         # note that in PhaseConfig.json there only exist SimplePhases
@@ -98,11 +166,29 @@ class ChatChain:
         # self.phase_module = importlib.import_module("chatdev.phase")
         self.compose_phase_module = composed_phase
         self.phase_module = phase
-        self.phases = dict()
+        self.phases = self.create_phases("\n\n")
+
+        # ComposedPhase instances by name and cycle configuration, created once per chain instead of on every
+        # composed step, each with its own SimplePhase instances (whose prompts are joined by a single newline):
+        # phases keep state (phase_env, seminar_conclusion) while they execute, and ComposedPhases may execute
+        # concurrently (parallel_phases)
+        self.composed_phase_instances = dict()
+
+    def create_phases(self, prompt_separator: str) -> dict:
+        """
+        create an instance of every SimplePhase in PhaseConfig.json
+        Args:
+            prompt_separator: separator used to join the lines of each phase prompt
+
+        Returns:
+            phases: phase name -> SimplePhase instance
+
+        """
+        phases = dict()
         for _phase in self.config_phase:
             assistant_role_name = self.config_phase[_phase]['assistant_role_name']
             user_role_name = self.config_phase[_phase]['user_role_name']
-            phase_prompt = "\n\n".join(self.config_phase[_phase]['phase_prompt'])
+            phase_prompt = prompt_separator.join(self.config_phase[_phase]['phase_prompt'])
             phase_class = getattr(self.phase_module, _phase)
             phase_instance = phase_class(assistant_role_name=assistant_role_name,
                                          user_role_name=user_role_name,
@@ -111,7 +197,12 @@ class ChatChain:
                                          phase_name=_phase,
                                          model_type=self.model_type,
                                          log_filepath=self.log_filepath)
-            self.phases[_phase] = phase_instance
+            phase_instance.completion_budget = self.completion_budget
+            phase_instance.reflection_mode = self.reflection_mode
+            phase_instance.model_router = self.model_router
+            phase_instance.phase_cache = self.phase_cache
+            phases[_phase] = phase_instance
+        return phases
 
     def make_recruitment(self):
         """
@@ -120,16 +211,41 @@ class ChatChain:
 
         """
         for employee in self.recruitments:
-            self.chat_env.recruit(agent_name=employee)
+            if not self.chat_env.exist_employee(employee):
+                self.chat_env.recruit(agent_name=employee)
 
-    def execute_step(self, phase_item: dict):
+    def execute_step(self, phase_item: dict, step_index: int = None):
         """
         execute single phase in the chain
         Args:
             phase_item: single phase configuration in the ChatChainConfig.json
+            step_index: index of the step in self.chain; if given, a checkpoint is saved once the step is finished
 
         Returns:
 
+        """
+        self.update_progress()
+        self.chat_env = self.run_step(phase_item, self.chat_env, step_index)
+        if step_index is not None:
+            self.finished_steps.add(step_index)
+            self.composed_cursor = None
+            self.save_checkpoint(self.chat_env)
+
+    @tracer.traced(lambda self, phase_item, *args, **kwargs: "step:" + phase_item['phase'],
+                   lambda self, phase_item, *args, **kwargs: {"phase": phase_item['phase'],
+                                                              "phase_type": phase_item['phaseType']})
+    @profiler.profiled(lambda self, phase_item, *args, **kwargs: "step:" + phase_item['phase'])
+    def run_step(self, phase_item: dict, chat_env: ChatEnv, step_index: int = None) -> ChatEnv:
+        """
+        execute single phase in the chain on the given environment
+        Args:
+            phase_item: single phase configuration in the ChatChainConfig.json
+            chat_env: the environment the phase reads from and writes to
+            step_index: index of the step in self.chain, given to checkpoint the cycles of a ComposedPhase
+
+        Returns:
+            chat_env: updated environment
+
         """
 
         phase = phase_item['phase']
@@ -139,9 +255,9 @@ class ChatChain:
             max_turn_step = phase_item['max_turn_step']
             need_reflect = check_bool(phase_item['need_reflect'])
             if phase in self.phases:
-                self.chat_env = self.phases[phase].execute(self.chat_env,
-                                                           self.chat_turn_limit_default if max_turn_step <= 0 else max_turn_step,
-                                                           need_reflect)
+                chat_env = self.phases[phase].execute(chat_env,
+                                                      self.chat_turn_limit_default if max_turn_step <= 0 else max_turn_step,
+                                                      need_reflect)
             else:
                 raise RuntimeError(f"Phase '{phase}' is not yet implemented in chatdev.phase")
         # For ComposedPhase, we create instance here then conduct the "ComposedPhase.execute" method
@@ -151,16 +267,64 @@ class ChatChain:
             compose_phase_class = getattr(self.compose_phase_module, phase)
             if not compose_phase_class:
                 raise RuntimeError(f"Phase '{phase}' is not yet implemented in chatdev.compose_phase")
-            compose_phase_instance = compose_phase_class(phase_name=phase,
-                                                         cycle_num=cycle_num,
-                                                         composition=composition,
-                                                         config_phase=self.config_phase,
-                                                         config_role=self.config_role,
-                                                         model_type=self.model_type,
-                                                         log_filepath=self.log_filepath)
-            self.chat_env = compose_phase_instance.execute(self.chat_env)
+            # steps of the same ComposedPhase with the same cycles share an instance, they write the same keys so
+            # the DAG never executes them concurrently
+            instance_key = (phase, cycle_num, json.dumps(composition, sort_keys=True))
+            compose_phase_instance = self.composed_phase_instances.get(instance_key)
+            if compose_phase_instance is None:
+                compose_phase_instance = compose_phase_class(phase_name=phase,
+                                                             cycle_num=cycle_num,
+                                                             composition=composition,
+                                                             config_phase=self.config_phase,
+                                                             config_role=self.config_role,
+                                                             model_type=self.model_type,
+                                                             log_filepath=self.log_filepath,
+                                                             phases=self.create_phases("\n"))
+                self.composed_phase_instances[instance_key] = compose_phase_instance
+            start_cycle, on_cycle_end = 1, None
+            if step_index is not None:
+                if self.composed_cursor is not None and self.composed_cursor[0] == step_index:
+                    start_cycle = self.composed_cursor[1] + 1
+                    log_visualize(f"**[Resume]**\n\nresume ComposedPhase:[{phase}] from cycle {start_cycle}")
+
+                def on_cycle_end(cycle_index, cycle_chat_env):
+                    self.composed_cursor = [step_index, cycle_index]
+                    self.save_checkpoint(cycle_chat_env)
+                    self.update_progress()
+            chat_env = compose_phase_instance.execute(chat_env, start_cycle=start_cycle, on_cycle_end=on_cycle_end)
         else:
             raise RuntimeError(f"PhaseType '{phase_type}' is not yet implemented.")
+        return chat_env
+
+    @staticmethod
+    def get_step_work(phase_item: dict) -> int:
+        """
+        get the phase executions of a step of the chain, all cycles of a ComposedPhase included
+        Args:
+            phase_item: single phase configuration in the ChatChainConfig.json
+
+        Returns:
+            work: int
+
+        """
+        if phase_item['phaseType'] == "ComposedPhase":
+            return phase_item['cycleNum'] * len(phase_item['Composition'])
+        return 1
+
+    def update_progress(self):
+        """
+        report the remaining phase executions of this project to the request schedulers (camel.scheduler),
+        which may serve the requests of projects close to the end first
+        Returns: None
+
+        """
+        total_work = sum(self.get_step_work(phase_item) for phase_item in self.chain)
+        remaining_work = sum(self.get_step_work(phase_item) for step_index, phase_item in enumerate(self.chain)
+                             if step_index not in self.finished_steps)
+        if self.composed_cursor is not None and self.composed_cursor[0] not in self.finished_steps:
+            remaining_work -= self.composed_cursor[1] * len(self.chain[self.composed_cursor[0]]['Composition'])
+        RequestScheduler.update_progress(self.chat_env.env_dict['directory'], self.org_name, remaining_work,
+                                         total_work)
 
     def execute_chain(self):
         """
@@ -168,8 +332,149 @@ class ChatChain:
         Returns: None
 
         """
-        for phase_item in self.chain:
-            self.execute_step(phase_item)
+        if self.parallel_phases:
+            self.execute_chain_parallel()
+            return
+        for step_index, phase_item in enumerate(self.chain):
+            if step_index in self.finished_steps:
+                continue
+            self.execute_step(phase_item, step_index)
+
+    def get_phase_access(self, phase_item: dict):
+        """
+        get the chat_env keys/artifacts a step of the chain reads and writes
+        a ComposedPhase accesses the union of its SimplePhases
+        Args:
+            phase_item: single phase configuration in the ChatChainConfig.json
+
+        Returns:
+            (reads, writes) as sets, or (None, None) if any phase involved does not declare them
+
+        """
+        if phase_item['phaseType'] == "ComposedPhase":
+            sub_items = phase_item['Composition']
+        else:
+            sub_items = [phase_item]
+        # every phase uses the task prompt and the roster for chatting
+        reads, writes = {"task_prompt", "roster"}, set()
+        for sub_item in sub_items:
+            phase_instance = self.phases.get(sub_item['phase'])
+            if phase_instance is None or phase_instance.reads is None or phase_instance.writes is None:
+                return None, None
+            reads.update(phase_instance.reads)
+            writes.update(phase_instance.writes)
+        return reads, writes
+
+    def build_phase_dag(self):
+        """
+        derive the dependency DAG of the chain from the declared reads/writes of each step
+        step j depends on an earlier step i if one of them writes something the other one reads or writes
+        steps that do not declare their accesses are barriers
+        Returns:
+            dependencies: list, the indices of earlier steps each step depends on
+
+        """
+        accesses = [self.get_phase_access(phase_item) for phase_item in self.chain]
+        dependencies = []
+        for j, (reads_j, writes_j) in enumerate(accesses):
+            deps = set()
+            for i in range(j):
+                reads_i, writes_i = accesses[i]
+                if reads_i is None or reads_j is None:
+                    deps.add(i)
+                elif writes_i & (reads_j | writes_j) or reads_i & writes_j:
+                    deps.add(i)
+            dependencies.append(deps)
+        return dependencies
+
+    def fork_chat_env(self) -> ChatEnv:
+        forked_chat_env = copy.copy(self.chat_env)
+        forked_chat_env.env_dict = dict(self.chat_env.env_dict)
+        # the artifacts are changed in place by the phases (e.g. Codes._update_codes, or the caches Codes fills
+        # while it is read), each branch works on its own copies, its declared writes are merged back
+        for key in ["roster", "codes", "dependencies", "proposed_images", "incorporated_images", "requirements",
+                    "manuals"]:
+            setattr(forked_chat_env, key, copy.deepcopy(getattr(self.chat_env, key)))
+        return forked_chat_env
+
+    def merge_chat_env(self, forked_chat_env: ChatEnv, writes) -> None:
+        for key in sorted(writes):
+            if key in self.chat_env.env_dict:
+                self.chat_env.env_dict[key] = forked_chat_env.env_dict[key]
+            else:
+                setattr(self.chat_env, key, getattr(forked_chat_env, key))
+
+    def execute_chain_parallel(self):
+        """
+        execute the chain as a DAG: in each wave, all steps whose dependencies are finished run concurrently,
+        each on a forked ChatEnv, and their declared writes are merged back in chain order
+        Returns: None
+
+        """
+        dependencies = self.build_phase_dag()
+        finished = self.finished_steps
+        while len(finished) < len(self.chain):
+            wave = [index for index in range(len(self.chain))
+                    if index not in finished and dependencies[index] <= finished]
+            if len(wave) == 1:
+                self.execute_step(self.chain[wave[0]], wave[0])
+                continue
+
+            log_visualize("**[Execute Detail]**\n\nexecute phases concurrently: {}".format(
+                ", ".join(self.chain[index]['phase'] for index in wave)))
+            self.update_progress()
+            forked_chat_envs = [self.fork_chat_env() for _ in wave]
+            with ThreadPoolExecutor(max_workers=len(wave)) as executor:
+                # each step runs in a copy of the current context, so that its spans are nested in the current one
+                futures = [executor.submit(contextvars.copy_context().run, self.run_step, self.chain[index],
+                                           forked_chat_env)
+                           for index, forked_chat_env in zip(wave, forked_chat_envs)]
+                results = [future.result() for future in futures]
+            for index, result in zip(wave, results):
+                self.merge_chat_env(result, self.get_phase_access(self.chain[index])[1])
+                finished.add(index)
+            self.save_checkpoint(self.chat_env)
+
+    def save_checkpoint(self, chat_env: ChatEnv) -> None:
+        """
+        persist the phase cursor and the environment into the software directory,
+        so that an interrupted run can be restarted from its last completed phase (run.py --resume)
+        Args:
+            chat_env: environment to persist
+
+        Returns: None
+
+        """
+        checkpoint = {
+            "task_prompt_raw": self.task_prompt_raw,
+            "project_name": self.project_name,
+            "org_name": self.org_name,
+            "start_time": self.start_time,
+            "log_filepath": self.log_filepath,
+            "code_path": self.code_path,
+            "finished_steps": sorted(self.finished_steps),
+            "composed_cursor": self.composed_cursor,
+            "chat_env": chat_env.state_dict(),
+        }
+        write_file_atomic(os.path.join(chat_env.env_dict['directory'], CHECKPOINT_FILENAME),
+                          json.dumps(checkpoint, ensure_ascii=False, indent=1))
+
+    @staticmethod
+    def load_checkpoint(directory: str) -> dict:
+        """
+        load the checkpoint of an interrupted run
+        Args:
+            directory: software directory under WareHouse/
+
+        Returns:
+            checkpoint: dict written by ChatChain.save_checkpoint
+
+        """
+        checkpoint_path = os.path.join(directory, CHECKPOINT_FILENAME)
+        if not os.path.exists(checkpoint_path):
+            raise FileNotFoundError(f"No checkpoint found in {directory}")
+        with open(checkpoint_path, "r", encoding="utf8") as file:
+            return json.load(file)
 
     def get_logfilepath(self):
         """
@@ -189,12 +494,23 @@ class ChatChain:
                                     "{}.log".format("_".join([self.project_name, self.org_name, start_time])))
         return start_time, log_filepath
 
+    @tracer.traced("pre_processing")
     def pre_processing(self):
         """
         remove useless files and log some global config settings
         Returns: None
 
         """
+        if self.resume_checkpoint is not None:
+            self.chat_env.load_state_dict(self.resume_checkpoint["chat_env"])
+            if self.chat_env.config.with_memory is True:
+                self.chat_env.init_memory()
+            profiler.directory = self.chat_env.env_dict['directory']
+            log_visualize("**[Resume]**\n\nresume {} from checkpoint, finished steps: {}\n\n".format(
+                self.chat_env.env_dict['directory'],
+                ", ".join(self.chain[index]['phase'] for index in sorted(self.finished_steps)) or "None"))
+            return
+
         filepath = os.path.dirname(__file__)
         root = os.path.dirname(filepath)
         directory = os.path.join(root, "WareHouse")
@@ -209,6 +525,7 @@ class ChatChain:
 
         software_path = os.path.join(directory, "_".join([self.project_name, self.org_name, self.start_time]))
         self.chat_env.set_directory(software_path)
+        profiler.directory = software_path
 
         if self.chat_env.config.with_memory is True:
             self.chat_env.init_memory()
@@ -255,7 +572,10 @@ class ChatChain:
         else:
             self.chat_env.env_dict['task_prompt'] = self.task_prompt_raw
         if(check_bool(self.web_spider)):
+            # requests, bs4 and wikipediaapi are only imported by runs with the web spider
+            from camel.web_spider import modal_trans
             self.chat_env.env_dict['task_description'] = modal_trans(self.task_prompt_raw)
+        self.save_checkpoint(self.chat_env)
 
     def post_processing(self):
         """
@@ -265,6 +585,11 @@ class ChatChain:
         """
 
         self.chat_env.write_meta()
+        self.completion_budget.save()
+        ModelRegistry.save_telemetry()
+        checkpoint_path = os.path.join(self.chat_env.env_dict['directory'], CHECKPOINT_FILENAME)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
         filepath = os.path.dirname(__file__)
         root = os.path.dirname(filepath)
 
@@ -272,29 +597,35 @@ class ChatChain:
             log_git_info = "**[Git Information]**\n\n"
 
             self.chat_env.codes.version += 1
-            os.system("cd {}; git add .".format(self.chat_env.env_dict["directory"]))
-            log_git_info += "cd {}; git add .\n".format(self.chat_env.env_dict["directory"])
-            os.system("cd {}; git commit -m \"v{} Final Version\"".format(self.chat_env.env_dict["directory"],
-                                                                          self.chat_env.codes.version))
-            log_git_info += "cd {}; git commit -m \"v{} Final Version\"\n".format(self.chat_env.env_dict["directory"],
-                                                                                  self.chat_env.codes.version)
+            git_store = self.chat_env.codes._get_git_store()
+            commit_message = "v{} Final Version".format(self.chat_env.codes.version)
+            commit_id = git_store.commit(commit_message)
+            if commit_id is not None:
+                log_git_info += "git commit {} -m \"{}\"\n".format(commit_id[:7], commit_message)
+            else:
+                log_git_info += "nothing to commit for \"{}\"\n".format(commit_message)
             log_visualize(log_git_info)
 
             git_info = "**[Git Log]**\n\n"
-            import subprocess
-
-            # execute git log
-            command = "cd {}; git log".format(self.chat_env.env_dict["directory"])
-            completed_process = subprocess.run(command, shell=True, text=True, stdout=subprocess.PIPE)
-
-            if completed_process.returncode == 0:
-                log_output = completed_process.stdout
-            else:
-                log_output = "Error when executing " + command
-
-            git_info += log_output
+            git_info += git_store.format_log()
             log_visualize(git_info)
 
+        log_visualize("**[Replica Stats]**\n\n" + ModelRegistry.format_replica_stats())
+        if tracer.enabled:
+            trace_path = os.path.join(self.chat_env.env_dict['directory'], "trace.json")
+            otlp_path = os.path.join(self.chat_env.env_dict['directory'], "trace.otlp.json")
+            tracer.export_chrome_trace(trace_path)
+            tracer.export_otlp(otlp_path, resource_attributes={"project": self.project_name, "org": self.org_name})
+            log_visualize("**[Trace]**\n\nChrome trace (chrome://tracing, ui.perfetto.dev): {}\nOTLP JSON: {}\n".format(
+                trace_path, otlp_path))
+        if profiler.enabled:
+            profile_path = profiler.write_summary(self.chat_env.env_dict['directory'])
+            log_visualize("**[Profile]**\n\n{}\n\nsummary: {}\n".format(profiler.format_summary(), profile_path))
+        log_visualize("**[Scheduler Stats]**\n\n" +
+                      RequestScheduler.format_project_stats(self.chat_env.env_dict['directory']))
+        if self.phase_cache is not None:
+            log_visualize("**[Phase Cache]**\n\n" + self.phase_cache.format_stats())
+
         post_info = "**[Post Info]**\n\n"
         now_time = now()
         time_format = "%Y%m%d%H%M%S"
@@ -345,10 +676,26 @@ here is the short description:\"{}\".
 If the revised prompt is revised_version_of_the_description, 
 then you should return a message in a format like \"<INFO> revised_version_of_the_description\", do not return messages in other formats.""".format(
             task_prompt)
+        assistant_role_prompt = "You are an professional prompt engineer that can improve user input prompt to make LLM better understand these prompts."
+        user_role_prompt = "You are an user that want to use LLM to build software."
+        cache_key = None
+        if self.phase_cache is not None:
+            model_backend = ModelFactory.create(self.model_type, ChatGPTConfig().__dict__)
+            cache_key = self.phase_cache.make_key("SelfTaskImprove", self_task_improve_prompt, assistant_role_prompt,
+                                                  user_role_prompt,
+                                                  getattr(model_backend, "model_name", str(self.model_type.value)),
+                                                  getattr(model_backend, "model_config_dict", None))
+            revised_task_prompt = self.phase_cache.get(cache_key)
+            if revised_task_prompt is not None:
+                log_visualize(
+                    "**[Phase Cache Hit]**\n\nphase: SelfTaskImprove\n\n"
+                    "**[Task Prompt Self Improvement]**\n**Original Task Prompt**: {}\n**Improved Task Prompt**: {}".format(
+                        task_prompt, revised_task_prompt))
+                return revised_task_prompt
         role_play_session = RolePlaying(
             assistant_role_name="Prompt Engineer",
-            assistant_role_prompt="You are an professional prompt engineer that can improve user input prompt to make LLM better understand these prompts.",
-            user_role_prompt="You are an user that want to use LLM to build software.",
+            assistant_role_prompt=assistant_role_prompt,
+            user_role_prompt=user_role_prompt,
             user_role_name="User",
             task_type=TaskType.CHATDEV,
             task_prompt="Do prompt engineering on user query",
@@ -366,4 +713,6 @@ then you should return a message in a format like \"<INFO> revised_version_of_th
         log_visualize(
             "**[Task Prompt Self Improvement]**\n**Original Task Prompt**: {}\n**Improved Task Prompt**: {}".format(
                 task_prompt, revised_task_prompt))
+        if cache_key is not None:
+            self.phase_cache.put(cache_key, revised_task_prompt, "SelfTaskImprove")
         return revised_task_prompt
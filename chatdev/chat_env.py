@@ -6,22 +6,16 @@ import subprocess
 import time
 from typing import Dict
 
-import openai
-import requests
-
+from chatdev.assets import get_asset_pipeline
 from chatdev.codes import Codes
 from chatdev.documents import Documents
+from chatdev.profiling import profiler
+from chatdev.provisioning import get_provisioner
 from chatdev.roster import Roster
+from chatdev.sandbox import get_sandbox_pool
+from chatdev.static_check import StaticCheckReport, check_codebooks
+from chatdev.tracing import tracer
 from chatdev.utils import log_visualize
-from ecl.memory import Memory
-
-try:
-    from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall
-    from openai.types.chat.chat_completion_message import FunctionCall
-
-    openai_new_api = True  # new openai api version
-except ImportError:
-    openai_new_api = False  # old openai api version
 
 
 class ChatEnvConfig:
@@ -30,13 +24,19 @@ class ChatEnvConfig:
                  git_management,
                  incremental_develop,
                  background_prompt,
-                 with_memory):
+                 with_memory,
+                 static_check=False,
+                 sandbox=False,
+                 isolated_dependencies=False):
         self.clear_structure = clear_structure  # Whether to clear non-software files in the WareHouse and cache files in generated software path
         self.gui_design = gui_design  # Encourage ChatDev generate software with GUI
         self.git_management = git_management  # Whether to use git to manage the creation and changes of generated software
         self.incremental_develop = incremental_develop  # Whether to use incremental develop on an existing project
         self.background_prompt = background_prompt  # background prompt that will be added to every inquiry to LLM
         self.with_memory = with_memory # Wheter to use memroy in the interaction between agents
+        self.static_check = static_check  # Whether to check the code statically before running it in the Test phase
+        self.sandbox = sandbox  # Whether to run the software in the warm executors of chatdev.sandbox
+        self.isolated_dependencies = isolated_dependencies  # Whether to install missing modules into per-project overlays instead of the host environment
 
     def __str__(self):
         string = ""
@@ -46,6 +46,9 @@ class ChatEnvConfig:
         string += "ChatEnvConfig.gui_design: {}\n".format(self.gui_design)
         string += "ChatEnvConfig.incremental_develop: {}\n".format(self.incremental_develop)
         string += "ChatEnvConfig.background_prompt: {}\n".format(self.background_prompt)
+        string += "ChatEnvConfig.static_check: {}\n".format(self.static_check)
+        string += "ChatEnvConfig.sandbox: {}\n".format(self.sandbox)
+        string += "ChatEnvConfig.isolated_dependencies: {}\n".format(self.isolated_dependencies)
         return string
 
 
@@ -54,7 +57,9 @@ class ChatEnv:
         self.config = chat_env_config
         self.roster: Roster = Roster()
         self.codes: Codes = Codes()
-        self.memory: Memory = Memory()
+        self.memory = None  # ecl.memory.Memory, loaded by init_memory() when with_memory is on
+        self.static_check_report = None  # (codebook_version, StaticCheckReport) of the last static check
+        self.dependencies = []  # packages installed for the software, see fix_module_not_found_error
         self.proposed_images: Dict[str, str] = {}
         self.incorporated_images: Dict[str, str] = {}
         self.requirements: Documents = Documents()
@@ -71,13 +76,26 @@ class ChatEnv:
             "test_reports": ""
         }
 
-    @staticmethod
-    def fix_module_not_found_error(test_reports):
+    def fix_module_not_found_error(self, test_reports):
         if "ModuleNotFoundError" in test_reports:
-            for match in re.finditer(r"No module named '(\S+)'", test_reports, re.DOTALL):
-                module = match.group(1)
-                subprocess.Popen("pip install {}".format(module), shell=True).wait()
-                log_visualize("**[CMD Execute]**\n\n[CMD] pip install {}".format(module))
+            modules = [match.group(1) for match in re.finditer(r"No module named '(\S+)'", test_reports, re.DOTALL)]
+            # installed once per package from the wheelhouse of chatdev.provisioning, concurrent installs are shared
+            provisioner = get_provisioner(self.config.isolated_dependencies)
+            for module, package in provisioner.provision(modules).items():
+                if package is None:
+                    log_visualize("**[CMD Execute]**\n\n[CMD] no package could be installed for {}".format(module))
+                    continue
+                if package not in self.dependencies:
+                    self.dependencies.append(package)
+                log_visualize("**[CMD Execute]**\n\n[CMD] pip install {}".format(package))
+
+    def get_dependency_paths(self):
+        """
+        overlays of the installed packages, to put on the import path of the software (none without isolation)
+        """
+        if not self.config.isolated_dependencies:
+            return []
+        return get_provisioner(True).paths(self.dependencies)
 
     def set_directory(self, directory):
         assert len(self.env_dict['directory']) == 0
@@ -97,17 +115,97 @@ class ChatEnv:
         else:
             os.mkdir(self.env_dict['directory'])
     
+    def state_dict(self) -> dict:
+        """
+        compact, json-serializable snapshot of the environment for checkpointing (memory is not included)
+        Returns:
+            state: dict
+
+        """
+        return {
+            "env_dict": dict(self.env_dict),
+            "code_version": self.codes.version,
+            "codebooks": dict(self.codes.codebooks),
+            "code_hashes": dict(self.codes.written_hashes),
+            "requirements": dict(self.requirements.docbooks),
+            "requirement_hashes": dict(self.requirements.written_hashes),
+            "manuals": dict(self.manuals.docbooks),
+            "manual_hashes": dict(self.manuals.written_hashes),
+            "roster": list(self.roster.agents),
+            "proposed_images": dict(self.proposed_images),
+            "incorporated_images": dict(self.incorporated_images),
+            "dependencies": list(self.dependencies),
+        }
+
+    def load_state_dict(self, state: dict) -> None:
+        """
+        restore the environment from ChatEnv.state_dict, reusing the existing software directory
+        Args:
+            state: dict
+
+        Returns: None
+
+        """
+        self.env_dict.update(state["env_dict"])
+        directory = self.env_dict['directory']
+        self.codes.directory = directory
+        self.requirements.directory = directory
+        self.manuals.directory = directory
+        self.codes.version = state["code_version"]
+        self.codes._load_codebooks(state["codebooks"])
+        self.codes.written_hashes = dict(state["code_hashes"])
+        self.requirements.docbooks = dict(state["requirements"])
+        self.requirements.written_hashes = dict(state["requirement_hashes"])
+        self.manuals.docbooks = dict(state["manuals"])
+        self.manuals.written_hashes = dict(state["manual_hashes"])
+        self.roster.agents = list(state["roster"])
+        self.proposed_images = dict(state["proposed_images"])
+        self.incorporated_images = dict(state["incorporated_images"])
+        self.dependencies = list(state.get("dependencies", []))
+
     def init_memory(self):
+        # faiss and numpy are only imported by runs with memory
+        from ecl.memory import Memory
+        self.memory = Memory()
         self.memory.id_enabled = True
         self.memory.directory = os.path.join(os.getcwd(),"ecl","memory")
         if not os.path.exists(self.memory.directory):
             os.mkdir(self.memory.directory)
         self.memory.upload()
 
+    @tracer.traced("static_check")
+    def static_check(self) -> StaticCheckReport:
+        """
+        check the code without running it (see chatdev.static_check), once per version of the codebooks
+        Returns:
+            report: StaticCheckReport
+
+        """
+        version = self.codes.codebook_version
+        if self.static_check_report is None or self.static_check_report[0] != version:
+            report = check_codebooks(self.codes.codebooks, self.env_dict['directory'], self.get_dependency_paths())
+            log_visualize("**[Static Check]**\n\n{}".format(report))
+            # missing modules may be installed before the next check
+            self.static_check_report = (version, report) if not report.missing_modules else None
+            return report
+        return self.static_check_report[1]
+
+    @tracer.traced("exist_bugs")
+    @profiler.timed("exist_bugs")
     def exist_bugs(self) -> tuple[bool, str]:
         directory = self.env_dict['directory']
 
         success_info = "The software run successfully without errors."
+        dependency_paths = self.get_dependency_paths()
+        if self.config.sandbox:
+            result = get_sandbox_pool().run(directory, "main.py", timeout=3, paths=dependency_paths)
+            tracer.set_attributes(sandbox=True, exit_code=result.exit_code, timed_out=result.timed_out)
+            if "Traceback".lower() in result.stderr.lower():
+                return True, result.stderr.replace(os.path.abspath(directory) + "/", "")
+            return False, success_info
+        env = None
+        if dependency_paths:
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(dependency_paths + [os.environ.get("PYTHONPATH", "")]))
         try:
 
             # check if we are on windows or linux
@@ -118,7 +216,8 @@ class ChatEnv:
                     shell=True,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE,
-                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
+                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP,
+                    env=env
                 )
             else:
                 command = "cd {}; ls -l; python3 main.py;".format(directory)
@@ -126,7 +225,8 @@ class ChatEnv:
                                            shell=True,
                                            preexec_fn=os.setsid,
                                            stdout=subprocess.PIPE,
-                                           stderr=subprocess.PIPE
+                                           stderr=subprocess.PIPE,
+                                           env=env
                                            )
             time.sleep(3)
             return_code = process.returncode
@@ -213,15 +313,6 @@ class ChatEnv:
         print(os.path.join(directory, meta_filename), "Wrote")
 
     def generate_images_from_codes(self):
-        def download(img_url, file_name):
-            r = requests.get(img_url)
-            filepath = os.path.join(self.env_dict['directory'], file_name)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            with open(filepath, "wb") as f:
-                f.write(r.content)
-                print("{} Downloaded".format(filepath))
-
         regex = r"(\w+.png)"
         joined_codes = self.get_codes()
         matches = re.finditer(regex, joined_codes, re.DOTALL)
@@ -233,38 +324,10 @@ class ChatEnv:
             else:
                 self.incorporated_images[filename] = filename.replace("_", " ")
 
-        for filename in self.incorporated_images.keys():
-            if not os.path.exists(os.path.join(self.env_dict['directory'], filename)):
-                desc = self.incorporated_images[filename]
-                if desc.endswith(".png"):
-                    desc = desc.replace(".png", "")
-                print("{}: {}".format(filename, desc))
-                if openai_new_api:
-                    response = openai.images.generate(
-                        prompt=desc,
-                        n=1,
-                        size="256x256"
-                    )
-                    image_url = response.data[0].url
-                else:
-                    response = openai.Image.create(
-                        prompt=desc,
-                        n=1,
-                        size="256x256"
-                    )
-                    image_url = response['data'][0]['url']
-                download(image_url, filename)
+        # all the missing images at once, see chatdev.assets
+        get_asset_pipeline().provide(self.incorporated_images, self.env_dict['directory'])
 
     def get_proposed_images_from_message(self, messages):
-        def download(img_url, file_name):
-            r = requests.get(img_url)
-            filepath = os.path.join(self.env_dict['directory'], file_name)
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            with open(filepath, "wb") as f:
-                f.write(r.content)
-                print("{} Downloaded".format(filepath))
-
         regex = r"(\w+.png):(.*?)\n"
         matches = re.finditer(regex, messages, re.DOTALL)
         images = {}
@@ -283,28 +346,6 @@ class ChatEnv:
                 images[filename] = desc
                 print("{}: {}".format(filename, images[filename]))
 
-        for filename in images.keys():
-            if not os.path.exists(os.path.join(self.env_dict['directory'], filename)):
-                desc = images[filename]
-                if desc.endswith(".png"):
-                    desc = desc.replace(".png", "")
-                print("{}: {}".format(filename, desc))
-
-                if openai_new_api:
-                    response = openai.images.generate(
-                        prompt=desc,
-                        n=1,
-                        size="256x256"
-                    )
-                    image_url = response.data[0].url
-                else:
-                    response = openai.Image.create(
-                        prompt=desc,
-                        n=1,
-                        size="256x256"
-                    )
-                    image_url = response['data'][0]['url']
-
-                download(image_url, filename)
+        get_asset_pipeline().provide(images, self.env_dict['directory'])
 
         return images
@@ -3,7 +3,8 @@ import os
 import re
 import subprocess
 
-from chatdev.utils import log_visualize
+from chatdev.git_store import GitStore
+from chatdev.utils import log_visualize, content_hash, write_file_atomic
 
 
 class Codes:
@@ -12,6 +13,12 @@ class Codes:
         self.version: float = 0.0
         self.generated_content: str = generated_content
         self.codebooks = {}
+        self.git_store: GitStore = None
+        self.written_hashes = {}  # filename -> content hash of what is on disk, to skip unchanged files
+        # render cache: bumped on every change of the codebooks, so that _get_codes only re-renders changed files
+        self.codebook_version = 0
+        self.rendered_files = {}  # filename -> (code, fenced markdown of the file)
+        self.rendered_codes = None  # (codebook_version, concatenation of the rendered files)
 
         def extract_filename_from_line(lines):
             file_name = ""
@@ -71,7 +78,24 @@ class Codes:
 '''\n""" + unified_diff + "\n```"
 
                 log_visualize(update_codes_content)
-                self.codebooks[key] = new_codes.codebooks[key]
+                self._set_code(key, new_codes.codebooks[key])
+
+    def _set_code(self, filename, code) -> None:
+        self.codebooks[filename] = code
+        self.codebook_version += 1
+
+    def _load_codebooks(self, codebooks) -> None:
+        """
+        replace all the codebooks (e.g. when resuming from a checkpoint), dropping the render cache
+        Args:
+            codebooks: filename -> code
+
+        Returns: None
+
+        """
+        self.codebooks = dict(codebooks)
+        self.codebook_version += 1
+        self.rendered_files = {}
 
     def _rewrite_codes(self, git_management, phase_info=None) -> None:
         directory = self.directory
@@ -84,48 +108,66 @@ class Codes:
 
         for filename in self.codebooks.keys():
             filepath = os.path.join(directory, filename)
-            with open(filepath, "w", encoding="utf-8") as writer:
-                writer.write(self.codebooks[filename])
-                rewrite_codes_content += os.path.join(directory, filename) + " Wrote\n"
+            code_hash = content_hash(self.codebooks[filename])
+            if self.written_hashes.get(filename) == code_hash and os.path.exists(filepath):
+                continue
+            write_file_atomic(filepath, self.codebooks[filename])
+            self.written_hashes[filename] = code_hash
+            rewrite_codes_content += filepath + " Wrote\n"
+
+        for filename in [filename for filename in self.written_hashes.keys() if filename not in self.codebooks]:
+            filepath = os.path.join(directory, filename)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+                rewrite_codes_content += filepath + " Removed\n"
+            del self.written_hashes[filename]
 
         if git_management:
             if not phase_info:
                 phase_info = ""
+            git_store = self._get_git_store()
             log_git_info = "**[Git Information]**\n\n"
             if self.version == 1.0:
-                os.system("cd {}; git init".format(self.directory))
-                log_git_info += "cd {}; git init\n".format(self.directory)
-            os.system("cd {}; git add .".format(self.directory))
-            log_git_info += "cd {}; git add .\n".format(self.directory)
-
-            # check if there exist diff
-            completed_process = subprocess.run("cd {}; git status".format(self.directory), shell=True, text=True,
-                                               stdout=subprocess.PIPE)
-            if "nothing to commit" in completed_process.stdout:
+                git_store.init()
+                log_git_info += "git init {}\n".format(self.directory)
+
+            # an unchanged tree means there is nothing to commit
+            commit_message = "v{}".format(str(self.version) + " " + phase_info)
+            commit_id = git_store.commit(commit_message)
+            if commit_id is None:
                 self.version -= 1.0
                 return
+            log_git_info += "git commit {} -m \"{}\"\n".format(commit_id[:7], commit_message)
 
-            os.system("cd {}; git commit -m \"v{}\"".format(self.directory, str(self.version) + " " + phase_info))
-            log_git_info += "cd {}; git commit -m \"v{}\"\n".format(self.directory,
-                                                                      str(self.version) + " " + phase_info)
             if self.version == 1.0:
-                os.system("cd {}; git submodule add ./{} {}".format(os.path.dirname(os.path.dirname(self.directory)),
-                                                                    "WareHouse/" + os.path.basename(self.directory),
-                                                                    "WareHouse/" + os.path.basename(self.directory)))
-                log_git_info += "cd {}; git submodule add ./{} {}\n".format(
-                    os.path.dirname(os.path.dirname(self.directory)),
-                    "WareHouse/" + os.path.basename(self.directory),
-                    "WareHouse/" + os.path.basename(self.directory))
+                root = os.path.dirname(os.path.dirname(self.directory))
+                submodule_path = "WareHouse/" + os.path.basename(self.directory)
+                subprocess.run(["git", "submodule", "add", "./" + submodule_path, submodule_path], cwd=root,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                log_git_info += "cd {}; git submodule add ./{} {}\n".format(root, submodule_path, submodule_path)
                 log_visualize(rewrite_codes_content)
             log_visualize(log_git_info)
 
+    def _get_git_store(self) -> GitStore:
+        if self.git_store is None or self.git_store.directory != self.directory:
+            self.git_store = GitStore(self.directory)
+        return self.git_store
+
+    def _render_file(self, filename) -> str:
+        code = self.codebooks[filename]
+        rendered = self.rendered_files.get(filename)
+        if rendered is None or rendered[0] is not code:
+            rendered = (code, "{}\n```{}\n{}\n```\n\n".format(filename,
+                                                               "python" if filename.endswith(".py") else
+                                                               filename.split(".")[-1], code))
+            self.rendered_files[filename] = rendered
+        return rendered[1]
+
     def _get_codes(self) -> str:
-        content = ""
-        for filename in self.codebooks.keys():
-            content += "{}\n```{}\n{}\n```\n\n".format(filename,
-                                                       "python" if filename.endswith(".py") else filename.split(".")[
-                                                           -1], self.codebooks[filename])
-        return content
+        if self.rendered_codes is None or self.rendered_codes[0] != self.codebook_version:
+            self.rendered_codes = (self.codebook_version,
+                                   "".join(self._render_file(filename) for filename in self.codebooks.keys()))
+        return self.rendered_codes[1]
 
     def _load_from_hardware(self, directory) -> None:
         assert len([filename for filename in os.listdir(directory) if filename.endswith(".py")]) > 0
@@ -133,5 +175,5 @@ class Codes:
             for filename in filenames:
                 if filename.endswith(".py"):
                     code = open(os.path.join(directory, filename), "r", encoding="utf-8").read()
-                    self.codebooks[filename] = self._format_code(code)
+                    self._set_code(filename, self._format_code(code))
         log_visualize("{} files read from {}".format(len(self.codebooks.keys()), directory))
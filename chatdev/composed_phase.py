@@ -5,6 +5,7 @@ from collections import defaultdict
 
 from camel.typing import ModelType
 from chatdev.chat_env import ChatEnv
+from chatdev.tracing import tracer
 from chatdev.utils import log_visualize
 
 
@@ -20,7 +21,8 @@ class ComposedPhase(ABC):
                  config_phase: dict = None,
                  config_role: dict = None,
                  model_type: ModelType = ModelType.GPT_3_5_TURBO,
-                 log_filepath: str = ""
+                 log_filepath: str = "",
+                 phases: dict = None
                  ):
         """
 
@@ -30,6 +32,7 @@ class ComposedPhase(ABC):
             composition: list of SimplePhases in this ComposePhase
             config_phase: configuration of all SimplePhases
             config_role: configuration of all Roles
+            phases: SimplePhase instances to reuse (e.g. cached by ChatChain), built from config_phase if not given
         """
 
         self.phase_name = phase_name
@@ -53,6 +56,9 @@ class ComposedPhase(ABC):
             self.role_prompts[role] = "\n".join(self.config_role[role])
 
         # init all SimplePhases instances in this ComposedPhase
+        if phases is not None:
+            self.phases = phases
+            return
         self.phases = dict()
         for phase in self.config_phase:
             assistant_role_name = self.config_phase[phase]['assistant_role_name']
@@ -116,7 +122,7 @@ class ComposedPhase(ABC):
         """
         pass
 
-    def execute(self, chat_env) -> ChatEnv:
+    def execute(self, chat_env, start_cycle=1, on_cycle_end=None) -> ChatEnv:
         """
         similar to Phase.execute, but add control for breaking the loop
         1. receive information from environment(ComposedPhase): update the phase environment from global environment
@@ -130,34 +136,39 @@ class ComposedPhase(ABC):
 
         Args:
             chat_env: global chat chain environment
+            start_cycle: first cycle to execute, later than 1 when resuming from a checkpoint
+            on_cycle_end: optional callback(cycle_index, chat_env) called after each completed cycle
 
         Returns:
 
         """
         self.update_phase_env(chat_env)
-        for cycle_index in range(1, self.cycle_num + 1):
-            for phase_item in self.composition:
-                assert phase_item["phaseType"] == "SimplePhase"  # right now we do not support nested composition
-                phase = phase_item['phase']
-                max_turn_step = phase_item['max_turn_step']
-                need_reflect = check_bool(phase_item['need_reflect'])
-                self.phase_env["cycle_index"] = cycle_index
-                log_visualize(
-                    f"**[Execute Detail]**\n\nexecute SimplePhase:[{phase}] in ComposedPhase:[{self.phase_name}], cycle {cycle_index}")
-                if phase in self.phases:
-                    self.phases[phase].phase_env = self.phase_env
-                    self.phases[phase].update_phase_env(chat_env)
-                    if self.break_cycle(self.phases[phase].phase_env):
-                        return chat_env
-                    chat_env = self.phases[phase].execute(chat_env,
-                                                          self.chat_turn_limit_default if max_turn_step <= 0 else max_turn_step,
-                                                          need_reflect)
-                    if self.break_cycle(self.phases[phase].phase_env):
-                        return chat_env
-                else:
-                    print(f"Phase '{phase}' is not yet implemented. \
+        for cycle_index in range(start_cycle, self.cycle_num + 1):
+            with tracer.span("cycle:" + self.phase_name, phase=self.phase_name, cycle=cycle_index):
+                for phase_item in self.composition:
+                    assert phase_item["phaseType"] == "SimplePhase"  # right now we do not support nested composition
+                    phase = phase_item['phase']
+                    max_turn_step = phase_item['max_turn_step']
+                    need_reflect = check_bool(phase_item['need_reflect'])
+                    self.phase_env["cycle_index"] = cycle_index
+                    log_visualize(
+                        f"**[Execute Detail]**\n\nexecute SimplePhase:[{phase}] in ComposedPhase:[{self.phase_name}], cycle {cycle_index}")
+                    if phase in self.phases:
+                        self.phases[phase].phase_env = self.phase_env
+                        self.phases[phase].update_phase_env(chat_env)
+                        if self.break_cycle(self.phases[phase].phase_env):
+                            return chat_env
+                        chat_env = self.phases[phase].execute(chat_env,
+                                                              self.chat_turn_limit_default if max_turn_step <= 0 else max_turn_step,
+                                                              need_reflect)
+                        if self.break_cycle(self.phases[phase].phase_env):
+                            return chat_env
+                    else:
+                        print(f"Phase '{phase}' is not yet implemented. \
                             Please write its config in phaseConfig.json \
                             and implement it in chatdev.phase")
+            if on_cycle_end is not None:
+                on_cycle_end(cycle_index, chat_env)
         chat_env = self.update_chat_env(chat_env)
         return chat_env
 
@@ -205,7 +216,8 @@ class CodeReview(ComposedPhase):
         super().__init__(**kwargs)
 
     def update_phase_env(self, chat_env):
-        self.phase_env.update({"modification_conclusion": ""})
+        self.phase_env.update({"modification_conclusion": "", "reviewed_codebook_version": None,
+                               "unchanged_since_clean_check": False})
 
     def update_chat_env(self, chat_env):
         return chat_env
@@ -213,6 +225,10 @@ class CodeReview(ComposedPhase):
     def break_cycle(self, phase_env) -> bool:
         if "<INFO> Finished".lower() in phase_env['modification_conclusion'].lower():
             return True
+        elif phase_env.get('unchanged_since_clean_check', False):
+            log_visualize("**[Review Info]**\n\nThe code has not changed since the last review and passes the static "
+                          "check, the review is finished.\n")
+            return True
         else:
             return False
 
@@ -3,12 +3,15 @@ import os
 import time
 from colorama import Fore
 
+from chatdev.utils import content_hash, write_file_atomic
+
 
 class Documents():
     def __init__(self, generated_content = "", parse = True, predifined_filename = None):
         self.directory: str = None
         self.generated_content = generated_content
         self.docbooks = {}
+        self.written_hashes = {}  # filename -> content hash of what is on disk, to skip unchanged files
 
         if generated_content != "":
             if parse:
@@ -36,9 +39,19 @@ class Documents():
             os.mkdir(directory)
             print("{} Created.".format(directory))
         for filename in self.docbooks.keys():
-            with open(os.path.join(directory, filename), "w", encoding="utf-8") as writer:
-                writer.write(self.docbooks[filename])
-                print(os.path.join(directory, filename), "Writen")
+            filepath = os.path.join(directory, filename)
+            doc_hash = content_hash(self.docbooks[filename])
+            if self.written_hashes.get(filename) == doc_hash and os.path.exists(filepath):
+                continue
+            write_file_atomic(filepath, self.docbooks[filename])
+            self.written_hashes[filename] = doc_hash
+            print(filepath, "Writen")
+        for filename in [filename for filename in self.written_hashes.keys() if filename not in self.docbooks]:
+            filepath = os.path.join(directory, filename)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+                print(filepath, "Removed")
+            del self.written_hashes[filename]
 
     def _get_docs(self):
         content = ""
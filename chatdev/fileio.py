@@ -0,0 +1,38 @@
+import hashlib
+import os
+import threading
+
+# only the standard library is imported here: camel and chatdev.tracing use it, it must not import camel
+
+
+def content_hash(content: str) -> str:
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+def write_file_atomic(filepath: str, content) -> None:
+    """
+    write a file via a temp file in the same directory and os.replace,
+    so a concurrent reader (e.g. the program launched by ChatEnv.exist_bugs) never sees a half-written file
+    Args:
+        filepath: target file path
+        content: text content, or bytes for a binary file (e.g. an image)
+
+    Returns: None
+
+    """
+    directory = os.path.dirname(filepath) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, ".{}.{}.{}.tmp".format(os.path.basename(filepath), os.getpid(),
+                                                              threading.get_ident()))
+    try:
+        if isinstance(content, bytes):
+            with open(tmp_path, "wb") as writer:
+                writer.write(content)
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as writer:
+                writer.write(content)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
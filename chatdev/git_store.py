@@ -0,0 +1,393 @@
+import hashlib
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from chatdev.tracing import tracer
+
+
+class GitStore:
+    """
+    minimal in-process git backend for the generated software directory
+    blobs, trees, commits and the index are written directly in the loose-object format,
+    so every version is a real git commit (readable by `git log` / `git checkout`) without spawning a git process
+    """
+
+    IGNORED_NAMES = {".git", "__pycache__", ".chatdev_checkpoint.json"}
+    # files of the run (not of the software) at the top of the directory, see chatdev.profiling
+    IGNORED_PATHS = {"profiles", "profile.md", "profile.json"}
+
+    def __init__(self, directory: str, branch: str = "main"):
+        self.directory = directory
+        self.git_dir = os.path.join(directory, ".git")
+        self.branch = branch
+        self.author = "{} <{}>".format(os.getenv("GIT_AUTHOR_NAME", "ChatDev"),
+                                       os.getenv("GIT_AUTHOR_EMAIL", "chatdev@openbmb.cn"))
+        # (relative path) -> (mtime_ns, size, blob sha), so unchanged files are not re-hashed on every commit
+        self._stat_cache: Dict[str, Tuple[int, int, str]] = {}
+        # pack path -> (object sha -> offset in the pack), for repositories packed by `git gc`
+        self._pack_indexes: Dict[str, Dict[str, int]] = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.git_dir, "HEAD"))
+
+    def init(self) -> None:
+        if self.exists():
+            return
+        for sub_dir in ["objects", os.path.join("refs", "heads"), os.path.join("refs", "tags")]:
+            os.makedirs(os.path.join(self.git_dir, sub_dir), exist_ok=True)
+        with open(os.path.join(self.git_dir, "HEAD"), "w") as f:
+            f.write("ref: refs/heads/{}\n".format(self.branch))
+        with open(os.path.join(self.git_dir, "config"), "w") as f:
+            f.write("[core]\n\trepositoryformatversion = 0\n\tfilemode = true\n\tbare = false\n")
+        # so that `git status` does not list them either
+        os.makedirs(os.path.join(self.git_dir, "info"), exist_ok=True)
+        with open(os.path.join(self.git_dir, "info", "exclude"), "w") as f:
+            f.write("".join("/{}\n".format(path) for path in sorted(self.IGNORED_PATHS)))
+
+    # ----------------------------------------
+    #          Objects
+    # ----------------------------------------
+
+    def _object_path(self, sha: str) -> str:
+        return os.path.join(self.git_dir, "objects", sha[:2], sha[2:])
+
+    def _write_object(self, object_type: str, data: bytes) -> str:
+        raw = "{} {}\0".format(object_type, len(data)).encode() + data
+        sha = hashlib.sha1(raw).hexdigest()
+        path = self._object_path(sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                f.write(zlib.compress(raw, 1))
+            os.replace(tmp_path, path)
+        return sha
+
+    def _read_object(self, sha: str) -> Tuple[str, bytes]:
+        path = self._object_path(sha)
+        if not os.path.exists(path):
+            return self._read_packed_object(sha)
+        with open(path, "rb") as f:
+            raw = zlib.decompress(f.read())
+        header, data = raw.split(b"\0", 1)
+        return header.split(b" ")[0].decode(), data
+
+    # ----------------------------------------
+    #          Packs
+    # ----------------------------------------
+
+    PACK_TYPES = {1: "commit", 2: "tree", 3: "blob", 4: "tag"}
+    OFS_DELTA, REF_DELTA = 6, 7
+
+    def _load_pack_indexes(self) -> None:
+        pack_dir = os.path.join(self.git_dir, "objects", "pack")
+        if not os.path.isdir(pack_dir):
+            return
+        for filename in sorted(os.listdir(pack_dir)):
+            pack_path = os.path.join(pack_dir, filename[:-len(".idx")] + ".pack")
+            if not filename.endswith(".idx") or pack_path in self._pack_indexes or not os.path.exists(pack_path):
+                continue
+            with open(os.path.join(pack_dir, filename), "rb") as f:
+                data = f.read()
+            # pack index version 2: header, fan-out table, sorted shas, crc32s, 31-bit offsets, 64-bit offsets
+            if data[:8] != b"\377tOc" + struct.pack(">I", 2):
+                raise ValueError("Unsupported pack index {}".format(filename))
+            count = struct.unpack(">I", data[8 + 255 * 4:8 + 256 * 4])[0]
+            shas_start = 8 + 256 * 4
+            offsets_start = shas_start + count * 24
+            large_offsets_start = offsets_start + count * 4
+            index = {}
+            for position in range(count):
+                sha = data[shas_start + position * 20:shas_start + (position + 1) * 20].hex()
+                offset = struct.unpack(">I", data[offsets_start + position * 4:offsets_start + (position + 1) * 4])[0]
+                if offset & 0x80000000:
+                    large_position = large_offsets_start + (offset & 0x7FFFFFFF) * 8
+                    offset = struct.unpack(">Q", data[large_position:large_position + 8])[0]
+                index[sha] = offset
+            self._pack_indexes[pack_path] = index
+
+    def _read_packed_object(self, sha: str) -> Tuple[str, bytes]:
+        for refresh in [False, True]:
+            if refresh or not self._pack_indexes:
+                self._load_pack_indexes()
+            for pack_path, index in self._pack_indexes.items():
+                if sha in index:
+                    with open(pack_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as pack:
+                        return self._read_pack_entry(pack, index[sha])
+        raise ValueError("Git object {} not found in {}".format(sha, self.git_dir))
+
+    def _read_pack_entry(self, pack, offset: int) -> Tuple[str, bytes]:
+        byte = pack[offset]
+        object_type, position = (byte >> 4) & 7, offset + 1
+        while byte & 0x80:
+            byte = pack[position]
+            position += 1
+        if object_type == self.OFS_DELTA:
+            byte = pack[position]
+            position += 1
+            base_offset = byte & 0x7F
+            while byte & 0x80:
+                byte = pack[position]
+                position += 1
+                base_offset = ((base_offset + 1) << 7) | (byte & 0x7F)
+            base_type, base = self._read_pack_entry(pack, offset - base_offset)
+            return base_type, self._apply_delta(base, self._inflate(pack, position))
+        if object_type == self.REF_DELTA:
+            base_type, base = self._read_object(pack[position:position + 20].hex())
+            return base_type, self._apply_delta(base, self._inflate(pack, position + 20))
+        return self.PACK_TYPES[object_type], self._inflate(pack, position)
+
+    @staticmethod
+    def _inflate(pack, position: int) -> bytes:
+        decompressor = zlib.decompressobj()
+        data = b""
+        while not decompressor.eof:
+            chunk = pack[position:position + 65536]
+            if not chunk:
+                break
+            data += decompressor.decompress(chunk)
+            position += len(chunk)
+        return data
+
+    @staticmethod
+    def _apply_delta(base: bytes, delta: bytes) -> bytes:
+        position = 0
+        for _ in range(2):  # sizes of the base and of the result
+            while delta[position] & 0x80:
+                position += 1
+            position += 1
+        result = bytearray()
+        while position < len(delta):
+            opcode = delta[position]
+            position += 1
+            if opcode & 0x80:
+                # copy a range of the base, its offset and size given by the bytes flagged in the opcode
+                copy_offset = copy_size = 0
+                for bit in range(4):
+                    if opcode & (1 << bit):
+                        copy_offset |= delta[position] << (8 * bit)
+                        position += 1
+                for bit in range(3):
+                    if opcode & (1 << (4 + bit)):
+                        copy_size |= delta[position] << (8 * bit)
+                        position += 1
+                result += base[copy_offset:copy_offset + (copy_size or 0x10000)]
+            else:
+                result += delta[position:position + opcode]
+                position += opcode
+        return bytes(result)
+
+    def _write_tree(self, entries: Dict[str, Tuple[str, str]]) -> str:
+        """
+        Args:
+            entries: relative path -> (mode, blob sha)
+
+        Returns:
+            sha of the root tree
+        """
+        files, sub_dirs = {}, {}
+        for path, entry in entries.items():
+            if "/" in path:
+                head, tail = path.split("/", 1)
+                sub_dirs.setdefault(head, {})[tail] = entry
+            else:
+                files[path] = entry
+        items = [(name, mode, sha) for name, (mode, sha) in files.items()]
+        items += [(name, "40000", self._write_tree(sub_entries)) for name, sub_entries in sub_dirs.items()]
+        # git sorts tree entries as if directory names had a trailing slash
+        items.sort(key=lambda item: item[0] + "/" if item[1] == "40000" else item[0])
+        data = b"".join("{} {}\0".format(mode, name).encode() + bytes.fromhex(sha) for name, mode, sha in items)
+        return self._write_object("tree", data)
+
+    def _read_tree(self, tree_sha: str, prefix: str = "") -> Dict[str, str]:
+        _, data = self._read_object(tree_sha)
+        blobs = {}
+        while data:
+            header, data = data.split(b"\0", 1)
+            sha, data = data[:20].hex(), data[20:]
+            mode, name = header.decode().split(" ", 1)
+            if mode == "40000":
+                blobs.update(self._read_tree(sha, prefix + name + "/"))
+            else:
+                blobs[prefix + name] = sha
+        return blobs
+
+    # ----------------------------------------
+    #          Refs and Commits
+    # ----------------------------------------
+
+    def _head_ref(self) -> Optional[str]:
+        """
+        Returns: the ref HEAD points to (e.g. refs/heads/master in a repository created by git), None if detached
+
+        """
+        head_path = os.path.join(self.git_dir, "HEAD")
+        if not os.path.exists(head_path):
+            return "refs/heads/{}".format(self.branch)
+        with open(head_path, "r") as f:
+            head = f.read().strip()
+        return head[len("ref: "):] if head.startswith("ref: ") else None
+
+    def _read_ref(self, ref: str) -> Optional[str]:
+        ref_path = os.path.join(self.git_dir, *ref.split("/"))
+        if os.path.exists(ref_path):
+            with open(ref_path, "r") as f:
+                return f.read().strip() or None
+        # refs packed by `git gc` / `git pack-refs`
+        packed_refs_path = os.path.join(self.git_dir, "packed-refs")
+        if os.path.exists(packed_refs_path):
+            with open(packed_refs_path, "r") as f:
+                for line in f:
+                    if line.startswith(("#", "^")):
+                        continue
+                    sha, _, name = line.strip().partition(" ")
+                    if name == ref:
+                        return sha
+        return None
+
+    def head(self) -> Optional[str]:
+        """
+        Returns: sha of the commit HEAD points to, None before the first commit
+
+        """
+        ref = self._head_ref()
+        if ref is None:
+            with open(os.path.join(self.git_dir, "HEAD"), "r") as f:
+                return f.read().strip()
+        return self._read_ref(ref)
+
+    def _set_head(self, sha: str) -> None:
+        ref = self._head_ref()
+        if ref is None:  # detached
+            ref = "HEAD"
+        ref_path = os.path.join(self.git_dir, *ref.split("/"))
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        tmp_path = ref_path + ".lock"
+        with open(tmp_path, "w") as f:
+            f.write(sha + "\n")
+        os.replace(tmp_path, ref_path)
+
+    def read_commit(self, sha: str) -> Dict[str, str]:
+        _, data = self._read_object(sha)
+        header, message = data.decode("utf-8").split("\n\n", 1)
+        commit = {"sha": sha, "parent": None, "message": message.rstrip("\n")}
+        for line in header.split("\n"):
+            key, value = line.split(" ", 1)
+            if key in ["tree", "author"] or (key == "parent" and commit["parent"] is None):
+                commit[key] = value
+        return commit
+
+    def log(self) -> List[Dict[str, str]]:
+        """
+        Returns: commits from HEAD back to the root commit (newest first), following first parents
+
+        """
+        commits = []
+        sha = self.head()
+        while sha:
+            commit = self.read_commit(sha)
+            commits.append(commit)
+            sha = commit["parent"]
+        return commits
+
+    def format_log(self) -> str:
+        lines = []
+        for commit in self.log():
+            name, timestamp, timezone = commit["author"].rsplit(" ", 2)
+            date = time.strftime("%a %b %d %H:%M:%S %Y", time.localtime(int(timestamp)))
+            lines.append("commit {}\nAuthor: {}\nDate:   {} {}\n\n    {}\n".format(
+                commit["sha"], name, date, timezone, commit["message"]))
+        return "\n".join(lines)
+
+    def read_files(self, sha: str = None) -> Dict[str, bytes]:
+        """
+        read a historical version of the software without checking it out
+        Args:
+            sha: commit id, HEAD if not given
+
+        Returns:
+            relative path -> file content at that commit
+
+        """
+        sha = sha or self.head()
+        if sha is None:
+            return {}
+        blobs = self._read_tree(self.read_commit(sha)["tree"])
+        return {path: self._read_object(blob_sha)[1] for path, blob_sha in blobs.items()}
+
+    def _snapshot(self) -> Tuple[Dict[str, Tuple[str, str]], List[Tuple[str, os.stat_result, str]]]:
+        entries, index_entries = {}, []
+        stat_cache = {}
+        for root, directories, filenames in os.walk(self.directory):
+            top_level = os.path.abspath(root) == os.path.abspath(self.directory)
+            directories[:] = sorted(d for d in directories
+                                    if d not in self.IGNORED_NAMES and not (top_level and d in self.IGNORED_PATHS))
+            for filename in filenames:
+                if filename in self.IGNORED_NAMES or (top_level and filename in self.IGNORED_PATHS):
+                    continue
+                filepath = os.path.join(root, filename)
+                path = os.path.relpath(filepath, self.directory).replace(os.sep, "/")
+                st = os.stat(filepath)
+                cached = self._stat_cache.get(path)
+                if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+                    sha = cached[2]
+                else:
+                    with open(filepath, "rb") as f:
+                        sha = self._write_object("blob", f.read())
+                stat_cache[path] = (st.st_mtime_ns, st.st_size, sha)
+                mode = "100755" if st.st_mode & 0o111 else "100644"
+                entries[path] = (mode, sha)
+                index_entries.append((path, st, sha))
+        self._stat_cache = stat_cache
+        return entries, index_entries
+
+    def _write_index(self, index_entries: List[Tuple[str, os.stat_result, str]]) -> None:
+        # index format v2, so that `git status` in the generated software reports a clean tree
+        body = b""
+        for path, st, sha in sorted(index_entries, key=lambda entry: entry[0].encode()):
+            name = path.encode()
+            mode = 0o100755 if st.st_mode & 0o111 else 0o100644
+            fields = [int(st.st_ctime), st.st_ctime_ns % 1000000000, int(st.st_mtime), st.st_mtime_ns % 1000000000,
+                      st.st_dev, st.st_ino, mode, st.st_uid, st.st_gid, st.st_size]
+            entry = struct.pack(">10I", *[field & 0xFFFFFFFF for field in fields])
+            entry += bytes.fromhex(sha) + struct.pack(">H", min(len(name), 0xFFF)) + name
+            entry += b"\0" * (8 - len(entry) % 8)
+            body += entry
+        data = b"DIRC" + struct.pack(">II", 2, len(index_entries)) + body
+        tmp_path = os.path.join(self.git_dir, "index.lock")
+        with open(tmp_path, "wb") as f:
+            f.write(data + hashlib.sha1(data).digest())
+        os.replace(tmp_path, os.path.join(self.git_dir, "index"))
+
+    @tracer.traced("git_commit", lambda self, message: {"message": message})
+    def commit(self, message: str) -> Optional[str]:
+        """
+        snapshot the working directory into a new commit on the branch
+        Args:
+            message: commit message
+
+        Returns:
+            sha of the new commit, or None if there is nothing to commit
+
+        """
+        self.init()
+        entries, index_entries = self._snapshot()
+        tree_sha = self._write_tree(entries)
+        parent = self.head()
+        self._write_index(index_entries)
+        if parent is not None and self.read_commit(parent)["tree"] == tree_sha:
+            return None
+
+        timezone = time.strftime("%z", time.localtime()) or "+0000"
+        signature = "{} {} {}".format(self.author, int(time.time()), timezone)
+        data = "tree {}\n".format(tree_sha)
+        if parent is not None:
+            data += "parent {}\n".format(parent)
+        data += "author {}\ncommitter {}\n\n{}\n".format(signature, signature, message)
+        sha = self._write_object("commit", data.encode("utf-8"))
+        self._set_head(sha)
+        return sha
@@ -1,18 +1,32 @@
+import hashlib
+import json
 import os
 import re
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 import yaml
 from pathlib import Path
 
 from camel.agents import RolePlaying
+from camel.configs import ChatGPTConfig
 from camel.messages import ChatMessage
+from camel.model_backend import ModelFactory
 from camel.typing import TaskType, ModelType
 from chatdev.chat_env import ChatEnv
+from chatdev.profiling import profiler
 from chatdev.statistics import get_info
+from chatdev.tracing import tracer
 from chatdev.utils import log_visualize, log_arguments, convert_model_name
 
 
 class Phase(ABC):
+    # conversation hash -> reflected content of the "light"/"structured" reflection, shared by all phases and chains,
+    # least recently used first and bounded by reflection_cache_size
+    reflection_cache = OrderedDict()
+    reflection_cache_size = 256
+    reflection_cache_lock = threading.Lock()
+    light_reflection_prompt = "You extract the final conclusion of a conversation between employees of a software company. Answer only what is asked, without any other words."
 
     def __init__(self,
                  assistant_role_name,
@@ -45,8 +59,27 @@ class Phase(ABC):
         self.reflection_prompt = """Here is a conversation between two roles: {conversations} {question}"""
         self.model_type = model_type
         self.log_filepath = log_filepath
+        # keys of chat_env.env_dict / ChatEnv artifacts (codes, requirements, manuals, proposed_images, ...)
+        # that this phase reads and writes, used by ChatChain to derive the phase dependency DAG
+        # None means undeclared, and the phase is scheduled as a barrier
+        self.reads = None
+        self.writes = None
+        # per-phase completion-token budgets (camel.completion_budget.CompletionBudget), set by ChatChain
+        self.completion_budget = None
+        # "chat": reflection is a CEO/Counselor chatting, "light": a single completion with a minimal system prompt,
+        # "structured": a single completion constrained to a JSON schema, set by ChatChain
+        self.reflection_mode = "chat"
+        # routes phases and roles to named backends (camel.model_backend.ModelRouter), set by ChatChain
+        self.model_router = None
+        # whether the conclusion only depends on the inputs in cache_key, so that it can be reused across runs
+        self.cacheable = False
+        # cross-run cache of conclusions of cacheable phases (chatdev.phase_cache.PhaseCache), set by ChatChain
+        self.phase_cache = None
 
     @log_arguments
+    @tracer.traced(lambda self, *args, **kwargs: "chatting:" + str(kwargs.get("phase_name")),
+                   lambda self, *args, **kwargs: {"phase": kwargs.get("phase_name"),
+                                                  "chat_turn_limit": kwargs.get("chat_turn_limit")})
     def chatting(
             self,
             chat_env,
@@ -97,6 +130,15 @@ class Phase(ABC):
             raise ValueError(f"{user_role_name} not recruited in ChatEnv.")
 
         # init role play
+        # the software directory identifies the project, whose requests are kept on one replica
+        session_id = chat_env.env_dict.get('directory')
+        assistant_agent_kwargs = dict(completion_budget=self.completion_budget, phase_name=phase_name,
+                                      session_id=session_id)
+        user_agent_kwargs = dict(completion_budget=self.completion_budget, phase_name=phase_name,
+                                 session_id=session_id)
+        if self.model_router is not None:
+            assistant_agent_kwargs["backend_config"] = self.model_router.resolve(phase_name, assistant_role_name)
+            user_agent_kwargs["backend_config"] = self.model_router.resolve(phase_name, user_role_name)
         role_play_session = RolePlaying(
             assistant_role_name=assistant_role_name,
             user_role_name=user_role_name,
@@ -107,7 +149,9 @@ class Phase(ABC):
             with_task_specify=with_task_specify,
             memory=memory,
             model_type=model_type,
-            background_prompt=chat_env.config.background_prompt
+            background_prompt=chat_env.config.background_prompt,
+            assistant_agent_kwargs=assistant_agent_kwargs,
+            user_agent_kwargs=user_agent_kwargs
         )
 
         # log_visualize("System", role_play_session.assistant_sys_msg)
@@ -132,7 +176,8 @@ class Phase(ABC):
             # 4. then input_assistant_msg send to LLM and get user_response
             # all above are done in role_play_session.step, which contains two interactions with LLM
             # the first interaction is logged in role_play_session.init_chat
-            assistant_response, user_response = role_play_session.step(input_user_msg, chat_turn_limit == 1)
+            with tracer.span("turn:" + str(phase_name), phase=phase_name, turn=i):
+                assistant_response, user_response = role_play_session.step(input_user_msg, chat_turn_limit == 1)
 
             conversation_meta = "**" + assistant_role_name + "<->" + user_role_name + " on : " + str(
                 phase_name) + ", turn " + str(i) + "**\n\n"
@@ -184,6 +229,7 @@ class Phase(ABC):
         seminar_conclusion = seminar_conclusion.split("<INFO>")[-1]
         return seminar_conclusion
 
+    @tracer.traced("reflection", lambda self, task_prompt, role_play_session, phase_name, chat_env: {"phase": phase_name})
     def self_reflection(self,
                         task_prompt: str,
                         role_play_session: RolePlaying,
@@ -204,6 +250,9 @@ class Phase(ABC):
         messages = role_play_session.assistant_agent.stored_messages if len(
             role_play_session.assistant_agent.stored_messages) >= len(
             role_play_session.user_agent.stored_messages) else role_play_session.user_agent.stored_messages
+        if self.reflection_mode != "chat":
+            # the system message only holds the role prompt, the conclusion is in the turns
+            messages = messages[1:]
         messages = ["{}: {}".format(message.role_name, message.content.replace("\n\n", "\n")) for message in messages]
         messages = "\n\n".join(messages)
 
@@ -218,22 +267,13 @@ class Phase(ABC):
         else:
             raise ValueError(f"Reflection of phase {phase_name}: Not Assigned.")
 
-        # Reflections actually is a special phase between CEO and counselor
-        # They read the whole chatting history of this phase and give refined conclusion of this phase
-        reflected_content = \
-            self.chatting(chat_env=chat_env,
-                          task_prompt=task_prompt,
-                          assistant_role_name="Chief Executive Officer",
-                          user_role_name="Counselor",
-                          phase_prompt=self.reflection_prompt,
-                          phase_name="Reflection",
-                          assistant_role_prompt=self.ceo_prompt,
-                          user_role_prompt=self.counselor_prompt,
-                          placeholders={"conversations": messages, "question": question},
-                          need_reflect=False,
-                          memory=chat_env.memory,
-                          chat_turn_limit=1,
-                          model_type=self.model_type)
+        if self.reflection_mode != "chat":
+            reflected_content = self.light_reflection(messages, question, phase_name,
+                                                      chat_env.env_dict.get('directory'))
+        else:
+            # Reflections actually is a special phase between CEO and counselor
+            # They read the whole chatting history of this phase and give refined conclusion of this phase
+            reflected_content = self.chat_reflection(task_prompt, messages, question, chat_env)
 
         if "recruiting" in phase_name:
             if "Yes".lower() in reflected_content.lower():
@@ -242,6 +282,81 @@ class Phase(ABC):
         else:
             return reflected_content
 
+    def chat_reflection(self, task_prompt: str, messages: str, question: str, chat_env: ChatEnv) -> str:
+        return self.chatting(chat_env=chat_env,
+                             task_prompt=task_prompt,
+                             assistant_role_name="Chief Executive Officer",
+                             user_role_name="Counselor",
+                             phase_prompt=self.reflection_prompt,
+                             phase_name="Reflection",
+                             assistant_role_prompt=self.ceo_prompt,
+                             user_role_prompt=self.counselor_prompt,
+                             placeholders={"conversations": messages, "question": question},
+                             need_reflect=False,
+                             memory=chat_env.memory,
+                             chat_turn_limit=1,
+                             model_type=self.model_type)
+
+    def light_reflection(self, messages: str, question: str, phase_name: str, session_id: str = None) -> str:
+        """
+        reflection as one compact completion: a minimal system prompt and the conversation turns, no RolePlaying
+        session or memory retrieval; results are cached by the hash of the conversation and question
+        Args:
+            messages: the conversation of the phase which needs reflection
+            question: what to extract from the conversation
+            phase_name: name of the chat phase which needs reflection
+            session_id: project the request belongs to, see ChatAgent
+
+        Returns:
+            reflected_content: str, reflected results
+
+        """
+        structured = self.reflection_mode == "structured"
+        backend_config = None
+        if self.model_router is not None:
+            backend_config = self.model_router.resolve("Reflection", "Chief Executive Officer")
+        model_name = backend_config.model if backend_config is not None else str(self.model_type.value)
+        key = hashlib.md5("\n".join([model_name, self.reflection_mode, question, messages])
+                          .encode("utf-8")).hexdigest()
+        with Phase.reflection_cache_lock:
+            reflected_content = Phase.reflection_cache.get(key)
+            if reflected_content is not None:
+                Phase.reflection_cache.move_to_end(key)
+        if reflected_content is not None:
+            log_visualize("**[Reflection Cache Hit]**\n\nphase: {}\n\n{}".format(phase_name, reflected_content))
+            return reflected_content
+
+        request = dict(session_id=session_id, phase_name="Reflection", messages=[
+            {"role": "system", "content": self.light_reflection_prompt},
+            {"role": "user", "content": "Conversation:\n\n{}\n\n{}".format(messages, question)},
+        ])
+        if structured:
+            answer_schema = {"type": "string", "enum": ["Yes", "No"]} if "recruiting" in phase_name else {"type": "string"}
+            request["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "reflection", "strict": True,
+                                "schema": {"type": "object", "properties": {"answer": answer_schema},
+                                           "required": ["answer"], "additionalProperties": False}}}
+        model_backend = ModelFactory.create(self.model_type, ChatGPTConfig().__dict__, backend_config)
+        response = model_backend.run(**request)
+        reflected_content = response.choices[0].message.content or ""
+        if structured:
+            try:
+                reflected_content = str(json.loads(reflected_content)["answer"])
+            except (ValueError, KeyError, TypeError):
+                pass
+        reflected_content = reflected_content.strip()
+
+        # same format as the turns logged by chatting, so that statistics count the reflection
+        log_visualize("Chief Executive Officer",
+                      "**Chief Executive Officer<->Counselor on : Reflection, turn 0**\n\n" + reflected_content)
+        with Phase.reflection_cache_lock:
+            Phase.reflection_cache[key] = reflected_content
+            Phase.reflection_cache.move_to_end(key)
+            while len(Phase.reflection_cache) > Phase.reflection_cache_size:
+                Phase.reflection_cache.popitem(last=False)
+        return reflected_content
+
     @abstractmethod
     def update_phase_env(self, chat_env):
         """
@@ -277,6 +392,34 @@ class Phase(ABC):
         """
         pass
 
+    def cache_key(self, chat_env, chat_turn_limit, need_reflect) -> str:
+        """
+        key of the conclusion of this phase in the phase cache: everything the chatting depends on
+        Args:
+            chat_env: global chat chain environment
+            chat_turn_limit: turn limit in each chat
+            need_reflect: flag for reflection
+
+        Returns:
+            key: str
+
+        """
+        # model and effective sampling params (model config file and routed backend included) of both roles
+        models = []
+        for role_name in [self.assistant_role_name, self.user_role_name]:
+            backend_config = None
+            if self.model_router is not None:
+                backend_config = self.model_router.resolve(self.phase_name, role_name)
+            model_backend = ModelFactory.create(self.model_type, ChatGPTConfig().__dict__, backend_config)
+            models.append([getattr(model_backend, "model_name", str(self.model_type.value)),
+                           getattr(model_backend, "model_config_dict", None)])
+        return self.phase_cache.make_key(self.phase_name, self.phase_prompt,
+                                         self.assistant_role_prompt, self.user_role_prompt,
+                                         chat_env.env_dict['task_prompt'], self.phase_env,
+                                         chat_turn_limit, need_reflect, self.reflection_mode,
+                                         chat_env.config.background_prompt, models)
+
+    @profiler.profiled(lambda self, *args, **kwargs: "phase:" + self.phase_name, dump=True)
     def execute(self, chat_env, chat_turn_limit, need_reflect) -> ChatEnv:
         """
         execute the chatting in this phase
@@ -293,20 +436,30 @@ class Phase(ABC):
 
         """
         self.update_phase_env(chat_env)
-        self.seminar_conclusion = \
-            self.chatting(chat_env=chat_env,
-                          task_prompt=chat_env.env_dict['task_prompt'],
-                          need_reflect=need_reflect,
-                          assistant_role_name=self.assistant_role_name,
-                          user_role_name=self.user_role_name,
-                          phase_prompt=self.phase_prompt,
-                          phase_name=self.phase_name,
-                          assistant_role_prompt=self.assistant_role_prompt,
-                          user_role_prompt=self.user_role_prompt,
-                          chat_turn_limit=chat_turn_limit,
-                          placeholders=self.phase_env,
-                          memory=chat_env.memory,
-                          model_type=self.model_type)
+        # with memory, the conclusion also depends on the experiences retrieved, which are not part of the key
+        use_cache = self.cacheable and self.phase_cache is not None and not chat_env.config.with_memory
+        cache_key = self.cache_key(chat_env, chat_turn_limit, need_reflect) if use_cache else None
+        cached_conclusion = self.phase_cache.get(cache_key) if use_cache else None
+        if cached_conclusion is not None:
+            self.seminar_conclusion = cached_conclusion
+            log_visualize("**[Phase Cache Hit]**\n\nphase: {}\n\n{}".format(self.phase_name, cached_conclusion))
+        else:
+            self.seminar_conclusion = \
+                self.chatting(chat_env=chat_env,
+                              task_prompt=chat_env.env_dict['task_prompt'],
+                              need_reflect=need_reflect,
+                              assistant_role_name=self.assistant_role_name,
+                              user_role_name=self.user_role_name,
+                              phase_prompt=self.phase_prompt,
+                              phase_name=self.phase_name,
+                              assistant_role_prompt=self.assistant_role_prompt,
+                              user_role_prompt=self.user_role_prompt,
+                              chat_turn_limit=chat_turn_limit,
+                              placeholders=self.phase_env,
+                              memory=chat_env.memory,
+                              model_type=self.model_type)
+            if use_cache:
+                self.phase_cache.put(cache_key, self.seminar_conclusion, self.phase_name)
         chat_env = self.update_chat_env(chat_env)
         return chat_env
 
@@ -314,6 +467,9 @@ class Phase(ABC):
 class DemandAnalysis(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.cacheable = True
+        self.reads = ["task_prompt"]
+        self.writes = ["modality"]
 
     def update_phase_env(self, chat_env):
         pass
@@ -327,6 +483,9 @@ class DemandAnalysis(Phase):
 class LanguageChoose(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.cacheable = True
+        self.reads = ["task_prompt", "task_description", "modality", "ideas"]
+        self.writes = ["language"]
 
     def update_phase_env(self, chat_env):
         self.phase_env.update({"task": chat_env.env_dict['task_prompt'],
@@ -347,6 +506,8 @@ class LanguageChoose(Phase):
 class Coding(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "task_description", "modality", "ideas", "language"]
+        self.writes = ["codes"]
 
     def update_phase_env(self, chat_env):
         gui = "" if not chat_env.config.gui_design \
@@ -371,6 +532,8 @@ class Coding(Phase):
 class ArtDesign(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "task_description", "language", "codes"]
+        self.writes = ["proposed_images"]
 
     def update_phase_env(self, chat_env):
         self.phase_env = {"task": chat_env.env_dict['task_prompt'],
@@ -388,6 +551,8 @@ class ArtDesign(Phase):
 class ArtIntegration(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "language", "codes", "proposed_images"]
+        self.writes = ["codes"]
 
     def update_phase_env(self, chat_env):
         self.phase_env = {"task": chat_env.env_dict['task_prompt'],
@@ -409,6 +574,8 @@ class ArtIntegration(Phase):
 class CodeComplete(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "modality", "ideas", "language", "codes"]
+        self.writes = ["codes"]
 
     def update_phase_env(self, chat_env):
         self.phase_env.update({"task": chat_env.env_dict['task_prompt'],
@@ -440,6 +607,9 @@ class CodeComplete(Phase):
 class CodeReviewComment(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        # dependencies: import paths of the static check
+        self.reads = ["task_prompt", "modality", "ideas", "language", "codes", "incorporated_images", "dependencies"]
+        self.writes = ["review_comments"]
 
     def update_phase_env(self, chat_env):
         self.phase_env.update(
@@ -449,6 +619,12 @@ class CodeReviewComment(Phase):
              "language": chat_env.env_dict['language'],
              "codes": chat_env.get_codes(),
              "images": ", ".join(chat_env.incorporated_images)})
+        if chat_env.config.static_check:
+            # a code already reviewed in an earlier cycle, unchanged since and clean, needs no further review
+            codebook_version = chat_env.codes.codebook_version
+            self.phase_env["unchanged_since_clean_check"] = \
+                self.phase_env.get("reviewed_codebook_version") == codebook_version and chat_env.static_check().ok
+            self.phase_env["reviewed_codebook_version"] = codebook_version
 
     def update_chat_env(self, chat_env) -> ChatEnv:
         chat_env.env_dict['review_comments'] = self.seminar_conclusion
@@ -458,6 +634,8 @@ class CodeReviewComment(Phase):
 class CodeReviewModification(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "modality", "ideas", "language", "codes", "review_comments"]
+        self.writes = ["codes"]
 
     def update_phase_env(self, chat_env):
         self.phase_env.update({"task": chat_env.env_dict['task_prompt'],
@@ -480,6 +658,8 @@ class CodeReviewModification(Phase):
 class CodeReviewHuman(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "modality", "ideas", "language", "codes"]
+        self.writes = ["codes"]
 
     def update_phase_env(self, chat_env):
         self.phase_env.update({"task": chat_env.env_dict['task_prompt'],
@@ -496,6 +676,7 @@ class CodeReviewHuman(Phase):
                 "**[Software Info]**:\n\n {}".format(get_info(chat_env.env_dict['directory'], self.log_filepath)))
         return chat_env
 
+    @profiler.profiled(lambda self, *args, **kwargs: "phase:" + self.phase_name, dump=True)
     def execute(self, chat_env, chat_turn_limit, need_reflect) -> ChatEnv:
         self.update_phase_env(chat_env)
         log_visualize(
@@ -544,10 +725,18 @@ class CodeReviewHuman(Phase):
 class TestErrorSummary(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "modality", "ideas", "language", "codes", "proposed_images", "dependencies"]
+        # dependencies: packages installed by fix_module_not_found_error
+        self.writes = ["error_summary", "test_reports", "incorporated_images", "dependencies"]
 
     def update_phase_env(self, chat_env):
         chat_env.generate_images_from_codes()
-        (exist_bugs_flag, test_reports) = chat_env.exist_bugs()
+        static_check_report = chat_env.static_check() if chat_env.config.static_check else None
+        if static_check_report is not None and not static_check_report.ok:
+            # the program would fail right away, no need to launch it
+            (exist_bugs_flag, test_reports) = (True, str(static_check_report))
+        else:
+            (exist_bugs_flag, test_reports) = chat_env.exist_bugs()
         self.phase_env.update({"task": chat_env.env_dict['task_prompt'],
                                "modality": chat_env.env_dict['modality'],
                                "ideas": chat_env.env_dict['ideas'],
@@ -563,6 +752,7 @@ class TestErrorSummary(Phase):
 
         return chat_env
 
+    @profiler.profiled(lambda self, *args, **kwargs: "phase:" + self.phase_name, dump=True)
     def execute(self, chat_env, chat_turn_limit, need_reflect) -> ChatEnv:
         self.update_phase_env(chat_env)
         if "ModuleNotFoundError" in self.phase_env['test_reports']:
@@ -597,6 +787,8 @@ class TestErrorSummary(Phase):
 class TestModification(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "modality", "ideas", "language", "codes", "test_reports", "error_summary"]
+        self.writes = ["codes"]
 
     def update_phase_env(self, chat_env):
         self.phase_env.update({"task": chat_env.env_dict['task_prompt'],
@@ -620,6 +812,8 @@ class TestModification(Phase):
 class EnvironmentDoc(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "modality", "ideas", "language", "codes"]
+        self.writes = ["requirements"]
 
     def update_phase_env(self, chat_env):
         self.phase_env.update({"task": chat_env.env_dict['task_prompt'],
@@ -639,6 +833,8 @@ class EnvironmentDoc(Phase):
 class Manual(Phase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.reads = ["task_prompt", "modality", "ideas", "language", "codes", "requirements"]
+        self.writes = ["manuals"]
 
     def update_phase_env(self, chat_env):
         self.phase_env.update({"task": chat_env.env_dict['task_prompt'],
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from chatdev.utils import write_file_atomic
+
+
+class PhaseCache:
+    """
+    on-disk cache of phase conclusions, shared by all runs using the same directory (e.g. SRDD sweeps)
+    phases whose conclusion only depends on their inputs (DemandAnalysis, LanguageChoose, the task prompt
+    self-improvement) are looked up by a key over everything that determines the chatting, see Phase.cache_key
+    """
+
+    def __init__(self, directory: str, ttl: float = 7 * 24 * 3600, max_entries: int = 10000):
+        """
+
+        Args:
+            directory: directory holding one json file per cached conclusion
+            ttl: seconds a conclusion stays valid
+            max_entries: the oldest conclusions are evicted beyond this number of entries
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.md5(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str):
+        """
+        Args:
+            key: cache key
+
+        Returns:
+            the cached conclusion, or None if it is missing or expired
+
+        """
+        path = self._path(key)
+        value = None
+        try:
+            with open(path, "r", encoding="utf8") as f:
+                entry = json.load(f)
+            if time.time() - entry["time"] <= self.ttl:
+                value = entry["value"]
+            else:
+                os.remove(path)
+        except (OSError, ValueError, KeyError):
+            pass
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key: str, value: str, name: str = "") -> None:
+        """
+        Args:
+            key: cache key
+            value: conclusion to cache
+            name: phase name, stored for inspection only
+
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        write_file_atomic(self._path(key), json.dumps({"time": time.time(), "name": name, "value": value}))
+        self.evict()
+
+    def evict(self) -> None:
+        filenames = [filename for filename in os.listdir(self.directory) if filename.endswith(".json")]
+        if len(filenames) <= self.max_entries:
+            return
+        paths = [os.path.join(self.directory, filename) for filename in filenames]
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:
+                pass
+        for path in sorted(mtimes, key=mtimes.get)[:len(mtimes) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def hit_rate(self) -> float:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return self.hits / lookups if lookups > 0 else 0.0
+
+    def format_stats(self) -> str:
+        return "hits: {}\nmisses: {}\nhit rate: {:.2%}\n".format(self.hits, self.misses, self.hit_rate())
@@ -0,0 +1,295 @@
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from chatdev.fileio import write_file_atomic
+
+# only the standard library and chatdev.fileio are imported here, the profiler is used by camel (model backend, token
+# counting) and by chatdev.utils (logging)
+
+# records of the steps and phases open in the current thread (or in the task copied from it), outermost first
+open_records = contextvars.ContextVar("open_records", default=())
+# categories being measured in the current thread, nested measures of the same category are not counted twice
+active_categories = contextvars.ContextVar("active_categories", default=frozenset())
+
+CATEGORIES = ["llm", "exist_bugs", "logging", "tokenize"]
+
+
+class Record:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.categories = Counter()
+        self.peak = 0
+
+
+class Sampler:
+    """
+    statistical profiler: samples the stack of one thread at a fixed interval, as collapsed stacks (flamegraph.pl,
+    speedscope)
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append("{}:{}".format(os.path.basename(frame.f_code.co_filename), frame.f_code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("{} {}\n".format(stack, count))
+
+
+class Profiler:
+    """
+    time of every step and phase of a run: wall time, CPU time of its thread, time blocked in the model backend
+    (llm), running the software (exist_bugs), logging and counting tokens, and the peak of traced allocations
+    summed over all the executions of a name, as a table in the software directory
+    the table and the profile dumps are not committed with the software, see GitStore.IGNORED_PATHS
+    nothing is recorded until enable() is called, see "profile" in ChatChainConfig.json
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.dumps = "none"
+        self.sample_interval = 0.01
+        self.directory = None  # where profile dumps are written, the software directory
+        self.records = {}  # name -> Record, summed over the executions
+        self.dump_counts = Counter()
+        self.lock = threading.Lock()
+
+    def enable(self, memory=True, dumps="none", sample_interval=0.01):
+        """
+
+        Args:
+            memory: record allocation peaks with tracemalloc (slows down Python code)
+            dumps: "none", "cprofile" (a .prof file per phase execution, for pstats or snakeviz)
+                or "sample" (collapsed stacks sampled every `sample_interval` seconds, per phase execution)
+            sample_interval: seconds between two samples
+        """
+        if dumps not in ["none", "cprofile", "sample"]:
+            raise ValueError(f"Unknown profile dumps: {dumps}")
+        self.enabled = True
+        self.memory = memory
+        self.dumps = dumps
+        self.sample_interval = sample_interval
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def enable_from_env(self):
+        """
+        enable, configured by the CHATDEV_PROFILE_MEMORY, CHATDEV_PROFILE_DUMPS and CHATDEV_PROFILE_SAMPLE_INTERVAL
+        environment variables
+        """
+        self.enable(memory=os.getenv("CHATDEV_PROFILE_MEMORY", "True").lower() == "true",
+                    dumps=os.getenv("CHATDEV_PROFILE_DUMPS", "none"),
+                    sample_interval=float(os.getenv("CHATDEV_PROFILE_SAMPLE_INTERVAL", "0.01")))
+
+    def update_peak(self, records):
+        if not self.memory:
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for record in records:
+            record.peak = max(record.peak, peak)
+
+    @contextmanager
+    def record(self, name, dump=False):
+        """
+        record the enclosed code under a name, e.g. "step:CodeReview" or "phase:CodeReviewComment"
+        Args:
+            name: record name
+            dump: whether to write a profile dump of this execution (see enable)
+
+        """
+        if not self.enabled:
+            yield
+            return
+        parents = open_records.get()
+        # the peak so far belongs to the enclosing records, the peak of this one starts now
+        self.update_peak(parents)
+        if self.memory:
+            tracemalloc.reset_peak()
+        record = Record(name)
+        token = open_records.set(parents + (record,))
+        profile = None
+        if dump and self.dumps == "cprofile":
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler is active in this thread
+                profile = None
+        elif dump and self.dumps == "sample":
+            profile = Sampler(threading.get_ident(), self.sample_interval)
+        start_wall, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            record.wall = time.perf_counter() - start_wall
+            record.cpu = time.thread_time() - start_cpu
+            open_records.reset(token)
+            self.update_peak(parents + (record,))
+            if isinstance(profile, cProfile.Profile):
+                profile.disable()
+            elif isinstance(profile, Sampler):
+                profile.stop()
+            if profile is not None and self.directory is not None:
+                self.dump(name, profile)
+            self.merge(record)
+
+    def dump(self, name, profile):
+        directory = os.path.join(self.directory, "profiles")
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            self.dump_counts[name] += 1
+            filename = "{}.{}".format(name.replace(":", "_"), self.dump_counts[name])
+        if isinstance(profile, cProfile.Profile):
+            profile.dump_stats(os.path.join(directory, filename + ".prof"))
+        else:
+            profile.dump(os.path.join(directory, filename + ".folded"))
+
+    def merge(self, record):
+        with self.lock:
+            total = self.records.get(record.name)
+            if total is None:
+                total = self.records[record.name] = Record(record.name)
+            total.calls += 1
+            total.wall += record.wall
+            total.cpu += record.cpu
+            total.categories.update(record.categories)
+            total.peak = max(total.peak, record.peak)
+
+    @contextmanager
+    def measure(self, category):
+        """
+        add the wall time of the enclosed code to a category of all the open records
+        """
+        records = open_records.get()
+        categories = active_categories.get()
+        if not self.enabled or not records or category in categories:
+            yield
+            return
+        token = active_categories.set(categories | {category})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            active_categories.reset(token)
+            for record in records:
+                record.categories[category] += elapsed
+
+    def timed(self, category):
+        """
+        decorator measuring every call of a function in a category
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.measure(category):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def profiled(self, name, dump=False):
+        """
+        decorator recording every call of a function
+        Args:
+            name: record name, or a function of the call arguments returning it
+            dump: whether to write a profile dump of every call (see enable)
+
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.record(name(*args, **kwargs) if callable(name) else name, dump=dump):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def summary(self):
+        """
+        Returns:
+            rows: one dict per record name, in seconds and MB, in the order the names were first recorded
+
+        """
+        with self.lock:
+            records = list(self.records.values())
+        rows = []
+        for record in records:
+            row = {"name": record.name, "calls": record.calls, "wall": record.wall, "cpu": record.cpu}
+            for category in CATEGORIES:
+                row[category] = float(record.categories[category])
+            # time neither spent computing in this thread nor in a measured wait, e.g. other waits or other threads
+            row["other"] = max(record.wall - record.cpu - row["llm"] - row["exist_bugs"], 0.0)
+            row["peak_mb"] = record.peak / 1024 / 1024 if self.memory else None
+            rows.append(row)
+        return rows
+
+    def format_summary(self):
+        columns = ["name", "calls", "wall", "cpu", "llm", "exist_bugs", "logging", "tokenize", "other", "peak_mb"]
+        lines = ["| " + " | ".join(columns) + " |", "|" + "---|" * len(columns)]
+        for row in self.summary():
+            cells = []
+            for column in columns:
+                value = row[column]
+                cells.append("-" if value is None else "{:.2f}".format(value) if isinstance(value, float)
+                             else str(value))
+            lines.append("| " + " | ".join(cells) + " |")
+        return "\n".join(lines)
+
+    def write_summary(self, directory):
+        """
+        write the summary as a markdown table (profile.md) and as JSON (profile.json)
+        Returns:
+            path: path of the markdown table
+
+        """
+        path = os.path.join(directory, "profile.md")
+        write_file_atomic(path, self.format_summary() + "\n\nseconds (wall: elapsed, cpu: CPU time of the phase "
+                                                        "thread, llm / exist_bugs / logging / tokenize: time blocked "
+                                                        "in them, other: the rest of wall not spent on CPU, llm or "
+                                                        "exist_bugs), peak_mb: peak of traced allocations\n")
+        write_file_atomic(os.path.join(directory, "profile.json"), json.dumps(self.summary(), indent=2))
+        return path
+
+
+# process-wide profiler, shared by the chain, the phases, the model backends and the logging
+profiler = Profiler()
@@ -0,0 +1,196 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # windows: installs are only deduplicated within this process
+    fcntl = None
+
+# import names whose distribution has another name, None for modules pip cannot install
+IMPORT_TO_PACKAGE = {
+    "cv2": "opencv-python",
+    "PIL": "pillow",
+    "sklearn": "scikit-learn",
+    "skimage": "scikit-image",
+    "yaml": "pyyaml",
+    "bs4": "beautifulsoup4",
+    "dateutil": "python-dateutil",
+    "dotenv": "python-dotenv",
+    "Crypto": "pycryptodome",
+    "OpenGL": "PyOpenGL",
+    "serial": "pyserial",
+    "attr": "attrs",
+    "docx": "python-docx",
+    "pptx": "python-pptx",
+    "fitz": "PyMuPDF",
+    "jwt": "PyJWT",
+    "wx": "wxPython",
+    "gi": "PyGObject",
+    "magic": "python-magic",
+    "usb": "pyusb",
+    "Levenshtein": "python-Levenshtein",
+    "tkinter": None,
+    "_tkinter": None,
+    "win32api": None,
+    "win32con": None,
+}
+
+
+class DependencyProvisioner:
+    """
+    installs the third-party modules missing from generated software
+    every package is built once into a wheelhouse of the cache directory and installed from it without the index,
+    so later projects (and other ChatDev processes of the host) only unpack a local wheel; an install of a package
+    already in progress, in this process or another one, is waited for instead of started again
+    with isolation, every package is installed into its own overlay directory of the cache (pip --target), shared by
+    all the projects needing it: the environment of a project is the host environment plus the overlays of its
+    packages on the import path, so projects do not change the host environment nor each other
+    """
+
+    def __init__(self, cache_directory, wheelhouse=None, isolated=False, offline=False):
+        """
+
+        Args:
+            cache_directory: directory of the wheelhouse, the overlays and the install locks
+            wheelhouse: optional directory of pre-built wheels, searched before the package index
+            isolated: install into per-package overlays instead of the host environment
+            offline: never use the package index, only the wheels of the cache and of `wheelhouse`
+        """
+        self.cache_directory = cache_directory
+        self.wheel_directory = os.path.join(cache_directory, "wheels")
+        self.overlay_directory = os.path.join(cache_directory, "py{}.{}".format(*sys.version_info[:2]))
+        self.wheelhouse = wheelhouse
+        self.isolated = isolated
+        self.offline = offline
+        self.installs = {}  # package -> Future of the install, True if the package is installed
+        self.lock = threading.Lock()
+        # pip must not install into the host environment concurrently (see _install)
+        self.host_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, isolated=False):
+        return cls(cache_directory=os.getenv("CHATDEV_DEPENDENCY_CACHE_DIR",
+                                             os.path.join(os.path.dirname(os.path.dirname(__file__)), "WareHouse",
+                                                          ".dependencies")),
+                   wheelhouse=os.getenv("CHATDEV_WHEELHOUSE"),
+                   isolated=isolated,
+                   offline=os.getenv("CHATDEV_PIP_OFFLINE", "False").lower() == "true")
+
+    @staticmethod
+    def package_for(module):
+        """
+        distribution to install for an import name, None if pip cannot install it
+        """
+        top_module = module.split(".")[0]
+        if top_module in getattr(sys, "stdlib_module_names", ()):
+            return None
+        return IMPORT_TO_PACKAGE.get(top_module, top_module)
+
+    def overlay_path(self, package):
+        return os.path.join(self.overlay_directory, package.lower())
+
+    def paths(self, packages):
+        """
+        overlays to put on the import path of a project with these packages (none without isolation)
+        """
+        if not self.isolated:
+            return []
+        return [self.overlay_path(package) for package in packages if os.path.isdir(self.overlay_path(package))]
+
+    def provision(self, modules):
+        """
+        install the packages of the missing modules, concurrently, each package at most once
+        Args:
+            modules: missing import names, e.g. from "No module named 'x'"
+
+        Returns:
+            packages: module -> package installed for it, None if it could not be installed
+
+        """
+        packages = {module: self.package_for(module) for module in modules}
+        futures = {package: self.install(package) for package in set(packages.values()) if package is not None}
+        installed = {package: future.exception() is None and future.result() for package, future in futures.items()}
+        return {module: package if package is not None and installed[package] else None
+                for module, package in packages.items()}
+
+    def install(self, package) -> Future:
+        with self.lock:
+            future = self.installs.get(package)
+            if future is not None:
+                return future
+            future = Future()
+            self.installs[package] = future
+        threading.Thread(target=self._install, args=(package, future), daemon=True).start()
+        return future
+
+    def _pip(self, args):
+        command = [sys.executable, "-m", "pip"] + args + ["--disable-pip-version-check", "--quiet"]
+        return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT).returncode == 0
+
+    def _lock(self, name):
+        """
+        exclusive lock shared with the other ChatDev processes using the cache, released by closing the file
+        """
+        lock_file = open(os.path.join(self.cache_directory, name + ".lock"), "w")
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _install(self, package, future):
+        os.makedirs(self.wheel_directory, exist_ok=True)
+        os.makedirs(self.overlay_directory, exist_ok=True)
+        # another ChatDev process may be installing the same package
+        lock_file = self._lock(package.lower())
+        try:
+            if self.isolated and os.path.isdir(self.overlay_path(package)):
+                future.set_result(True)
+                return
+            find_links = ["--find-links", self.wheel_directory]
+            if self.wheelhouse:
+                find_links += ["--find-links", self.wheelhouse]
+            # build (or download) the wheels of the package and its requirements once, later installs are local
+            built = self._pip(["wheel", "--wheel-dir", self.wheel_directory] + find_links
+                              + (["--no-index"] if self.offline else []) + [package])
+            if not built:
+                future.set_result(False)
+                return
+            if self.isolated:
+                # unpack next to the overlay, then move it in place, so that no project sees a partial overlay
+                staging = self.overlay_path(package) + ".partial-{}".format(os.getpid())
+                shutil.rmtree(staging, ignore_errors=True)
+                installed = self._pip(["install", "--no-index", "--target", staging] + find_links + [package])
+                if installed:
+                    os.replace(staging, self.overlay_path(package))
+                else:
+                    shutil.rmtree(staging, ignore_errors=True)
+            else:
+                with self.host_lock:
+                    host_lock_file = self._lock("host")
+                    try:
+                        installed = self._pip(["install", "--no-index"] + find_links + [package])
+                    finally:
+                        host_lock_file.close()
+            future.set_result(installed)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            lock_file.close()
+
+
+_provisioners = {}
+_provisioners_lock = threading.Lock()
+
+
+def get_provisioner(isolated=False) -> DependencyProvisioner:
+    """
+    process-wide provisioner (one with isolation, one without), configured by the CHATDEV_DEPENDENCY_CACHE_DIR,
+    CHATDEV_WHEELHOUSE and CHATDEV_PIP_OFFLINE environment variables
+    """
+    with _provisioners_lock:
+        if isolated not in _provisioners:
+            _provisioners[isolated] = DependencyProvisioner.from_env(isolated=isolated)
+        return _provisioners[isolated]
@@ -0,0 +1,230 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# only the standard library is imported here: this file is also the entry point of the executor processes
+# (python sandbox.py), and it is used by ecl/codes.py
+
+try:
+    import fcntl
+except ImportError:  # windows: the slots only bound the executions of this process
+    fcntl = None
+
+
+class SandboxResult:
+    def __init__(self, exit_code, timed_out, stdout, stderr, duration):
+        self.exit_code = exit_code  # None if the program was still running at the timeout
+        self.timed_out = timed_out
+        self.stdout = stdout
+        self.stderr = stderr
+        self.duration = duration
+
+    def to_dict(self):
+        return {"exit_code": self.exit_code, "timed_out": self.timed_out, "stdout": self.stdout,
+                "stderr": self.stderr, "duration": self.duration}
+
+
+class SandboxPool:
+    """
+    pre-warmed executor processes running the generated software
+    every executor is a python interpreter started ahead of time, with the usual third-party modules of generated
+    software (pygame, tkinter, numpy) already imported; it waits for one request, then runs the main script of a
+    project directory in its own process group, with CPU and memory limits, and exits, so every execution starts
+    from a clean interpreter; a new executor is warmed up in the background to replace it
+    at most `size` programs run at once, in this process and, where file locks are available, across all the ChatDev
+    processes of the host sharing `slots_directory`
+    """
+
+    def __init__(self, size=4, preload=("tkinter", "pygame", "numpy"), cpu_seconds=10, memory_mb=2048,
+                 slots_directory=None):
+        """
+
+        Args:
+            size: number of warm executors, and of programs run at once
+            preload: modules imported by the executors in advance, missing ones are skipped
+            cpu_seconds: CPU time limit of a program (0: none)
+            memory_mb: address space limit of a program (0: none)
+            slots_directory: directory of the lock files bounding the programs run at once on the host
+        """
+        self.size = size
+        self.preload = list(preload)
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.slots_directory = slots_directory or os.path.join(tempfile.gettempdir(), "chatdev_sandbox")
+        self.idle = []
+        self.lock = threading.Lock()
+        self.semaphore = threading.BoundedSemaphore(size)
+        for _ in range(size):
+            self.refill()
+
+    @classmethod
+    def from_env(cls):
+        return cls(size=int(os.getenv("CHATDEV_SANDBOX_SIZE", str(min(4, os.cpu_count() or 1)))),
+                   preload=[module for module in
+                            os.getenv("CHATDEV_SANDBOX_PRELOAD", "tkinter,pygame,numpy").split(",") if module],
+                   cpu_seconds=int(os.getenv("CHATDEV_SANDBOX_CPU_SECONDS", "10")),
+                   memory_mb=int(os.getenv("CHATDEV_SANDBOX_MEMORY_MB", "2048")),
+                   slots_directory=os.getenv("CHATDEV_SANDBOX_SLOTS_DIR"))
+
+    def start_executor(self):
+        kwargs = {"start_new_session": True} if os.name != "nt" else \
+            {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1")
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), ",".join(self.preload)],
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+                                **kwargs)
+
+    def refill(self):
+        executor = self.start_executor()
+        with self.lock:
+            self.idle.append(executor)
+
+    def take_executor(self):
+        with self.lock:
+            while self.idle:
+                executor = self.idle.pop(0)
+                if executor.poll() is None:
+                    return executor
+        # all warm executors are in use or died, start a cold one
+        return self.start_executor()
+
+    def acquire_slot(self):
+        """
+        lock one of the `size` slot files of the host, waiting until one is free
+        Returns: the locked file, None without file locks
+
+        """
+        if fcntl is None:
+            return None
+        os.makedirs(self.slots_directory, exist_ok=True)
+        while True:
+            for index in range(self.size):
+                slot = open(os.path.join(self.slots_directory, "slot{}.lock".format(index)), "w")
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot
+                except OSError:
+                    slot.close()
+            time.sleep(0.05)
+
+    @staticmethod
+    def kill(executor):
+        try:
+            if os.name != "nt":
+                os.killpg(executor.pid, signal.SIGTERM)
+            else:
+                executor.send_signal(signal.CTRL_BREAK_EVENT)
+            executor.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            executor.kill()
+
+    def run(self, directory, script="main.py", timeout=3.0, paths=()) -> SandboxResult:
+        """
+        run a script of a project directory, as `cd directory; python script` would
+        Args:
+            directory: project directory, the working directory and first import path of the program
+            script: script to run
+            timeout: seconds after which the program (and its child processes) is stopped, GUI programs usually
+                run until then
+            paths: further import paths of the program, e.g. the dependency overlays of chatdev.provisioning
+
+        Returns:
+            result: SandboxResult
+
+        """
+        with self.semaphore:
+            slot = self.acquire_slot()
+            try:
+                executor = self.take_executor()
+                threading.Thread(target=self.refill, daemon=True).start()
+                start_time = time.time()
+                request = {"directory": os.path.abspath(directory), "script": script, "paths": list(paths),
+                           "cpu_seconds": self.cpu_seconds, "memory_mb": self.memory_mb}
+                try:
+                    stdout, stderr = executor.communicate((json.dumps(request) + "\n").encode("utf-8"),
+                                                          timeout=timeout)
+                    exit_code, timed_out = executor.returncode, False
+                except subprocess.TimeoutExpired:
+                    self.kill(executor)
+                    stdout, stderr = executor.communicate()
+                    exit_code, timed_out = None, True
+                return SandboxResult(exit_code, timed_out, stdout.decode("utf-8", errors="replace"),
+                                     stderr.decode("utf-8", errors="replace"), time.time() - start_time)
+            finally:
+                if slot is not None:
+                    slot.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for executor in idle:
+            self.kill(executor)
+
+
+_pool = []
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """
+    process-wide pool, configured by the CHATDEV_SANDBOX_* environment variables and warmed up on first use
+    """
+    with _pool_lock:
+        if not _pool:
+            _pool.append(SandboxPool.from_env())
+        return _pool[0]
+
+
+def executor_main(preload):
+    # the directory of this file must not shadow the modules of the software (e.g. statistics.py)
+    sys.path.pop(0)
+    # warm up: import the usual modules of generated software, quietly
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    for module in preload:
+        try:
+            __import__(module)
+        except Exception:
+            pass
+    sys.stdout, sys.stderr = stdout, stderr
+
+    line = sys.stdin.readline()
+    if not line:  # the pool was closed
+        return
+    request = json.loads(line)
+    if os.name != "nt":
+        import resource
+        if request["cpu_seconds"] > 0:
+            resource.setrlimit(resource.RLIMIT_CPU, (request["cpu_seconds"], request["cpu_seconds"]))
+        if request["memory_mb"] > 0:
+            memory = request["memory_mb"] * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    os.chdir(request["directory"])
+    # as for `python main.py`
+    sys.path[0:0] = [request["directory"]] + request.get("paths", [])
+    sys.argv = [request["script"]]
+    import importlib
+    import runpy
+    import traceback
+    importlib.invalidate_caches()
+    path = os.path.join(request["directory"], request["script"])
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit:
+        raise
+    except BaseException:
+        error_type, error, tb = sys.exc_info()
+        # the traceback starts at the script, like the one of `python main.py`
+        while tb is not None and tb.tb_frame.f_code.co_filename != path:
+            tb = tb.tb_next
+        traceback.print_exception(error_type, error, tb)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    executor_main([module for module in sys.argv[1].split(",") if module] if len(sys.argv) > 1 else [])
@@ -0,0 +1,171 @@
+import ast
+import builtins
+import importlib.machinery
+import importlib.util
+import os
+import sys
+
+# names bound in every module without an assignment
+MODULE_NAMES = set(dir(builtins)) | {"__file__", "__builtins__", "__path__", "__cached__", "__annotations__",
+                                     "__class__"}
+IMPORT_ERRORS = {"ImportError", "ModuleNotFoundError", "Exception", "BaseException"}
+
+
+class StaticCheckReport:
+    """
+    problems found in the generated software without running it, each a dict with
+    filename, lineno, kind (a Python exception name) and message
+    """
+
+    def __init__(self):
+        self.problems = []
+        self.missing_modules = []
+
+    def add(self, filename, lineno, kind, message):
+        self.problems.append({"filename": filename, "lineno": lineno, "kind": kind, "message": message})
+
+    @property
+    def ok(self) -> bool:
+        return len(self.problems) == 0
+
+    def __str__(self):
+        if self.ok:
+            return "The static check found no problems."
+        # worded like the interpreter, so that the test phases handle the report like a traceback
+        # (e.g. "No module named 'x'" is installed by TestErrorSummary)
+        lines = ["The static check found {} problem(s) without running the software:".format(len(self.problems))]
+        for problem in self.problems:
+            lines.append("  File \"{}\", line {}".format(problem["filename"], problem["lineno"]))
+            lines.append("{}: {}".format(problem["kind"], problem["message"]))
+        return "\n".join(lines)
+
+
+def bound_names(tree):
+    """
+    all the names bound anywhere in a module, scopes are not told apart so that only names bound nowhere are reported
+    """
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.alias):
+            names.add(node.asname or node.name.split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif hasattr(ast, "MatchAs") and isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif hasattr(ast, "MatchMapping") and isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    return names
+
+
+def guarded_imports(tree):
+    """
+    imports inside a try whose handlers catch ImportError, which the software expects to fail
+    """
+    guarded = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Try):
+            continue
+        handled = set()
+        for handler in node.handlers:
+            types = handler.type.elts if isinstance(handler.type, ast.Tuple) else [handler.type]
+            handled.update("BaseException" if handler_type is None else getattr(handler_type, "id", "")
+                           for handler_type in types)
+        if handled & IMPORT_ERRORS:
+            for statement in node.body:
+                guarded.update(id(child) for child in ast.walk(statement)
+                               if isinstance(child, (ast.Import, ast.ImportFrom)))
+    return guarded
+
+
+def module_installed(module, paths=()):
+    if module in getattr(sys, "stdlib_module_names", ()) or module in sys.builtin_module_names:
+        return True
+    try:
+        return importlib.util.find_spec(module) is not None or \
+            (len(paths) > 0 and importlib.machinery.PathFinder.find_spec(module, list(paths)) is not None)
+    except (ImportError, ValueError):
+        return True
+
+
+def check_codebooks(codebooks, directory=None, paths=()) -> StaticCheckReport:
+    """
+    check the Python files of the software without running it:
+    1. byte-compile every file (syntax errors)
+    2. resolve the imports between the files of the software (names imported from a file that does not define them)
+    3. look up the other imported modules in the environment (missing third-party modules)
+    4. report names loaded but bound nowhere in their file (undefined names)
+    Args:
+        codebooks: filename -> code, as in Codes.codebooks
+        directory: software directory, whose other files and packages can be imported too
+        paths: further import paths of the software, e.g. the dependency overlays of chatdev.provisioning
+
+    Returns:
+        report: StaticCheckReport
+
+    """
+    report = StaticCheckReport()
+    # find_spec must see the packages installed since the last check
+    importlib.invalidate_caches()
+    local_modules = {filename[:-len(".py")] for filename in codebooks if filename.endswith(".py")}
+    if directory and os.path.isdir(directory):
+        local_modules.update(os.path.splitext(filename)[0] for filename in os.listdir(directory))
+
+    trees = {}
+    for filename, code in codebooks.items():
+        if not filename.endswith(".py"):
+            continue
+        try:
+            compile(code, filename, "exec", dont_inherit=True)
+            trees[filename] = ast.parse(code, filename)
+        except SyntaxError as e:
+            report.add(filename, e.lineno, type(e).__name__, e.msg)
+        except ValueError as e:  # e.g. null bytes
+            report.add(filename, 1, "SyntaxError", str(e))
+    names = {filename: bound_names(tree) for filename, tree in trees.items()}
+    star_imports = {filename for filename, tree in trees.items()
+                    if any(alias.name == "*" for node in ast.walk(tree) if isinstance(node, ast.ImportFrom)
+                           for alias in node.names)}
+
+    for filename, tree in trees.items():
+        guarded = guarded_imports(tree)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import) and id(node) not in guarded:
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module and id(node) not in guarded:
+                modules = [node.module]
+                imported_file = node.module.replace(".", "/") + ".py"
+                if imported_file in trees and imported_file not in star_imports:
+                    for alias in node.names:
+                        if alias.name != "*" and alias.name not in names[imported_file]:
+                            report.add(filename, node.lineno, "ImportError",
+                                       "cannot import name '{}' from '{}' ({})".format(alias.name, node.module,
+                                                                                      imported_file))
+            else:
+                continue
+            for module in modules:
+                top_module = module.split(".")[0]
+                if top_module in local_modules or top_module in report.missing_modules:
+                    continue
+                if not module_installed(top_module, paths):
+                    report.missing_modules.append(top_module)
+                    report.add(filename, node.lineno, "ModuleNotFoundError", "No module named '{}'".format(top_module))
+
+        if filename in star_imports:
+            continue
+        reported = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) \
+                    and node.id not in names[filename] and node.id not in MODULE_NAMES and node.id not in reported:
+                reported.add(node.id)
+                report.add(filename, node.lineno, "NameError", "name '{}' is not defined".format(node.id))
+
+    report.problems.sort(key=lambda problem: (problem["filename"], problem["lineno"] or 0))
+    return report
@@ -1,7 +1,5 @@
 import os
 
-import numpy as np
-
 
 def prompt_cost(model_type: str, num_prompt_tokens: float, num_completion_tokens: float):
     input_cost_map = {
@@ -66,7 +64,7 @@ def get_info(dir, log_filepath):
 
         num_doc_files = 0
         for filename in filenames:
-            if filename.endswith(".py") or filename.endswith(".png"):
+            if filename.endswith(".py") or filename.endswith(".png") or filename.startswith("."):
                 continue
             if os.path.isfile(os.path.join(dir, filename)):
                 # print(filename)
@@ -131,21 +129,21 @@ def get_info(dir, log_filepath):
         sublines = [line for line in lines if line.startswith("prompt_tokens:")]
         if len(sublines) > 0:
             nums = [int(line.split(": ")[-1]) for line in sublines]
-            num_prompt_tokens = np.sum(nums)
+            num_prompt_tokens = sum(nums)
             # print("num_prompt_tokens:", num_prompt_tokens)
 
         lines = open(log_filepath, "r", encoding="utf8").read().split("\n")
         sublines = [line for line in lines if line.startswith("completion_tokens:")]
         if len(sublines) > 0:
             nums = [int(line.split(": ")[-1]) for line in sublines]
-            num_completion_tokens = np.sum(nums)
+            num_completion_tokens = sum(nums)
             # print("num_completion_tokens:", num_completion_tokens)
 
         lines = open(log_filepath, "r", encoding="utf8").read().split("\n")
         sublines = [line for line in lines if line.startswith("total_tokens:")]
         if len(sublines) > 0:
             nums = [int(line.split(": ")[-1]) for line in sublines]
-            num_total_tokens = np.sum(nums)
+            num_total_tokens = sum(nums)
             # print("num_total_tokens:", num_total_tokens)
 
         lines = open(log_filepath, "r", encoding="utf8").read().split("\n")
@@ -0,0 +1,175 @@
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from chatdev.fileio import write_file_atomic
+
+# innermost open span of the current thread (or of the task copied from it, see ChatChain.execute_chain_parallel)
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    def __init__(self, span_id, parent_id, name, attributes):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.thread_id = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+        self.start = time.time()
+        self.end = None
+
+
+class Tracer:
+    """
+    hierarchical spans of a run (pre-processing, steps, ComposedPhase cycles, chatting turns, LLM calls,
+    reflections, software executions, git commits), exported as a Chrome trace (chrome://tracing, Perfetto)
+    and as OTLP JSON (OpenTelemetry collectors and viewers)
+    nothing is recorded until enable() is called, see "trace" in ChatChainConfig.json
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.span_ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        record the enclosed code as a span, nested in the innermost open span of the thread
+        Args:
+            name: span name
+            **attributes: span attributes, more can be added with set_attributes()
+
+        """
+        if not self.enabled:
+            yield None
+            return
+        parent = current_span.get()
+        span = Span(next(self.span_ids), parent.span_id if parent is not None else None, name, attributes)
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            span.end = time.time()
+            current_span.reset(token)
+            with self.lock:
+                self.spans.append(span)
+
+    def set_attributes(self, **attributes):
+        """
+        add attributes (e.g. token counts known once a request returned) to the innermost open span
+        """
+        span = current_span.get()
+        if self.enabled and span is not None:
+            span.attributes.update(attributes)
+
+    def traced(self, name, attributes=None):
+        """
+        decorator recording every call of a function as a span
+        Args:
+            name: span name, or a function of the call arguments returning it
+            attributes: optional function of the call arguments returning the span attributes
+
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                span_name = name(*args, **kwargs) if callable(name) else name
+                with self.span(span_name, **(attributes(*args, **kwargs) if attributes is not None else {})):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def finished_spans(self):
+        with self.lock:
+            return sorted(self.spans, key=lambda span: span.start)
+
+    def export_chrome_trace(self, path):
+        """
+        write the spans as complete ("X") events of the Chrome trace event format, one track per thread
+        Args:
+            path: output JSON file
+
+        """
+        spans = self.finished_spans()
+        thread_names = {}
+        events = []
+        for span in spans:
+            thread_names.setdefault(span.thread_id, span.thread_name)
+            events.append({"name": span.name, "cat": span.name.split(":")[0], "ph": "X",
+                           "ts": span.start * 1e6, "dur": (span.end - span.start) * 1e6,
+                           "pid": os.getpid(), "tid": span.thread_id,
+                           "args": dict(span.attributes, span_id=span.span_id, parent_id=span.parent_id)})
+        for thread_id, thread_name in thread_names.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread_id,
+                           "args": {"name": thread_name}})
+        write_file_atomic(path, json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str))
+
+    @staticmethod
+    def otlp_value(value):
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def export_otlp(self, path, service_name="chatdev", resource_attributes=None):
+        """
+        write the spans in the OTLP/JSON format (ExportTraceServiceRequest), which can be sent to an
+        OpenTelemetry collector as is (POST /v1/traces)
+        Args:
+            path: output JSON file
+            service_name: service.name of the resource
+            resource_attributes: further attributes of the resource, e.g. the project
+
+        """
+        resource = dict(resource_attributes or {}, **{"service.name": service_name})
+        otlp_spans = []
+        for span in self.finished_spans():
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": "{:016x}".format(span.span_id),
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(int(span.start * 1e9)),
+                "endTimeUnixNano": str(int(span.end * 1e9)),
+                "attributes": [{"key": key, "value": self.otlp_value(value)}
+                               for key, value in span.attributes.items() if value is not None],
+            }
+            if span.parent_id is not None:
+                otlp_span["parentSpanId"] = "{:016x}".format(span.parent_id)
+            if "error" in span.attributes:
+                otlp_span["status"] = {"code": 2, "message": str(span.attributes["error"])}
+            otlp_spans.append(otlp_span)
+        trace = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": key, "value": self.otlp_value(value)}
+                                        for key, value in resource.items()]},
+            "scopeSpans": [{"scope": {"name": "chatdev"}, "spans": otlp_spans}],
+        }]}
+        write_file_atomic(path, json.dumps(trace))
+
+
+# process-wide tracer, shared by the chain, the phases, the agents and the model backends
+tracer = Tracer()
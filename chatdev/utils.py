@@ -3,10 +3,10 @@ import logging
 import re
 import time
 
-import markdown
 import inspect
-from camel.messages.system_messages import SystemMessage
-from visualizer.app import send_msg
+from chatdev.fileio import content_hash, write_file_atomic  # noqa: F401, re-exported for the modules using them
+from chatdev.profiling import profiler
+from visualizer.client import send_msg
 
 
 def convert_model_name(model_name: str, enable_reasoning: bool = False) -> str:
@@ -33,6 +33,7 @@ def now():
     return time.strftime("%Y%m%d%H%M%S", time.localtime())
 
 
+@profiler.timed("logging")
 def log_visualize(role, content=None):
     """
     send the role and content to visualizer server to show log on webpage in real-time
@@ -49,6 +50,8 @@ def log_visualize(role, content=None):
         send_msg("System", role)
         print(role + "\n")
     else:
+        # imported here: camel imports this module
+        from camel.messages.system_messages import SystemMessage
         print(str(role) + ": " + str(content) + "\n")
         logging.info(str(role) + ": " + str(content) + "\n")
         if isinstance(content, SystemMessage):
@@ -80,27 +83,29 @@ def convert_to_markdown_table(records_kv):
 
 def log_arguments(func):
     def wrapper(*args, **kwargs):
-        sig = inspect.signature(func)
-        params = sig.parameters
-
-        all_args = {}
-        all_args.update({name: value for name, value in zip(params.keys(), args)})
-        all_args.update(kwargs)
-
-        records_kv = []
-        for name, value in all_args.items():
-            if name in ["self", "chat_env", "task_type"]:
-                continue
-            value = escape_string(value)
-            records_kv.append([name, value])
-        records = f"**[{func.__name__}]**\n\n" + convert_to_markdown_table(records_kv)
-        log_visualize("System", records)
+        with profiler.measure("logging"):
+            sig = inspect.signature(func)
+            params = sig.parameters
+
+            all_args = {}
+            all_args.update({name: value for name, value in zip(params.keys(), args)})
+            all_args.update(kwargs)
+
+            records_kv = []
+            for name, value in all_args.items():
+                if name in ["self", "chat_env", "task_type"]:
+                    continue
+                value = escape_string(value)
+                records_kv.append([name, value])
+            records = f"**[{func.__name__}]**\n\n" + convert_to_markdown_table(records_kv)
+            log_visualize("System", records)
 
         return func(*args, **kwargs)
 
     return wrapper
 
 def escape_string(value):
+    import markdown
     value = str(value)
     value = html.unescape(value)
     value = markdown.markdown(value)
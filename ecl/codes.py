@@ -5,6 +5,7 @@ import subprocess
 import shutil
 import time
 import signal
+import sys
 from utils import get_easyDict_from_filepath
 
 
@@ -13,6 +14,7 @@ class Codes:
         cfg = get_easyDict_from_filepath("./ecl/config.yaml")
         self.directory: str = cfg.codes.tmp_directory
         self.main_script: str = cfg.codes.main_script
+        self.sandbox: bool = cfg.codes.get("sandbox", False)
         self.generated_content: str = generated_content
         self.codebooks = {}
 
@@ -98,6 +100,15 @@ class Codes:
 
         success_info = "The software run successfully without errors."
 
+        if self.sandbox:
+            # ecl/ecl.py is run from the root of ChatDev
+            sys.path.append(os.getcwd())
+            from chatdev.sandbox import get_sandbox_pool
+            result = get_sandbox_pool().run(directory, self.main_script, timeout=3)
+            if "Traceback".lower() in result.stderr.lower():
+                return True, result.stderr.replace(directory + "/", "")
+            return False, success_info
+
         try:
             # check if we are on windows or linux
             if os.name == 'nt':
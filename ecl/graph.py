@@ -1,9 +1,11 @@
 import os
-import subprocess
+import sys
 import hashlib
 from queue import Queue
 import re
-from utils import cmd,log_and_print_online
+from utils import log_and_print_online
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chatdev.git_store import GitStore
 
 class Node:
     def __init__(self):
@@ -16,31 +18,29 @@ class Node:
         self.value = 0.0
         self.embedding = None
 
-    def create_from_warehouse(self, directory) -> None:
+    def create_from_commit(self, git_store: GitStore, commit: dict) -> None:
         def _format_code(code):
             code = "\n".join([line for line in code.split("\n") if len(line.strip()) > 0])
             return code
 
-        # Read all .py files
+        # Read all .py files of this version straight from the git objects, without checking it out
+        files = git_store.read_files(commit["sha"])
         codebooks = {}
-        assert len([filename for filename in os.listdir(directory) if filename.endswith(".py")]) > 0
-        for root, directories, filenames in os.walk(directory):
-            for filename in filenames:
-                if filename.endswith(".py"):
-                    codebooks[filename] = _format_code(open(os.path.join(directory, filename), "r", encoding="utf-8").read())
+        filenames = [path for path in files.keys() if "/" not in path and path.endswith(".py")]
+        assert len(filenames) > 0
+        for filename in filenames:
+            codebooks[filename] = _format_code(files[filename].decode("utf-8"))
 
         # Format Codes
         code = ""
         for filename in codebooks.keys():
-            filepath = os.path.join(directory, filename)
             code += "{}\n```Python\n{}\n```\n\n".format(filename, codebooks[filename])
 
         self.code = code
         self.mID = hashlib.md5(self.code.encode(encoding='UTF-8')).hexdigest()
 
-        content = cmd("cd {} && git log --oneline".format(directory)).replace("(HEAD -> main)", "").replace("  ", " ")
-        self.commitMessage = " ".join(content.split("\n")[0].split(" ")[1:])
-        self.version = float(content.split("\n")[0].split(" ")[1].replace("v", ""))
+        self.commitMessage = commit["message"].split("\n")[0]
+        self.version = float(commit["message"].split(" ")[0].replace("v", ""))
 
 class Edge:
     def __init__(self, sourceMID, targetMID, instruction, role):
@@ -76,37 +76,34 @@ class Graph:
 
     def create_from_warehouse(self, directory) -> None:
         self.directory = directory
-        content = cmd("cd {} && git log --oneline".format(directory))
+        git_store = GitStore(directory)
+        commits = {commit["sha"]: commit for commit in git_store.log()}
         #assert "log commit" in content
-        cIDs = ["0" * 7] + [line.split(" ")[0] for line in content.split("\n") if len(line)>0][::-1] # Commit IDs
+        cIDs = ["0" * 7] + list(commits.keys())[::-1] # Commit IDs
         log_cID = cIDs[-1]
         cIDs = cIDs[:-1]
         log_and_print_online("commit history:"+ str(cIDs)+ "\nlog commit:"+ str(log_cID))
 
         # Commit ID -> md5 ID
         # Constructing Nodes
-        try:
-            cID2mID = {}
-            output = ""
-            for cID in cIDs:
-                if cID == "0" * 7:
-                    node = Node()
-                    node.code = ""
-                    node.mID = hashlib.md5("".encode(encoding='UTF-8')).hexdigest()
-                    node.commitMessage = ""
-                    node.version = "v0.0"
-                    cID2mID[cID] = node.mID
-                    self.addNode(node)
-                    output += ("Node: {} -> {}\n".format("0" * 7, node.mID))
-                else:
-                    content = cmd("cd {} && git reset --hard {}".format(directory, cID))
-                    node = Node()
-                    node.create_from_warehouse(directory)
-                    cID2mID[cID] = node.mID
-                    self.addNode(node)
-                    output += ("Node: {} -> {}\n".format(cID, node.mID))
-        finally:
-            cmd("cd {} && git reset --hard {}".format(directory, log_cID))
+        cID2mID = {}
+        output = ""
+        for cID in cIDs:
+            if cID == "0" * 7:
+                node = Node()
+                node.code = ""
+                node.mID = hashlib.md5("".encode(encoding='UTF-8')).hexdigest()
+                node.commitMessage = ""
+                node.version = "v0.0"
+                cID2mID[cID] = node.mID
+                self.addNode(node)
+                output += ("Node: {} -> {}\n".format("0" * 7, node.mID))
+            else:
+                node = Node()
+                node.create_from_commit(git_store, commits[cID])
+                cID2mID[cID] = node.mID
+                self.addNode(node)
+                output += ("Node: {} -> {}\n".format(cID[:7], node.mID))
         log_and_print_online(output)
         # Constructing Edges
         for i in range(1, len(cIDs), 1):
@@ -15,29 +15,11 @@ import argparse
 import logging
 import os
 import sys
-import yaml
 from pathlib import Path
 
-from camel.typing import ModelType
-from chatdev.utils import convert_model_name
-
 root = os.path.dirname(__file__)
 sys.path.append(root)
 
-from chatdev.chat_chain import ChatChain
-
-try:
-    from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall
-    from openai.types.chat.chat_completion_message import FunctionCall
-
-    openai_new_api = True  # new openai api version
-except ImportError:
-    openai_new_api = False  # old openai api version
-    print(
-        "Warning: Your OpenAI version is outdated. \n "
-        "Please update as specified in requirement.txt. \n "
-        "The old API interface is deprecated and will no longer be supported.")
-
 
 def get_config(company):
     """
@@ -87,14 +69,43 @@ parser.add_argument('--enable-reasoning', action='store_true',
                     help="Enable reasoning mode, which will use the reasoning phase to generate code")
 parser.add_argument('--path', type=str, default="",
                     help="Your file directory, ChatDev will build upon your software in the Incremental mode")
+parser.add_argument('--resume', type=str, default="",
+                    help="Software directory (WareHouse/name_org_timestamp) of an interrupted run, ChatDev will restart from its last completed phase")
 args = parser.parse_args()
 
+# imported once the arguments are parsed, so that --help and argument errors do not load camel, openai and the chain
+from camel.typing import ModelType
+from chatdev.chat_chain import ChatChain
+from chatdev.utils import convert_model_name
+
+try:
+    from openai.types.chat.chat_completion_message_tool_call import ChatCompletionMessageToolCall
+    from openai.types.chat.chat_completion_message import FunctionCall
+
+    openai_new_api = True  # new openai api version
+except ImportError:
+    openai_new_api = False  # old openai api version
+    print(
+        "Warning: Your OpenAI version is outdated. \n "
+        "Please update as specified in requirement.txt. \n "
+        "The old API interface is deprecated and will no longer be supported.")
+
 # Start ChatDev
 
 # ----------------------------------------
 #          Init ChatChain
 # ----------------------------------------
 config_path, config_phase_path, config_role_path = get_config(args.config)
+resume_checkpoint = None
+if args.resume:
+    # the config files were copied into the software directory at pre-processing
+    resume_checkpoint = ChatChain.load_checkpoint(args.resume)
+    config_path, config_phase_path, config_role_path = [os.path.join(args.resume, config_file) for config_file in
+                                                        ["ChatChainConfig.json", "PhaseConfig.json", "RoleConfig.json"]]
+    args.task = resume_checkpoint["task_prompt_raw"]
+    args.name = resume_checkpoint["project_name"]
+    args.org = resume_checkpoint["org_name"]
+    args.path = resume_checkpoint["code_path"]
 args2type = {'GPT_3_5_TURBO': ModelType.GPT_3_5_TURBO,
             'GPT_4': ModelType.GPT_4,
             'GPT_4_32K': ModelType.GPT_4_32k,
@@ -138,7 +149,8 @@ chat_chain = ChatChain(config_path=config_path,
                        project_name=args.name,
                        org_name=args.org,
                        model_type=args2type[args.model],
-                       code_path=args.path)
+                       code_path=args.path,
+                       resume_checkpoint=resume_checkpoint)
 
 # ----------------------------------------
 #          Init Log
@@ -0,0 +1,89 @@
+"""
+Benchmark the construction cost of ChatAgents and ComposedPhases.
+
+"before" clears the ModelRegistry before every construction, which reproduces the old behaviour of re-reading the
+model YAML and building a new backend / API client for every ChatAgent; "after" reuses the warm registry.
+No request is sent to the model server.
+
+Usage:
+    VLLM_MODEL_NAME=Qwen/Qwen3-8B python scripts/benchmark_agent_construction.py --iterations 200
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(ROOT.as_posix())
+
+os.environ.setdefault("OPENAI_API_KEY", "EMPTY")
+os.environ.setdefault("VLLM_MODEL_NAME", "Qwen/Qwen3-8B")
+os.environ.setdefault("VLLM_CONTEXT_LENGTH", "32768")
+os.environ.setdefault("VLLM_MODEL_CONFIG_PATH",
+                      (ROOT / "config/vllm_models/Qwen-Qwen3-8B-no-reasoning.yaml").as_posix())
+
+
+def time_it(fn, iterations, clear_registry):
+    from camel.model_backend import ModelRegistry
+    durations = []
+    for _ in range(iterations):
+        if clear_registry:
+            ModelRegistry.clear()
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    return sum(durations) / len(durations), durations[len(durations) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ChatAgent / ComposedPhase construction.")
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--config", type=str, default="Default", help="CompanyConfig to load phases from")
+    args = parser.parse_args()
+
+    from camel.agents import ChatAgent
+    from camel.messages import SystemMessage
+    from camel.typing import ModelType, RoleType
+    from chatdev.chat_chain import ChatChain
+
+    config_dir = ROOT / "CompanyConfig" / args.config
+    chain = ChatChain(config_path=(config_dir / "ChatChainConfig.json").as_posix(),
+                      config_phase_path=(config_dir / "PhaseConfig.json").as_posix(),
+                      config_role_path=(config_dir / "RoleConfig.json").as_posix(),
+                      task_prompt="benchmark", project_name="benchmark", org_name="benchmark",
+                      model_type=ModelType.VLLM_MODEL, code_path="")
+    composed_items = [item for item in chain.chain if item["phaseType"] == "ComposedPhase"]
+    system_message = SystemMessage(role_name="Programmer", role_type=RoleType.ASSISTANT, content="benchmark")
+
+    def build_agent():
+        ChatAgent(system_message, model_type=ModelType.VLLM_MODEL)
+
+    def build_composed_phases(reuse):
+        if not reuse:
+            # the old behaviour: every composed step re-created all SimplePhases
+            chain.composed_sub_phases = None
+            chain.composed_phase_instances = dict()
+        for _ in composed_items:
+            if not reuse:
+                chain.create_phases("\n")
+            elif chain.composed_sub_phases is None:
+                chain.composed_sub_phases = chain.create_phases("\n")
+
+    rows = []
+    rows.append(("ChatAgent",
+                 time_it(build_agent, args.iterations, clear_registry=True),
+                 time_it(build_agent, args.iterations, clear_registry=False)))
+    rows.append(("ComposedPhase sub-phases",
+                 time_it(lambda: build_composed_phases(False), args.iterations, clear_registry=True),
+                 time_it(lambda: build_composed_phases(True), args.iterations, clear_registry=False)))
+
+    print("{:<28}{:>14}{:>14}{:>14}{:>14}".format("object", "before mean", "before p50", "after mean", "after p50"))
+    for name, before, after in rows:
+        print("{:<28}{:>12.3f}ms{:>12.3f}ms{:>12.3f}ms{:>12.3f}ms".format(
+            name, before[0] * 1000, before[1] * 1000, after[0] * 1000, after[1] * 1000))
+
+
+if __name__ == "__main__":
+    main()
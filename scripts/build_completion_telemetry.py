@@ -0,0 +1,50 @@
+"""
+Build the completion-length telemetry used by the adaptive completion budgets ("completion_budget": "adaptive" in
+ChatChainConfig.json) from the logs of earlier runs in the WareHouse.
+
+Usage:
+    python scripts/build_completion_telemetry.py WareHouse WareHouse/.telemetry/completion_telemetry.json
+"""
+import argparse
+import glob
+import json
+import os
+
+from parse_usage_info import parse_log_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect per-phase completion lengths from ChatDev logs.")
+    parser.add_argument("warehouse", help="directory containing the software directories of earlier runs")
+    parser.add_argument("output_path", help="telemetry file (merged into if it exists)")
+    parser.add_argument("--max_samples", type=int, default=1000, help="completions kept per phase and role")
+    args = parser.parse_args()
+
+    telemetry = {}
+    if os.path.exists(args.output_path):
+        with open(args.output_path, "r", encoding="utf8") as f:
+            telemetry = json.load(f)
+
+    num_logs = 0
+    for log_path in sorted(glob.glob(os.path.join(args.warehouse, "*", "*.log"))):
+        try:
+            phase_infos = parse_log_file(log_path)
+        except (AssertionError, ValueError) as e:
+            print(f"Skipping {log_path}: {e}")
+            continue
+        num_logs += 1
+        for phase_info in phase_infos:
+            key = "{}|{}".format(phase_info.phase_name, phase_info.role)
+            telemetry.setdefault(key, []).append(phase_info.usage_info.completion_tokens)
+
+    for key in telemetry:
+        telemetry[key] = telemetry[key][-args.max_samples:]
+    os.makedirs(os.path.dirname(os.path.abspath(args.output_path)), exist_ok=True)
+    with open(args.output_path, "w", encoding="utf8") as f:
+        json.dump(telemetry, f)
+    print(f"Collected {sum(len(samples) for samples in telemetry.values())} completions "
+          f"of {len(telemetry)} phase/role pairs from {num_logs} logs into {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
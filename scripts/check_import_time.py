@@ -0,0 +1,102 @@
+"""
+Check the import cost of starting ChatDev, to catch heavy imports creeping back onto the startup path.
+
+Two commands are run with `python -X importtime`:
+    help       `python run.py --help`, which should not load camel, openai or the chain at all
+    construct  building a ChatChain from the Default config (no request is sent to the model server)
+
+For each, the total import time (sum of the self times reported by -X importtime) must stay within its budget, and
+none of the modules of the optional subsystems (ECL memory with faiss / numpy, the web spider, markdown rendering,
+the visualizer server) may be imported, since their features are off by default. The slowest imports are listed.
+Exits with status 1 if a check fails.
+
+Usage:
+    VLLM_MODEL_NAME=Qwen/Qwen3-8B python scripts/check_import_time.py --help_budget_ms 150 --construct_budget_ms 1500
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# top-level modules that must not be imported by a default run
+OPTIONAL_MODULES = ["faiss", "numpy", "ecl", "bs4", "wikipediaapi", "markdown", "flask", "requests"]
+# modules that --help must not need either
+HELP_MODULES = OPTIONAL_MODULES + ["camel", "chatdev", "openai", "tiktoken"]
+
+CONSTRUCT_SNIPPET = """
+import sys
+sys.path.append({root!r})
+from camel.typing import ModelType
+from chatdev.chat_chain import ChatChain
+config_dir = {config_dir!r}
+ChatChain(config_path=config_dir + "/ChatChainConfig.json",
+          config_phase_path=config_dir + "/PhaseConfig.json",
+          config_role_path=config_dir + "/RoleConfig.json",
+          task_prompt="import time", project_name="import_time", org_name="import_time",
+          model_type=ModelType.VLLM_MODEL, code_path="")
+"""
+
+
+def parse_importtime(stderr):
+    """
+    parse the `-X importtime` report
+    Returns: [(module, self_us, cumulative_us)]
+
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+def check(name, command, budget_ms, forbidden, top):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "EMPTY")
+    result = subprocess.run([sys.executable, "-X", "importtime"] + command, cwd=ROOT.as_posix(), env=env,
+                            capture_output=True, text=True)
+    imports = parse_importtime(result.stderr)
+    total_ms = sum(self_us for _, self_us, _ in imports) / 1000
+    loaded = {module.split(".")[0] for module, _, _ in imports}
+    failures = []
+    if result.returncode != 0:
+        failures.append("exited with status {}:\n{}".format(
+            result.returncode, "\n".join(line for line in result.stderr.splitlines()
+                                         if not line.startswith("import time:"))))
+    if total_ms > budget_ms:
+        failures.append("imports took {:.1f} ms, budget {:.1f} ms".format(total_ms, budget_ms))
+    unexpected = sorted(module for module in forbidden if module in loaded)
+    if unexpected:
+        failures.append("imported optional modules: {}".format(", ".join(unexpected)))
+
+    print("{}: {:.1f} ms of imports (budget {:.1f} ms), {} modules".format(name, total_ms, budget_ms, len(imports)))
+    for module, _, cumulative_us in sorted(imports, key=lambda item: -item[2])[:top]:
+        print("    {:>9.1f} ms  {}".format(cumulative_us / 1000, module))
+    for failure in failures:
+        print("  FAILED: {}".format(failure))
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of run.py --help and ChatChain construction.")
+    parser.add_argument("--help_budget_ms", type=float, default=150)
+    parser.add_argument("--construct_budget_ms", type=float, default=1500)
+    parser.add_argument("--config", type=str, default="Default", help="CompanyConfig to build the ChatChain from")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    args = parser.parse_args()
+
+    config_dir = (ROOT / "CompanyConfig" / args.config).as_posix()
+    ok = check("run.py --help", ["run.py", "--help"], args.help_budget_ms, HELP_MODULES, args.top)
+    ok = check("ChatChain construction",
+               ["-c", CONSTRUCT_SNIPPET.format(root=ROOT.as_posix(), config_dir=config_dir)],
+               args.construct_budget_ms, OPTIONAL_MODULES, args.top) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
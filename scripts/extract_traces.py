@@ -0,0 +1,66 @@
+"""
+Extract per-run request timelines from ChatDev logs into a trace file for scripts/replay_traces.py.
+
+Every run becomes one JSON line:
+    {"run": ..., "requests": [{"phase": ..., "role": ..., "turn": ..., "prompt_tokens": ..., "completion_tokens": ...,
+                               "think_time": ..., "latency": ...}, ...]}
+where think_time is the time between the previous response and this request (ChatDev-side work such as writing
+files or running the software), and latency the time the request took on the server.
+
+Usage:
+    python scripts/extract_traces.py WareHouse traces.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+from datetime import datetime
+
+from parse_usage_info import parse_log_file
+
+# datefmt of the logging config in run.py
+LOG_TIME_FORMAT = '%Y-%d-%m %H:%M:%S'
+
+
+def extract_trace(log_path):
+    phase_infos = parse_log_file(log_path)
+    requests = []
+    previous_recv_time = None
+    for phase_info in phase_infos:
+        send_time = datetime.strptime(phase_info.usage_info.send_time, LOG_TIME_FORMAT)
+        recv_time = datetime.strptime(phase_info.usage_info.recv_time, LOG_TIME_FORMAT)
+        think_time = (send_time - previous_recv_time).total_seconds() if previous_recv_time is not None else 0.0
+        requests.append({
+            'phase': phase_info.phase_name,
+            'role': phase_info.role,
+            'turn': phase_info.turn,
+            'prompt_tokens': phase_info.usage_info.prompt_tokens,
+            'completion_tokens': phase_info.usage_info.completion_tokens,
+            'think_time': max(think_time, 0.0),
+            'latency': (recv_time - send_time).total_seconds(),
+        })
+        previous_recv_time = recv_time
+    return requests
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract request timelines of ChatDev runs into a trace file.')
+    parser.add_argument('warehouse', help='directory containing the software directories (with their logs) of runs')
+    parser.add_argument('output_path', help='trace file (JSON lines, one run per line)')
+    args = parser.parse_args()
+
+    num_runs, num_requests = 0, 0
+    with open(args.output_path, 'w', encoding='utf8') as f:
+        for log_path in sorted(glob.glob(os.path.join(args.warehouse, '*', '*.log'))):
+            try:
+                requests = extract_trace(log_path)
+            except (AssertionError, ValueError) as e:
+                print(f"Skipping {log_path}: {e}")
+                continue
+            if len(requests) == 0:
+                continue
+            run_name = os.path.basename(os.path.dirname(log_path))
+            f.write(json.dumps({'run': run_name, 'requests': requests}) + '\n')
+            num_runs += 1
+            num_requests += len(requests)
+    print(f"Extracted {num_requests} requests of {num_runs} runs into {args.output_path}")
@@ -12,6 +12,10 @@ class UsageInfo:
     total_tokens: int
     send_time: str
     recv_time: str
+    # requests re-sent with a larger completion budget after a reply cut off by it, merged into this one
+    budget_retries: int = 0
+    # total tokens of the cut-off replies
+    budget_retry_tokens: int = 0
 
 @dataclass
 class PhaseInfo:
@@ -27,6 +31,7 @@ def parse_log_file(log_file_path):
     usage_infos_buffer: list[UsageInfo] = []
     usage_info_buffer: dict[str, int] = {}
     usage_info_recv_read_lines = 0
+    retried_usage_infos: list[UsageInfo] = []
 
     with open(log_file_path, 'r') as file:
         for line in file:
@@ -59,6 +64,13 @@ def parse_log_file(log_file_path):
                 usage_info_recv_read_lines = 3
                 continue
 
+            # the last reply was cut off by its completion budget (see ChatAgent.run_with_budget) and the same
+            # request is sent again: the next usage info replaces it, so that there is still one per phase line
+            if re.search(r'\*\*\[Completion Budget Exceeded\]\*\*', line):
+                assert len(usage_infos_buffer) > 0, "Usage info buffer is empty"
+                retried_usage_infos.append(usage_infos_buffer.pop())
+                continue
+
             if usage_info_recv_read_lines > 0:
                 usage_key_value = re.search(r'(.*?): (\d+)', line)
                 assert usage_key_value is not None, "Number not found in line"
@@ -67,7 +79,15 @@ def parse_log_file(log_file_path):
                 usage_info_buffer[usage_key] = usage_key_value
                 usage_info_recv_read_lines -= 1
                 if usage_info_recv_read_lines == 0:
-                    usage_infos_buffer.append(UsageInfo(**usage_info_buffer))
+                    usage_info = UsageInfo(**usage_info_buffer)
+                    if retried_usage_infos:
+                        # the latency of the request includes its cut-off attempts
+                        usage_info.send_time = retried_usage_infos[0].send_time
+                        usage_info.budget_retries = sum(retried.budget_retries + 1 for retried in retried_usage_infos)
+                        usage_info.budget_retry_tokens = sum(retried.total_tokens + retried.budget_retry_tokens
+                                                             for retried in retried_usage_infos)
+                        retried_usage_infos = []
+                    usage_infos_buffer.append(usage_info)
                     usage_info_buffer = {}
                 continue
 
@@ -96,7 +116,7 @@ if __name__ == '__main__':
 
     with open(output_path, 'w', newline='') as f:
         writer = csv.writer(f)
-        writer.writerow(['role', 'phase_name', 'turn', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'send_time', 'recv_time'])
+        writer.writerow(['role', 'phase_name', 'turn', 'prompt_tokens', 'completion_tokens', 'total_tokens', 'send_time', 'recv_time', 'budget_retries', 'budget_retry_tokens'])
         for entry in usage_data:
             writer.writerow([
                 entry.role,
@@ -107,4 +127,6 @@ if __name__ == '__main__':
                 entry.usage_info.total_tokens,
                 entry.usage_info.send_time,
                 entry.usage_info.recv_time,
+                entry.usage_info.budget_retries,
+                entry.usage_info.budget_retry_tokens,
             ])
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+Replay ChatDev request traces (see scripts/extract_traces.py) against an OpenAI-compatible endpoint.
+
+N synthetic projects follow the request timelines of the trace runs (round robin): each request is sent after the
+recorded think time (divided by --time_scale), with a synthetic prompt of the recorded length that shares its prefix
+with the earlier requests of the same project, and asks for exactly the recorded completion length. Projects arrive
+as a Poisson process of --arrival_rate projects per second (all at once if 0).
+
+Reports request throughput, output token throughput, time to first token, request latency and end-to-end project
+latency distributions.
+
+With --priority_policy srwf, every request carries the number of requests left in its project as its vLLM
+`priority` (server started with --scheduling-policy priority), like ChatDev runs with CHATDEV_SCHEDULING_POLICY=srwf
+and CHATDEV_SERVER_PRIORITY=True, to compare project latencies against arrival order.
+
+Usage:
+    python scripts/replay_traces.py traces.jsonl --base_url http://localhost:8000/v1 --model Qwen/Qwen3-8B \
+        --num_projects 32 --arrival_rate 0.5 --time_scale 2
+"""
+import argparse
+import csv
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import openai
+
+
+@dataclass
+class RequestResult:
+    project: int
+    run: str
+    phase: str
+    prompt_tokens: int
+    completion_tokens: int
+    start_time: float
+    ttft: float
+    latency: float
+    error: str = ""
+
+
+def percentile(values, q):
+    if len(values) == 0:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, max(int(round(q / 100 * len(values))) - 1, 0))]
+
+
+def synthetic_prompt(project_id, num_tokens):
+    # one token per word for common tokenizers; the project id keeps projects from sharing prefix-cache blocks
+    return "project {} ".format(project_id) + " lorem" * max(num_tokens - 3, 1)
+
+
+def replay_project(client, args, project_id, run, start_delay, results, lock):
+    time.sleep(start_delay)
+    project_start = time.time()
+    for index, request in enumerate(run['requests']):
+        time.sleep(request['think_time'] / args.time_scale)
+        start_time = time.time()
+        ttft = None
+        completion_tokens = 0
+        error = ""
+        # vLLM: generate exactly the recorded completion length
+        extra_body = {"ignore_eos": True, "min_tokens": max(request['completion_tokens'], 1)}
+        if args.priority_policy == 'srwf':
+            extra_body["priority"] = len(run['requests']) - index
+        try:
+            stream = client.chat.completions.create(
+                model=args.model,
+                messages=[{"role": "user", "content": synthetic_prompt(project_id, request['prompt_tokens'])}],
+                max_tokens=max(request['completion_tokens'], 1),
+                stream=True,
+                stream_options={"include_usage": True},
+                extra_body=extra_body,
+            )
+            for chunk in stream:
+                if ttft is None and chunk.choices and chunk.choices[0].delta.content:
+                    ttft = time.time() - start_time
+                if chunk.usage is not None:
+                    completion_tokens = chunk.usage.completion_tokens
+        except openai.OpenAIError as e:
+            error = type(e).__name__
+        result = RequestResult(project=project_id, run=run['run'], phase=request['phase'],
+                               prompt_tokens=request['prompt_tokens'], completion_tokens=completion_tokens,
+                               start_time=start_time, ttft=ttft if ttft is not None else float('nan'),
+                               latency=time.time() - start_time, error=error)
+        with lock:
+            results.append(result)
+    return time.time() - project_start
+
+
+def print_distribution(name, values, unit):
+    values = [value for value in values if value == value]
+    print("{:<24} p50={:>9.3f}{} p90={:>9.3f}{} p99={:>9.3f}{} max={:>9.3f}{}".format(
+        name, percentile(values, 50), unit, percentile(values, 90), unit, percentile(values, 99), unit,
+        max(values) if values else float('nan'), unit))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay ChatDev request traces against an OpenAI-compatible endpoint.')
+    parser.add_argument('trace_path', help='trace file written by scripts/extract_traces.py')
+    parser.add_argument('--base_url', type=str, default='http://localhost:8000/v1')
+    parser.add_argument('--api_key', type=str, default='EMPTY')
+    parser.add_argument('--model', type=str, required=True)
+    parser.add_argument('--num_projects', type=int, default=16, help='number of synthetic projects')
+    parser.add_argument('--arrival_rate', type=float, default=0.0,
+                        help='projects started per second (Poisson arrivals), 0 starts all projects at once')
+    parser.add_argument('--time_scale', type=float, default=1.0,
+                        help='think times are divided by this factor, >1 replays faster than recorded')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--priority_policy', type=str, default='none', choices=['none', 'srwf'],
+                        help='srwf sends the requests left in the project as the vLLM priority')
+    parser.add_argument('--output_csv', type=str, default=None, help='write every request result to this file')
+    args = parser.parse_args()
+
+    with open(args.trace_path, 'r', encoding='utf8') as f:
+        runs = [json.loads(line) for line in f if line.strip()]
+    assert len(runs) > 0, f"No runs in {args.trace_path}"
+
+    random.seed(args.seed)
+    start_delays, arrival = [], 0.0
+    for _ in range(args.num_projects):
+        start_delays.append(arrival)
+        if args.arrival_rate > 0:
+            arrival += random.expovariate(args.arrival_rate)
+
+    client = openai.OpenAI(api_key=args.api_key, base_url=args.base_url, max_retries=0)
+    results, lock = [], threading.Lock()
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=args.num_projects) as executor:
+        futures = [executor.submit(replay_project, client, args, project_id, runs[project_id % len(runs)],
+                                   start_delays[project_id], results, lock)
+                   for project_id in range(args.num_projects)]
+        project_latencies = [future.result() for future in futures]
+    duration = time.time() - start_time
+
+    succeeded = [result for result in results if not result.error]
+    print(f"projects: {args.num_projects}, requests: {len(results)}, failed: {len(results) - len(succeeded)}, "
+          f"duration: {duration:.1f}s")
+    print(f"throughput: {len(succeeded) / duration:.3f} requests/s, "
+          f"{sum(result.completion_tokens for result in succeeded) / duration:.1f} output tokens/s")
+    print_distribution("TTFT", [result.ttft for result in succeeded], "s")
+    print_distribution("request latency", [result.latency for result in succeeded], "s")
+    print_distribution("project latency", project_latencies, "s")
+
+    if args.output_csv is not None:
+        with open(args.output_csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['project', 'run', 'phase', 'prompt_tokens', 'completion_tokens', 'start_time', 'ttft',
+                             'latency', 'error'])
+            for result in sorted(results, key=lambda result: result.start_time):
+                writer.writerow([result.project, result.run, result.phase, result.prompt_tokens,
+                                 result.completion_tokens, result.start_time - start_time, result.ttft,
+                                 result.latency, result.error])
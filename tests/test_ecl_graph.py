@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+from chatdev.git_store import GitStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ecl"))
+# ecl/graph.py imports ecl/utils.py, which needs the dependencies of the experiential co-learning module
+for module in ["yaml", "easydict", "openai", "numpy", "tiktoken", "tenacity"]:
+    pytest.importorskip(module)
+os.environ.setdefault("OPENAI_API_KEY", "test")  # read by ecl/utils.py at import time
+
+from graph import Node  # noqa: E402
+
+
+def test_node_keeps_the_whole_first_line_of_the_commit_message(tmp_path):
+    (tmp_path / "main.py").write_text("print(1)\n")
+    store = GitStore(str(tmp_path))
+    store.commit("v1.0 Finish Coding\n\ndetails")
+
+    node = Node()
+    node.create_from_commit(store, store.log()[0])
+
+    assert node.commitMessage == "v1.0 Finish Coding"
+    assert node.version == 1.0
@@ -0,0 +1,46 @@
+import shutil
+import subprocess
+
+import pytest
+
+from chatdev.git_store import GitStore
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+
+def git(directory, *args):
+    return subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args], cwd=directory,
+                          check=True, stdout=subprocess.PIPE, text=True).stdout
+
+
+def test_reads_history_of_packed_repository_on_master(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "master")
+    for version in range(3):
+        (tmp_path / "main.py").write_text("print({})\n".format(version) * 50)
+        (tmp_path / "README.md").write_text("version {}\n".format(version))
+        git(tmp_path, "add", "-A")
+        git(tmp_path, "commit", "-q", "-m", "version {}".format(version))
+    # packs the objects (with deltas between the versions of main.py) and the refs
+    git(tmp_path, "gc", "-q", "--aggressive")
+
+    store = GitStore(str(tmp_path))
+    commits = store.log()
+
+    assert [commit["message"] for commit in commits] == ["version 2", "version 1", "version 0"]
+    assert [commit["sha"] for commit in commits] == git(tmp_path, "rev-list", "HEAD").split()
+    assert store.read_files(commits[1]["sha"]) == {"main.py": b"print(1)\n" * 50, "README.md": b"version 1\n"}
+
+
+def test_commit_extends_the_branch_of_head(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "master")
+    (tmp_path / "main.py").write_text("print(0)\n")
+    git(tmp_path, "add", "-A")
+    git(tmp_path, "commit", "-q", "-m", "by git")
+    git(tmp_path, "gc", "-q")
+
+    (tmp_path / "main.py").write_text("print(1)\n")
+    sha = GitStore(str(tmp_path)).commit("by GitStore")
+
+    assert git(tmp_path, "rev-parse", "master").strip() == sha
+    assert git(tmp_path, "log", "--format=%s").split("\n")[:2] == ["by GitStore", "by git"]
+    git(tmp_path, "fsck", "--strict")
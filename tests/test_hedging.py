@@ -0,0 +1,68 @@
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("tiktoken")
+# camel.model_backend reads the key when the camel package is imported
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from camel.hedging import Hedger
+
+
+class Client:
+    def __init__(self, response, delay):
+        self.response = response
+        self.delay = delay
+        self.closed = threading.Event()
+
+    def send(self):
+        # a closed connection aborts the request
+        if self.closed.wait(self.delay):
+            raise ConnectionError("closed")
+        return self.response
+
+    def close(self):
+        self.closed.set()
+
+
+def run_hedged(primary_client, hedge_client):
+    hedger = Hedger(enabled=True, max_hedge_rate=1)
+    releases = []
+    released = threading.Event()
+
+    def start_hedge():
+        def release_hedge(error, cancelled, response):
+            releases.append((error, cancelled, response))
+            released.set()
+
+        return hedge_client, release_hedge
+
+    result = hedger.run(0.05, lambda client: client.send(), primary_client, start_hedge)
+    assert released.wait(5)
+    return result, releases, hedger
+
+
+def test_hedge_wins_and_primary_is_cancelled():
+    primary_client, hedge_client = Client("primary", 5), Client("hedge", 0)
+
+    (response, hedge_won), releases, hedger = run_hedged(primary_client, hedge_client)
+
+    assert (response, hedge_won) == ("hedge", True)
+    assert primary_client.closed.is_set()
+    # the hedge is released as a success, with its response
+    assert releases == [(None, False, "hedge")]
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_primary_wins_and_hedge_is_released_as_cancelled():
+    primary_client, hedge_client = Client("primary", 0.1), Client("hedge", 5)
+
+    (response, hedge_won), releases, hedger = run_hedged(primary_client, hedge_client)
+
+    assert (response, hedge_won) == ("primary", False)
+    assert hedge_client.closed.is_set()
+    (error, cancelled, hedge_response), = releases
+    assert isinstance(error, ConnectionError) and cancelled and hedge_response is None
+    assert hedger.stats()["hedge_wins"] == 0
@@ -0,0 +1,25 @@
+import importlib.util
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+spec = importlib.util.spec_from_file_location("check_import_time",
+                                              os.path.join(ROOT, "scripts", "check_import_time.py"))
+check_import_time = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(check_import_time)
+
+
+def test_parse_importtime():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   _io\n"
+              "import time:      1500 |       2000 | camel.typing\n"
+              "usage: run.py [-h]\n")
+
+    assert check_import_time.parse_importtime(stderr) == [("_io", 120, 120), ("camel.typing", 1500, 2000)]
+
+
+def test_help_imports_no_forbidden_module(capsys):
+    # a generous budget, the time depends on the machine, the forbidden modules do not
+    ok = check_import_time.check("run.py --help", ["run.py", "--help"], 10000, check_import_time.HELP_MODULES, top=10)
+
+    assert ok, capsys.readouterr().out
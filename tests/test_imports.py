@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("module", ["chatdev.git_store", "chatdev.utils", "chatdev.tracing", "chatdev.fileio"])
+def test_import_in_fresh_interpreter(module):
+    # a fresh interpreter, so that an import cycle is not hidden by modules imported earlier in the session
+    result = subprocess.run([sys.executable, "-c", "import {}".format(module)], cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    assert result.returncode == 0, result.stdout
+
+
+def test_git_store_does_not_import_camel():
+    # ecl/graph.py reads the history through GitStore without the dependencies of the agents
+    result = subprocess.run([sys.executable, "-c", "import sys, chatdev.git_store, chatdev.utils; "
+                                                   "print('camel' in sys.modules)"], cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    assert result.returncode == 0, result.stdout
+    assert result.stdout.strip() == "False"
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("tiktoken")
+# camel.model_backend reads the key when the camel package is imported
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from camel import load_balancer as load_balancer_module
+from camel.load_balancer import LoadBalancer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(load_balancer_module.time, "time", clock.time)
+    return clock
+
+
+def open_circuit(balancer, replica):
+    for _ in range(balancer.failure_threshold):
+        assert balancer.acquire(None, 10) is replica
+        balancer.release(replica, 10, 1.0, failed=True)
+
+
+def test_circuit_opens_after_threshold_and_skips_replica(clock):
+    balancer = LoadBalancer(["http://a", "http://b"], "key", failure_threshold=2, open_seconds=30)
+    a, b = balancer.replicas
+    balancer.replicas = [a]
+    open_circuit(balancer, a)
+    balancer.replicas = [a, b]
+
+    assert a.circuit_state(clock.now) == "open"
+    assert balancer.acquire(None, 10) is b
+    balancer.release(b, 10, 1.0)
+    balancer.replicas = [a]
+    assert balancer.acquire(None, 10) is None
+    assert balancer.next_available_in() == 30
+
+
+def test_half_open_probe_closes_on_success_and_reopens_on_failure(clock):
+    balancer = LoadBalancer(["http://a"], "key", failure_threshold=2, open_seconds=30)
+    (replica,) = balancer.replicas
+    open_circuit(balancer, replica)
+
+    clock.now += 30
+    assert replica.circuit_state(clock.now) == "half-open"
+    assert balancer.acquire(None, 10) is replica
+    # a single probe at a time
+    assert balancer.acquire(None, 10) is None
+    balancer.release(replica, 10, 1.0, failed=True)
+    # a failed probe re-opens the circuit, whatever the threshold
+    assert replica.circuit_state(clock.now) == "open"
+    assert replica.open_until == clock.now + 30
+
+    clock.now += 30
+    assert balancer.acquire(None, 10) is replica
+    balancer.release(replica, 10, 1.0)
+    assert replica.circuit_state(clock.now) == "closed"
+    assert replica.consecutive_failures == 0
+    assert balancer.acquire(None, 10) is replica
+    assert balancer.acquire(None, 10) is replica
+
+
+def test_aborted_request_changes_neither_breaker_nor_latency(clock):
+    balancer = LoadBalancer(["http://a"], "key", failure_threshold=2, open_seconds=30)
+    (replica,) = balancer.replicas
+    assert balancer.acquire(None, 10) is replica
+    balancer.release(replica, 10, 2.0)
+    assert balancer.acquire(None, 10) is replica
+    balancer.release(replica, 10, 1.0, failed=True)
+    # a bad request or a rate limit neither resets nor extends the failure streak
+    assert balancer.acquire(None, 10) is replica
+    balancer.release(replica, 10, 60.0, aborted=True)
+    assert replica.consecutive_failures == 1
+    assert replica.outstanding_requests == 0 and replica.outstanding_tokens == 0
+    stats = balancer.stats()[0]
+    assert (stats["requests"], stats["failures"], stats["aborted"]) == (3, 1, 1)
+    assert stats["mean_latency"] == 2.0
+
+    assert balancer.acquire(None, 10) is replica
+    balancer.release(replica, 10, 1.0, failed=True)
+    open_until = replica.open_until
+    clock.now += 30
+    assert balancer.acquire(None, 10) is replica
+    balancer.release(replica, 10, 60.0, aborted=True)
+    # an aborted probe leaves the circuit half-open and lets the next request probe
+    assert replica.circuit_state(clock.now) == "half-open"
+    assert replica.open_until == open_until
+    assert balancer.stats()[0]["mean_latency"] == 2.0
+    assert balancer.acquire(None, 10) is replica
+    assert replica.probing
@@ -0,0 +1,56 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+
+from parse_usage_info import parse_log_file  # noqa: E402
+
+
+def request_lines(send_time, recv_time, prompt_tokens, completion_tokens):
+    return [
+        "[{} INFO] **[OpenAI_Usage_Info Send]**".format(send_time),
+        "model: gpt-4o-mini",
+        "",
+        "[{} INFO] **[OpenAI_Usage_Info Receive]**".format(recv_time),
+        "prompt_tokens: {}".format(prompt_tokens),
+        "completion_tokens: {}".format(completion_tokens),
+        "total_tokens: {}".format(prompt_tokens + completion_tokens),
+        "cost: $0.000100",
+        "",
+    ]
+
+
+def phase_line(time, role, phase_name, turn):
+    return "[{} INFO] {}: **Chief Technology Officer<->{} on : {}, turn {}**".format(time, role, role, phase_name,
+                                                                                    turn)
+
+
+def test_budget_retries_are_merged_into_their_request(tmp_path):
+    lines = request_lines("2025-01-01 10:00:00", "2025-01-01 10:00:01", 100, 10)
+    lines.append(phase_line("2025-01-01 10:00:01", "Programmer", "LanguageChoose", 0))
+    # the Coding reply is cut off twice by its completion budget, then sent without a budget
+    lines += request_lines("2025-01-01 10:00:02", "2025-01-01 10:00:05", 200, 50)
+    lines += ["[2025-01-01 10:00:05 INFO] **[Completion Budget Exceeded]**", "", "role: Programmer",
+              "phase: Coding", "budget: 50", "retry budget: 200", ""]
+    lines += request_lines("2025-01-01 10:00:05", "2025-01-01 10:00:09", 200, 200)
+    lines += ["[2025-01-01 10:00:09 INFO] **[Completion Budget Exceeded]**", "", "role: Programmer",
+              "phase: Coding", "budget: 200", "retry budget: none", ""]
+    lines += request_lines("2025-01-01 10:00:09", "2025-01-01 10:00:15", 200, 300)
+    lines.append(phase_line("2025-01-01 10:00:15", "Programmer", "Coding", 0))
+    lines += request_lines("2025-01-01 10:00:16", "2025-01-01 10:00:17", 400, 20)
+    lines.append(phase_line("2025-01-01 10:00:17", "Programmer", "CodeReviewComment", 0))
+    log_path = tmp_path / "run.log"
+    log_path.write_text("\n".join(lines) + "\n")
+
+    phase_infos = parse_log_file(str(log_path))
+
+    assert [phase_info.phase_name for phase_info in phase_infos] == ["LanguageChoose", "Coding", "CodeReviewComment"]
+    coding = phase_infos[1].usage_info
+    assert (coding.prompt_tokens, coding.completion_tokens) == (200, 300)
+    assert coding.send_time == "2025-01-01 10:00:02"
+    assert coding.recv_time == "2025-01-01 10:00:15"
+    assert coding.budget_retries == 2
+    assert coding.budget_retry_tokens == 250 + 400
+    # the requests after the retries keep their own usage
+    assert phase_infos[2].usage_info.prompt_tokens == 400
+    assert phase_infos[2].usage_info.budget_retries == 0
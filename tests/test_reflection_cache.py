@@ -0,0 +1,46 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("tiktoken")
+pytest.importorskip("yaml")
+# camel.model_backend reads the key when the camel package is imported
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from camel.typing import ModelType
+from chatdev import phase as phase_module
+from chatdev.phase import Phase
+
+
+class Backend:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def run(self, **request):
+        self.calls.append(request)
+        message = SimpleNamespace(content="answer {}".format(len(self.calls)))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_reflection_cache_is_bounded_lru(monkeypatch):
+    calls = []
+    monkeypatch.setattr(phase_module.ModelFactory, "create", lambda *args: Backend(calls))
+    monkeypatch.setattr(phase_module, "log_visualize", lambda *args: None)
+    monkeypatch.setattr(Phase, "reflection_cache", type(Phase.reflection_cache)())
+    monkeypatch.setattr(Phase, "reflection_cache_size", 2)
+    phase = SimpleNamespace(reflection_mode="light", model_router=None, model_type=ModelType.VLLM_MODEL,
+                            light_reflection_prompt=Phase.light_reflection_prompt)
+
+    def reflect(messages):
+        return Phase.light_reflection(phase, messages, "question", "Coding")
+
+    assert reflect("a") == "answer 1"
+    assert reflect("b") == "answer 2"
+    assert reflect("a") == "answer 1"  # hit, "b" is now the least recently used
+    assert reflect("c") == "answer 3"  # evicts "b"
+    assert len(Phase.reflection_cache) == 2
+    assert reflect("a") == "answer 1"
+    assert reflect("b") == "answer 4"
+    assert len(calls) == 4
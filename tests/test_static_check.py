@@ -0,0 +1,73 @@
+from chatdev.static_check import check_codebooks
+
+
+def kinds(report):
+    return [(problem["filename"], problem["kind"]) for problem in report.problems]
+
+
+def test_valid_software_passes():
+    report = check_codebooks({
+        "main.py": "import os\nfrom game import Game\n\n\ndef main():\n    Game(os.getcwd()).run()\n",
+        "game.py": "class Game:\n    def __init__(self, path):\n        self.path = path\n\n"
+                   "    def run(self):\n        return self.path\n",
+    })
+
+    assert report.ok, str(report)
+
+
+def test_syntax_error():
+    report = check_codebooks({"main.py": "def main(:\n    pass\n"})
+
+    assert kinds(report) == [("main.py", "SyntaxError")]
+    assert report.problems[0]["lineno"] == 1
+
+
+def test_name_missing_from_a_file_of_the_software():
+    report = check_codebooks({
+        "main.py": "from game import Game, Board\n\nGame()\nBoard()\n",
+        "game.py": "class Game:\n    pass\n",
+    })
+
+    assert kinds(report) == [("main.py", "ImportError")]
+    assert report.problems[0]["message"] == "cannot import name 'Board' from 'game' (game.py)"
+    # worded like the interpreter, see TestErrorSummary
+    assert "ImportError: cannot import name 'Board'" in str(report)
+
+
+def test_imports_guarded_by_except_import_error_are_not_reported():
+    report = check_codebooks({
+        "main.py": "try:\n    import chatdev_missing_module\nexcept ImportError:\n    chatdev_missing_module = None\n"
+                   "try:\n    from game import Board\nexcept (ValueError, ImportError):\n    Board = None\n",
+        "game.py": "class Game:\n    pass\n",
+    })
+
+    assert report.ok, str(report)
+    assert report.missing_modules == []
+
+
+def test_unguarded_missing_module_is_reported():
+    report = check_codebooks({"main.py": "import chatdev_missing_module\n"})
+
+    assert kinds(report) == [("main.py", "ModuleNotFoundError")]
+    assert report.missing_modules == ["chatdev_missing_module"]
+
+
+def test_star_imports():
+    report = check_codebooks({
+        # the names bound by a star import are not known, they are not reported as undefined
+        "main.py": "from game import *\nfrom constants import *\n\nGame(WIDTH)\n",
+        "game.py": "from constants import *\n\n\nclass Game:\n    def __init__(self, width=WIDTH):\n"
+                   "        self.width = width\n",
+        # a file with star imports may re-export any name
+        "view.py": "from game import WIDTH, Game\n\nGame(WIDTH)\n",
+        "constants.py": "WIDTH = 800\n",
+    })
+
+    assert report.ok, str(report)
+
+
+def test_undefined_name():
+    report = check_codebooks({"main.py": "def main():\n    return undefined_name\n"})
+
+    assert kinds(report) == [("main.py", "NameError")]
+    assert report.problems[0]["message"] == "name 'undefined_name' is not defined"
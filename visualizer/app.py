@@ -1,22 +1,217 @@
+import json
 import logging
-import requests
 import os
-from flask import Flask, send_from_directory, request, jsonify
+import re
+import threading
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+
+from flask import Flask, Response, send_from_directory, request, jsonify
 import argparse
 
 app = Flask(__name__, static_folder='static')
 app.logger.setLevel(logging.ERROR)
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
-messages = []
 port = [8000]
+# messages kept in memory per channel, older ones are read back from the history files
+buffer_size = [1000]
+history_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "history")]
+# seconds a /stream request waits for a new message before sending a keepalive comment
+STREAM_KEEPALIVE = 15
+# logs the replay page can open: the software directories of WareHouse and the uploaded logs
+warehouse_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "WareHouse")
+upload_dir = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")]
+
+
+class Channel:
+    """
+    messages of one run: the latest ones in a ring buffer, all of them in a JSON lines history file,
+    where the message with id n is line n
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.buffer = deque(maxlen=buffer_size[0])
+        self.history_path = os.path.join(history_dir[0], re.sub(r'[^\w.-]', '_', name) + ".jsonl")
+        self.next_id = 0
+        if os.path.exists(self.history_path):
+            # continue the history of a run followed by an earlier server
+            with open(self.history_path, "r", encoding="utf8") as f:
+                for line in f:
+                    self.buffer.append(json.loads(line))
+                    self.next_id += 1
+        self.condition = threading.Condition()
+
+    def append(self, message):
+        with self.condition:
+            message = dict(message, id=self.next_id)
+            os.makedirs(history_dir[0], exist_ok=True)
+            with open(self.history_path, "a", encoding="utf8") as f:
+                f.write(json.dumps(message, ensure_ascii=False) + "\n")
+            self.buffer.append(message)
+            self.next_id += 1
+            self.condition.notify_all()
+        return message
+
+    def read(self, since, limit):
+        """
+        messages with id >= since, at most limit
+        """
+        with self.condition:
+            since = max(since, 0)
+            buffer_start = self.next_id - len(self.buffer)
+            if since >= buffer_start:
+                return list(islice(self.buffer, since - buffer_start, since - buffer_start + limit))
+        with open(self.history_path, "r", encoding="utf8") as f:
+            return [json.loads(line) for line in islice(f, since, since + limit)]
+
+    def wait(self, since, timeout):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.next_id > since, timeout=timeout)
+
+
+channels = {}
+channels_lock = threading.Lock()
+
+
+def get_channel(name):
+    with channels_lock:
+        if name not in channels:
+            channels[name] = Channel(name)
+        return channels[name]
+
+
+# a log record starts with "[<time> <level>] ", see the logging config in run.py
+RECORD_START = re.compile(rb'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) (\w+)\] ')
+# same extraction as the former client-side replay (static/replay/js/app.js)
+REGEX_ASSISTANT = re.compile(r'(.*):([\s\S]*)<->([\s\S]*?)\]([\s\S]*)')
+REGEX_USER = re.compile(r'(.*):(.*)(\[Start Chat\])([\s\S]*?)\]([\s\S]*)')
+REGEX_PROMPT = re.compile(r'(Prompt Engineer):([\S\s]*)')
+REGEX_END = re.compile(r'(AgentTech Ends|ChatDev Ends)')
+REGEX_START = re.compile(r'(ChatDev Starts)')
+REGEX_TASK = re.compile(r'(task_prompt)(.*):(.*)')
+REGEX_INFO = re.compile(r'Software Info([\s\S]*)')
+REGEX_PHASE_TURN = re.compile(r'on : (.*?), turn (\d+)')
+SOFTWARE_INFO_REGEXES = {key: re.compile(key + r'(?:[\t\n\r\s\D]*?)=(-?(\d*))')
+                         for key in ["code_lines", "num_code_files", "num_png_files", "num_doc_files", "env_lines",
+                                     "manual_lines", "num_utterances", "num_self_reflections", "num_prompt_tokens",
+                                     "num_completion_tokens", "num_total_tokens", "version_updates"]}
+SOFTWARE_INFO_REGEXES["duration"] = re.compile(r'duration(?:[\t\n\r\s\D]*?)=(-?(\d*)(.(\d)*)?s)')
+SOFTWARE_INFO_REGEXES["cost"] = re.compile(r'cost(?:[\t\n\r\s\D]*?)=(.((\d)*\.(\d)*))')
+# indexes of the most recently replayed logs kept in memory
+MAX_CACHED_INDEXES = 8
+
+
+def parse_record(level, text):
+    """
+    dialog items (utterances, start, end, task, software info) of one log record
+    """
+    items = []
+    if match := REGEX_PROMPT.search(text):
+        items.append({"type": "assitant", "character": match[1], "command": match[2]})
+    if level == "DEBUG" or "System" in text or items:
+        return items
+    if match := REGEX_ASSISTANT.search(text):
+        items.append({"type": "assitant", "character": match[1], "command": match[4]})
+    if match := REGEX_USER.search(text):
+        items.append({"type": "user", "character": match[1], "command": match[5]})
+    if match := REGEX_START.search(text):
+        items.append({"start": match[1]})
+    if match := REGEX_END.search(text):
+        items.append({"end": match[1]})
+    if match := REGEX_TASK.search(text):
+        items.append({"task": match[3]})
+    if match := REGEX_INFO.search(text):
+        info = match[1]
+        software_info = {}
+        for key, regex in SOFTWARE_INFO_REGEXES.items():
+            if info_match := regex.search(info):
+                software_info[key] = info_match[1]
+        items.append({"info": info, "Softwareinfo": software_info})
+    return items
+
+
+def read_records(path):
+    """
+    yield (offset, length, level, text) of every record of a log, without keeping the log in memory
+    """
+    with open(path, "rb") as f:
+        start, level, lines, offset = None, None, [], 0
+        for line in f:
+            if match := RECORD_START.match(line):
+                if start is not None:
+                    yield start, offset - start, level, b"".join(lines).decode("utf8", errors="replace").rstrip("\n")
+                start, level, lines = offset, match[2].decode(), [line[match.end():]]
+            elif start is not None:
+                lines.append(line)
+            offset += len(line)
+        if start is not None:
+            yield start, offset - start, level, b"".join(lines).decode("utf8", errors="replace").rstrip("\n")
+
+
+def read_record_text(f, offset, length):
+    f.seek(offset)
+    record = f.read(length)
+    return record[RECORD_START.match(record).end():].decode("utf8", errors="replace").rstrip("\n")
+
 
-def send_msg(role, text):
-    try:
-        data = {"role": role, "text": text}
-        response = requests.post(f"http://127.0.0.1:{port[-1]}/send_message", json=data)
-    except:
-        logging.info("flask app.py did not start for online log")
+def build_log_index(path):
+    """
+    index of a log: the position of every dialog item (record offset and length, item within the record),
+    and the items where each phase turn starts and where codes are updated, to jump to
+    """
+    entries, phases, code_updates = [], [], []
+    last_turn = None
+    start_chat_entry = None
+    for offset, length, level, text in read_records(path):
+        if "**[Update Codes]**" in text:
+            code_updates.append({"entry": len(entries), "label": (text.split("\n") + ["", "", ""])[2]})
+        for item_index, item in enumerate(parse_record(level, text)):
+            if item.get("type") == "user" and "[Start Chat]" in text:
+                start_chat_entry = len(entries)
+            elif item.get("type") == "assitant" and (match := REGEX_PHASE_TURN.search(text)):
+                phase, turn = match[1], int(match[2])
+                # phases of a ComposedPhase come again in every cycle
+                if (phase, turn) != last_turn:
+                    last_turn = (phase, turn)
+                    # turn 0 of a phase starts at the [Start Chat] message of its user role
+                    first_entry = start_chat_entry if turn == 0 and start_chat_entry is not None else len(entries)
+                    phases.append({"phase": phase, "turn": turn, "entry": first_entry})
+                start_chat_entry = None
+            entries.append([offset, length, item_index, level])
+    return {"entries": entries, "phases": phases, "code_updates": code_updates}
+
+
+log_indexes = OrderedDict()
+log_indexes_lock = threading.Lock()
+
+
+def resolve_log(name):
+    """
+    path of a log given as relative to WareHouse/ or to the upload directory, None if it is outside of them
+    """
+    for root in [warehouse_dir, upload_dir[0]]:
+        path = os.path.realpath(os.path.join(root, name))
+        if path.startswith(os.path.realpath(root) + os.sep) and os.path.isfile(path):
+            return path
+    return None
+
+
+def get_log_index(path):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime)
+    with log_indexes_lock:
+        if key in log_indexes:
+            log_indexes.move_to_end(key)
+            return log_indexes[key]
+    log_index = build_log_index(path)
+    with log_indexes_lock:
+        log_indexes[key] = log_index
+        while len(log_indexes) > MAX_CACHED_INDEXES:
+            log_indexes.popitem(last=False)
+    return log_index
 
 
 @app.route("/")
@@ -34,9 +229,102 @@ def replay():
     return send_from_directory("static", "replay.html")
 
 
+@app.route("/runs")
+def get_runs():
+    with channels_lock:
+        runs = [{"run": name, "messages": channel.next_id} for name, channel in channels.items()]
+    return jsonify(runs)
+
+
 @app.route("/get_messages")
 def get_messages():
-    return jsonify(messages)
+    """
+    messages of a run after a cursor: ?run=<run>&since=<cursor>&limit=<n>
+    returns the messages and the cursor to pass as since in the next request
+    """
+    channel = get_channel(request.args.get("run", "default"))
+    since = request.args.get("since", 0, type=int)
+    messages = channel.read(since, request.args.get("limit", 500, type=int))
+    return jsonify({"run": channel.name, "messages": messages, "cursor": since + len(messages)})
+
+
+@app.route("/stream")
+def stream():
+    """
+    Server-Sent Events of the messages of a run, starting at ?since=<cursor> or after the Last-Event-ID
+    the browser sends when it reconnects
+    """
+    channel = get_channel(request.args.get("run", "default"))
+    since = request.args.get("since", 0, type=int)
+    if request.headers.get("Last-Event-ID", "").isdigit():
+        since = int(request.headers["Last-Event-ID"]) + 1
+
+    def events(since):
+        while True:
+            messages = channel.read(since, 500)
+            for message in messages:
+                yield "id: {}\ndata: {}\n\n".format(message["id"], json.dumps(message, ensure_ascii=False))
+            since += len(messages)
+            if len(messages) == 0 and not channel.wait(since, STREAM_KEEPALIVE):
+                yield ": keepalive\n\n"
+
+    return Response(events(since), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/replay/logs")
+def replay_logs():
+    logs = []
+    if os.path.isdir(warehouse_dir):
+        for software in sorted(os.listdir(warehouse_dir)):
+            software_dir = os.path.join(warehouse_dir, software)
+            if os.path.isdir(software_dir):
+                logs.extend(software + "/" + filename for filename in sorted(os.listdir(software_dir))
+                            if filename.endswith(".log"))
+    return jsonify(logs)
+
+
+@app.route("/replay/upload", methods=["POST"])
+def replay_upload():
+    """
+    store an uploaded log on the server, which is then replayed page by page like the logs of WareHouse
+    """
+    file = request.files["file"]
+    name = uuid.uuid4().hex + "_" + re.sub(r'[^\w.-]', '_', os.path.basename(file.filename or "upload.log"))
+    os.makedirs(upload_dir[0], exist_ok=True)
+    file.save(os.path.join(upload_dir[0], name))
+    return jsonify({"log": name})
+
+
+@app.route("/replay/index")
+def replay_index():
+    """
+    number of dialog items of a log and the items to jump to (phase turns, code updates): ?log=<log>
+    """
+    path = resolve_log(request.args.get("log", ""))
+    if path is None:
+        return jsonify({"error": "log not found"}), 404
+    log_index = get_log_index(path)
+    return jsonify({"num_entries": len(log_index["entries"]), "phases": log_index["phases"],
+                    "code_updates": log_index["code_updates"]})
+
+
+@app.route("/replay/entries")
+def replay_entries():
+    """
+    a page of dialog items of a log, read from their offsets: ?log=<log>&start=<item>&count=<n>
+    """
+    path = resolve_log(request.args.get("log", ""))
+    if path is None:
+        return jsonify({"error": "log not found"}), 404
+    entries = get_log_index(path)["entries"]
+    start = max(request.args.get("start", 0, type=int), 0)
+    count = min(request.args.get("count", 50, type=int), 500)
+    items = []
+    with open(path, "rb") as f:
+        for offset, length, item_index, level in entries[start:start + count]:
+            items.append(parse_record(level, read_record_text(f, offset, length))[item_index])
+    return jsonify({"start": start, "entries": items})
 
 
 @app.route("/send_message", methods=["POST"])
@@ -48,7 +336,7 @@ def send_message():
     avatarUrl = find_avatar_url(role)
 
     message = {"role": role, "text": text, "avatarUrl": avatarUrl}
-    messages.append(message)
+    message = get_channel(data.get("run") or "default").append(message)
     return jsonify(message)
 
 
@@ -62,7 +350,11 @@ def find_avatar_url(role):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='argparse')
     parser.add_argument('--port', type=int, default=8000, help="port")
+    parser.add_argument('--buffer_size', type=int, default=1000, help="messages kept in memory per run")
+    parser.add_argument('--history_dir', type=str, default=history_dir[0], help="directory of the message history files")
     args = parser.parse_args()
     port.append(args.port)
+    buffer_size[0] = args.buffer_size
+    history_dir[0] = args.history_dir
     print(f"Please visit http://127.0.0.1:{port[-1]}/ for the front-end display page. \nIn the event of a port conflict, please modify the port argument (e.g., python3 app.py --port 8012).")
-    app.run(host='0.0.0.0', debug=False, port=port[-1])
+    app.run(host='0.0.0.0', debug=False, port=port[-1], threaded=True)
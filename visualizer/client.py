@@ -0,0 +1,24 @@
+import json
+import logging
+import urllib.request
+
+# side of the visualizer imported by ChatDev runs, kept free of flask and requests so that starting a run
+# does not pay for the server (see app.py)
+port = [8000]
+# channel of the messages sent by this process, one per ChatDev run (see set_run)
+run_name = ["default"]
+
+
+def set_run(name):
+    run_name[0] = name
+
+
+def send_msg(role, text):
+    try:
+        data = {"role": role, "text": text, "run": run_name[0]}
+        request = urllib.request.Request(f"http://127.0.0.1:{port[-1]}/send_message",
+                                         data=json.dumps(data).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"})
+        urllib.request.urlopen(request).close()
+    except:
+        logging.info("flask app.py did not start for online log")
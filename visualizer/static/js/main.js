@@ -64,18 +64,68 @@ function parseCodeBlocks(text, role) {
 }
 
 
-function get_new_messages() {
+// run whose messages are shown, and the id of the next message to fetch
+var current_run = new URLSearchParams(window.location.search).get("run");
+var cursor = 0;
+var event_source = null;
+var poll_timer = null;
+
+function show_message(message) {
+  // a reconnecting stream may repeat the last message
+  if (message.id < cursor) {
+    return;
+  }
+  append_message(message.role, message.text, message.avatarUrl);
+  cursor = message.id + 1;
+}
 
-  $.getJSON("/get_messages", function (data) {
-    var lastDisplayedMessageIndex = $("#chat-box .message-container").length;
+function get_new_messages() {
 
-    for (var i = lastDisplayedMessageIndex; i < data.length; i++) {
-      var role = data[i].role;
-      var text = data[i].text;
-      var avatarUrl = data[i].avatarUrl;
+  $.getJSON("/get_messages", {run: current_run, since: cursor}, function (data) {
+    if (data.run !== current_run) {
+      return;
+    }
+    data.messages.forEach(show_message);
+  });
+}
 
-      append_message(role, text, avatarUrl);
+function follow_run(run) {
+  if (event_source) {
+    event_source.close();
+    event_source = null;
+  }
+  if (poll_timer) {
+    clearInterval(poll_timer);
+    poll_timer = null;
+  }
+  current_run = run;
+  cursor = 0;
+  $("#chat-box").empty();
+  $("#run-select").val(run);
+
+  if (window.EventSource) {
+    // the server pushes new messages, the browser resumes from the last event id after a disconnect
+    event_source = new EventSource("/stream?" + $.param({run: run, since: cursor}));
+    event_source.onmessage = function (event) {
+      show_message(JSON.parse(event.data));
+    };
+  } else {
+    get_new_messages();
+    poll_timer = setInterval(get_new_messages, 1000);
+  }
+}
 
+function update_runs() {
+  $.getJSON("/runs", function (runs) {
+    var select = $("#run-select");
+    runs.forEach(function (run) {
+      if (select.find("option").filter(function () { return this.value === run.run; }).length === 0) {
+        select.append($("<option></option>").val(run.run).text(run.run));
+      }
+    });
+    // follow the latest run until one is chosen
+    if (current_run === null && runs.length > 0) {
+      follow_run(runs[runs.length - 1].run);
     }
   });
 }
@@ -130,10 +180,14 @@ function copyToClipboard(element) {
 
 
 $(document).ready(function () {
-  get_new_messages();
-  setInterval(function () {
-    get_new_messages();
-  }, 1000);
+  $("#run-select").change(function () {
+    follow_run($(this).val());
+  });
+  if (current_run !== null) {
+    follow_run(current_run);
+  }
+  update_runs();
+  setInterval(update_runs, 5000);
 });
 
 
@@ -88,8 +88,16 @@ var timeinterval = 5;
 var charinterval = 1;
 var scrollinterval = 40;
 
-var contents;
+// the log is indexed and read page by page by the server (visualizer/app.py), the browser only keeps
+// the pages being replayed and the latest MAX_RENDERED dialogs
+const PAGE_SIZE = 50;
+const MAX_RENDERED = 200;
+var logname;
 var filename;
+var logindex;
+var pages = new Map();
+// incremented to stop the running replay loop when another one starts (jump, resume)
+var replay_generation = 0;
 var curdialog = '';
 var total_height = 0;
 
@@ -114,7 +122,21 @@ $(document).ready(function() {
     $('#filebutton').click(function() {
         $('#fileInput').click();
     });
-
+    $.getJSON("/replay/logs", function(logs) {
+        logs.forEach(function(log) {
+            $('#logSelect').append($("<option></option>").val(log).text(log));
+        });
+    });
+    $('#logSelect').change(function() {
+        if ($(this).val()) {
+            selectLog($(this).val(), $(this).val());
+        }
+    });
+    $('#jumpSelect').change(function() {
+        if ($(this).val() !== "") {
+            jumpTo(parseInt($(this).val()));
+        }
+    });
 });
 
 const dialogbody = document.getElementById("dialogBody");
@@ -175,210 +197,112 @@ async function replayDialog(idx) {
     if (replaying == 1 && idx == 0) {
         return;
     }
+    if (logname === undefined) {
+        return;
+    }
+    var generation = ++replay_generation;
     if (idx == 0) {
         replaying = 1;
-        dialog = extraction(contents);
         var filelable = document.getElementById("successupload");
         filelable.style.display = "block";
         var info = "Replaying `" + filename + "` ......";
         filelable.innerHTML = md.render(info);
     }
-    for (let i = idx; i < dialog.length; ++i) {
-        await createPara(dialog[i], i);
+    if (logindex === undefined) {
+        logindex = await $.getJSON("/replay/index", {log: logname});
+        showJumpTargets(logindex);
     }
-}
-
-//watch .log file input
-function watchfileInput(files) {
-    if (files.length) {
-        const file = files[0];
-        if (file) {
-            const reader = new FileReader();
-            reader.onload = function() {
-                contents = this.result;
-            };
-            reader.readAsText(file);
-            var filelable = document.getElementById("successupload");
-            filelable.style.display = "block";
-            var info = "File uploaded (`" + file.name + "`). Please click **\"Replay\"** to show ChatDev's development process";
-            filename = file.name;
-            filelable.innerHTML = md.render(info);
+    for (let i = idx; i < logindex.num_entries; ++i) {
+        var d = await getEntry(i);
+        if (generation != replay_generation) {
+            return;
         }
+        await createPara(d, i);
+        trimDialogs();
     }
 }
 
-//extract information
-function extraction(contents) {
-    const regex = /\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} \w+)\] ([.\s\S\n\r\d\D\t]*?)(?=\n\[\d|$)/g;
-
-    var matches = [];
-
-    let match;
-    var itemp = 0;
-    while ((match = regex.exec(contents))) {
-        console.log(itemp);
-        itemp++;
-        const timestamp = match[1];
-        const text = match[2];
-        matches.push({
-            timestamp,
-            text
-        });
+//fetch a dialog item, keeping only its page and the next one
+async function getEntry(i) {
+    var page = Math.floor(i / PAGE_SIZE);
+    if (!pages.has(page)) {
+        var data = await $.getJSON("/replay/entries", {log: logname, start: page * PAGE_SIZE, count: PAGE_SIZE});
+        pages.set(page, data.entries);
     }
-    const regex_assistant = /(.*):([.\r\n\s\S\t\d\D]*)<->([.\r\n\s\S\t\d\D]*?)\]([.\r\n\s\S\t\d\D]*)/g;
-    const regex_user = /(.*):(.*)(\[Start Chat\])([.\r\n\s\S\t\d\D]*?)\]([.\r\n\s\S\t\d\D]*)/g;
-    const regex_prompt = /(Prompt Engineer):([\S\s]*)/g
-
-    const regex_end = /(AgentTech Ends|ChatDev Ends)/g;
-    const regex_start = /(ChatDev Starts)([\D\s])*(\d*)/g;
-
-    const regex_task = /(task_prompt)(.*):(.*)/g;
-    const regex_info = /Software Info([\r\n\s\S\t\d\D]*)/g;
-
-    const regex_system = /System/g;
-    const regex_debug = /DEBUG/g;
-
-    var dialog = [];
-    var count = 0;
-
-    for (let i = 0; i < matches.length; ++i) {
-        var if_break = false;
-        console.log(i);
-        if (i == 159 || i == 198 || i == 223 || i == 260 || i == 416 || i == 537) {
-            //console.log(matches[i]);
-        }
-        while ((match = regex_debug.exec(matches[i].timestamp)) !== null) {
-            if_break = true;
+    for (const key of Array.from(pages.keys())) {
+        if (key != page && key != page + 1) {
+            pages.delete(key);
         }
-        while ((match = regex_system.exec(matches[i].text)) !== null) {
-            if_break = true;
-        }
-        while (((match = regex_prompt.exec(matches[i].text)) !== null)) {
-            const type = "assitant";
-            const character = match[1];
-            const command = match[2];
-            const len = match[2].length;
-            count += 1;
-            dialog.push({
-                type,
-                character,
-                command,
-                len,
-                count
-            });
-            if_break = true;
-        }
-        if (if_break) {
-            continue;
-        }
-
-        while ((match = regex_assistant.exec(matches[i].text)) !== null) {
-            const type = "assitant";
-            const character = match[1];
-            const command = match[4];
-            const len = match[4].length;
-            count += 1;
-            dialog.push({
-                type,
-                character,
-                command,
-                len,
-                count
-            });
-
-        }
-        while ((match = regex_user.exec(matches[i].text)) !== null) {
-            const type = "user";
-            const character = match[1];
-            const command = match[5];
-            const len = match[5].length;
-            count += 1;
-            dialog.push({
-                type,
-                character,
-                command,
-                len,
-                count
-            });
-        }
-        while ((match = regex_start.exec(matches[i].text)) !== null) {
-            const start = match[1];
-            const len = match[1].length;
-            dialog.push({
-                start,
-                len,
-            });
+    }
+    return pages.get(page)[i - page * PAGE_SIZE];
+}
 
-        }
-        while ((match = regex_end.exec(matches[i].text)) !== null) {
-            const end = match[1];
-            const len = match[1].length;
-            dialog.push({
-                end,
-                len,
-            });
+//remove the oldest dialogs so that the page does not grow with the log
+function trimDialogs() {
+    while (dialogbody.children.length > MAX_RENDERED) {
+        total_height -= dialogbody.firstElementChild.getBoundingClientRect().height;
+        dialogbody.removeChild(dialogbody.firstElementChild);
+    }
+}
 
-        }
-        while ((match = regex_task.exec(matches[i].text)) !== null) {
-            const task = match[3];
-            dialog.push({
-                task
-            });
+//list the phase turns and code updates of the log
+function showJumpTargets(logindex) {
+    var select = $('#jumpSelect');
+    select.empty();
+    select.append($("<option></option>").val("").text("Jump to ..."));
+    logindex.phases.forEach(function(phase) {
+        select.append($("<option></option>").val(phase.entry).text(phase.phase + ", turn " + phase.turn));
+    });
+    logindex.code_updates.forEach(function(update) {
+        select.append($("<option></option>").val(update.entry).text("Code update: " + update.label));
+    });
+}
 
-        }
-        while ((match = regex_info.exec(matches[i].text)) !== null) {
-            const info = match[1];
-            if ((/code_lines(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.code_lines = (/code_lines(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/num_code_files(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.num_code_files = (/num_code_files(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/num_png_files(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.num_png_files = (/num_png_files(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/num_doc_files(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.num_doc_files = (/num_doc_files(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/env_lines(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.env_lines = (/env_lines(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/manual_lines(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.manual_lines = (/manual_lines(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/duration(?:[\t\n\r\s\D]*?)=(-?(\d*)(.(\d)*)?s)/g).exec(info) != null) {
-                Softwareinfo.duration = (/duration(?:[\t\n\r\s\D]*?)=(-?(\d*)(.(\d)*)?s)/g).exec(info)[1];
-            }
-            if ((/num_utterances(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.num_utterances = (/num_utterances(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/num_self_reflections(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.num_self_reflections = (/num_self_reflections(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/num_prompt_tokens(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.num_prompt_tokens = (/num_prompt_tokens(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/num_completion_tokens(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.num_completion_tokens = (/num_completion_tokens(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/num_total_tokens(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info) != null) {
-                Softwareinfo.num_total_tokens = (/num_total_tokens(?:[\t\n\r\s\D]*?)=(-?(\d*))/g).exec(info)[1];
-            }
-            if ((/cost(?:[\t\n\r\s\D]*?)=(.((\d)*\.(\d)*))/g).exec(info) != null) {
-                Softwareinfo.cost = (/cost(?:[\t\n\r\s\D]*?)=(.((\d)*\.(\d)*))/g).exec(info)[1];
-            }
-            if ((/version_updates(?:[\t\n\r\s\D]*?)=(-?\d*)/g).exec(info) != null) {
-                Softwareinfo.version_updates = (/version_updates(?:[\t\n\r\s\D]*?)=(-?\d*)/g).exec(info)[1];
-            }
+//continue the replay from a dialog item
+function jumpTo(entry) {
+    replaying = 1;
+    dialogbody.innerHTML = "";
+    total_height = 0;
+    idx = entry;
+    replayDialog(entry);
+}
 
-            dialog.push({
-                info,
-                Softwareinfo
-            });
+//replay a log of WareHouse or an uploaded one
+function selectLog(log, name) {
+    replay_generation++;
+    logname = log;
+    filename = name;
+    logindex = undefined;
+    pages = new Map();
+    replaying = 0;
+    idx = 0;
+    dialogbody.innerHTML = "";
+    total_height = 0;
+    var filelable = document.getElementById("successupload");
+    filelable.style.display = "block";
+    var info = "Log selected (`" + name + "`). Please click **\"Replay\"** to show ChatDev's development process";
+    filelable.innerHTML = md.render(info);
+}
 
+//watch .log file input
+function watchfileInput(files) {
+    if (files.length) {
+        const file = files[0];
+        if (file) {
+            var filelable = document.getElementById("successupload");
+            filelable.style.display = "block";
+            filelable.innerHTML = md.render("Uploading `" + file.name + "` ......");
+            const formData = new FormData();
+            formData.append("file", file);
+            fetch("/replay/upload", {method: "POST", body: formData})
+                .then(response => response.json())
+                .then(data => {
+                    selectLog(data.log, file.name);
+                    var info = "File uploaded (`" + file.name + "`). Please click **\"Replay\"** to show ChatDev's development process";
+                    filelable.innerHTML = md.render(info);
+                });
         }
     }
-    return dialog;
 }
 
 //show dailog
@@ -498,6 +422,7 @@ function createPara(d, i) {
         const tasktext = document.getElementById("Requesttext");
         tasktext.innerHTML = renderedHtml;
     } else if (d.info) {
+        Object.assign(Softwareinfo, d.Softwareinfo);
         var renderedHtml = md.render(d.info);
         const infotext = document.getElementById("dialogStatistic");
         var temp_label = "";